@@ -0,0 +1,71 @@
+"""Move appointments older than the active roster window into the archive table.
+
+Rows are moved in batches with one DELETE ... OUTPUT INTO statement each, so
+every batch leaves a row either live or archived, never both or neither.
+The moved columns are listed explicitly: NewAppointments also carries the
+replica's RowVer (migrations/004), which the archive does not have and
+which could not take an explicit value if it did.
+Hours counters for days before the window are pruned afterwards. The cutoff
+need not fall on a cycle boundary: rosters count their weeks from the start
+kept in RosterCycles (migrations/005), not from their earliest live row.
+Requires migrations/001_appointments_archive.sql and 002_resource_daily_hours.sql.
+
+    python archive_job.py [--batch-size N] [--dry-run]
+"""
+import argparse
+
+from roster_db import ACTIVE_WINDOW_DAYS, active_window_start, db_connection
+
+BATCH_SIZE = 5000
+
+ARCHIVED_COLUMNS = [
+    'Id', 'Name', 'maica__Scheduled_Start__c', 'maica__Scheduled_End__c',
+    'maica__Scheduled_Duration_Minutes__c', 'maica__Participants__c',
+    'maica__Participant_Location__c', 'maica__Resources__c',
+]
+
+MOVE_BATCH = f"""
+DELETE TOP (?) FROM NewAppointments
+OUTPUT {', '.join(f'DELETED.{column}' for column in ARCHIVED_COLUMNS)}, SYSUTCDATETIME()
+INTO NewAppointmentsArchive ({', '.join(ARCHIVED_COLUMNS)}, ArchivedAt)
+WHERE maica__Scheduled_Start__c < ?
+"""
+
+
+def archive(batch_size=BATCH_SIZE, dry_run=False):
+    """Archive every appointment before the active window; returns the number of rows moved"""
+    cutoff = active_window_start()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        if dry_run:
+            cursor.execute("SELECT COUNT(*) FROM NewAppointments WHERE maica__Scheduled_Start__c < ?", cutoff)
+            return cursor.fetchone()[0]
+
+        moved = 0
+        while True:
+            try:
+                cursor.execute(MOVE_BATCH, batch_size, cutoff)
+                batch = cursor.rowcount
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            moved += batch
+            print(f"Archived {moved} appointments so far")
+            if batch < batch_size:
+                break
+
+        # Live hour checks never look before the window
+        cursor.execute("DELETE FROM ResourceDailyHours WHERE WorkDate < ?", cutoff.date())
+        conn.commit()
+        return moved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="only count the rows that would move")
+    args = parser.parse_args()
+    count = archive(args.batch_size, args.dry_run)
+    verb = "would be archived" if args.dry_run else "archived"
+    print(f"{count} appointments older than {ACTIVE_WINDOW_DAYS} days {verb}")
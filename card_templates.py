@@ -0,0 +1,95 @@
+"""HTML templates for appointment cards, day tabs and empty states.
+
+Templates are compiled once at import and only reference classes from
+styles.css, so each card sends a short class-based fragment instead of
+several hundred bytes of inline CSS on every rerun.
+"""
+from html import escape
+from string import Template
+
+APPOINTMENT_CARD = Template(
+    '<div class="appt-card">'
+    '<div class="appt-card-title">$name</div>'
+    '<div class="appt-card-tags">$tags</div>'
+    '<div class="appt-card-time">$time</div>'
+    '</div>'
+)
+TAG = Template('<span class="appt-tag appt-tag-$kind">$text</span>')
+CARD_DETAILS = '<div class="appt-card-details"></div>'
+RESOURCE_PANEL = '<div class="appt-resource-panel"></div>'
+
+DAY_DISABLED = Template('<div class="day-tab-disabled">$day</div>')
+DAY_HEADING = Template('<div class="day-heading">$day — $count appointment$plural</div>')
+
+EMPTY_STATE = Template(
+    '<div class="empty-block empty-block-$tone$size">'
+    '<div class="empty-block-icon">$icon</div>'
+    '<div class="empty-block-title">$title</div>'
+    '$detail'
+    '</div>'
+)
+EMPTY_DETAIL = Template('<div class="empty-block-detail">$detail</div>')
+
+NOTICE = Template(
+    '<div class="notice notice-$tone">'
+    '<div class="notice-title">$title</div>'
+    '<div class="notice-body">$body</div>'
+    '</div>'
+)
+
+ASSIGNMENT_HEADER = Template(
+    '<div class="assignment-header">'
+    '<div class="assignment-header-title"><span class="assignment-header-icon">📅</span>'
+    'Appointment Assignment at $location</div>'
+    '<div class="assignment-header-counts">'
+    '<span class="count-badge count-badge-open">$unassigned unassigned</span>'
+    '<span class="count-badge count-badge-done">$assigned assigned</span>'
+    '</div>'
+    '</div>'
+)
+
+
+def appointment_card(name, hours, participant, start, end, resource=None, staged=False, pending=False):
+    """Card header for one appointment"""
+    tags = [
+        TAG.substitute(kind='hours', text=f"{hours:.1f}h"),
+        TAG.substitute(kind='participant', text=escape(str(participant))),
+    ]
+    if resource:
+        tags.append(TAG.substitute(kind='resource', text=escape(str(resource))))
+    if staged:
+        tags.append(TAG.substitute(kind='staged', text='🧪 staged'))
+    if pending:
+        tags.append(TAG.substitute(kind='pending', text='⏳ saving'))
+    return APPOINTMENT_CARD.substitute(
+        name=escape(str(name)),
+        tags=''.join(tags),
+        time=f"{start.strftime('%a, %b %d • %I:%M %p')} - {end.strftime('%I:%M %p')}"
+    )
+
+
+def day_disabled(day):
+    """Placeholder for a day tab without appointments"""
+    return DAY_DISABLED.substitute(day=day[:3])
+
+
+def day_heading(day, count):
+    return DAY_HEADING.substitute(day=day, count=count, plural='s' if count != 1 else '')
+
+
+def empty_state(icon, title, detail=None, tone='neutral', large=False):
+    return EMPTY_STATE.substitute(
+        icon=icon,
+        title=escape(title),
+        detail=EMPTY_DETAIL.substitute(detail=escape(detail)) if detail else '',
+        tone=tone,
+        size=' empty-block-large' if large else ''
+    )
+
+
+def notice(title, body, tone='success'):
+    return NOTICE.substitute(title=title, body=escape(str(body)), tone=tone)
+
+
+def assignment_header(location, unassigned, assigned):
+    return ASSIGNMENT_HEADER.substitute(location=escape(str(location)), unassigned=unassigned, assigned=assigned)
@@ -0,0 +1,401 @@
+"""Workforce rules: declarative configuration compiled into vectorized checks.
+
+The rule set is read from roster_rules.toml, compiled once per process and
+then evaluated for one or many resources in a single pass over their shift
+arrays. Every validation and display path in roster_app consumes the result.
+"""
+import os
+import tomllib
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+RULES_FILE = os.getenv(
+    "ROSTER_RULES_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "roster_rules.toml")
+)
+
+HARD = "hard"
+SOFT = "soft"
+
+# Metric name in the config -> (summary field, week number) pairs it is checked against
+METRIC_FIELDS = {
+    "week_hours": (("week1_hours", 1), ("week2_hours", 2)),
+    "total_hours": (("total_hours", None),),
+    "min_gap_hours": (("min_gap_hours", None),),
+    "consecutive_days": (("max_consecutive_days", None),),
+}
+
+OPERATORS = {
+    "<=": np.less_equal,
+    "<": np.less,
+    ">=": np.greater_equal,
+    ">": np.greater,
+}
+
+CompiledRule = namedtuple(
+    "CompiledRule",
+    "id metric fields passes limit factor uses_contracted severity employment_types message"
+)
+
+
+def load_rules(path=RULES_FILE):
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def compile_rules(config):
+    """Validate rule definitions and turn them into vectorized checks"""
+    compiled = []
+    for rule in config.get("rules", []):
+        metric = rule["metric"]
+        if metric not in METRIC_FIELDS:
+            raise ValueError(f"Rule {rule.get('id')}: unknown metric '{metric}'")
+
+        op = rule.get("op", ">=" if metric == "min_gap_hours" else "<=")
+        if op not in OPERATORS:
+            raise ValueError(f"Rule {rule.get('id')}: unknown operator '{op}'")
+
+        severity = rule.get("severity", HARD)
+        if severity not in (HARD, SOFT):
+            raise ValueError(f"Rule {rule.get('id')}: severity must be '{HARD}' or '{SOFT}'")
+
+        limit = rule["limit"]
+        uses_contracted = limit == "contracted"
+        if not uses_contracted and not isinstance(limit, (int, float)):
+            raise ValueError(f"Rule {rule.get('id')}: limit must be a number or 'contracted'")
+
+        employment_types = rule.get("employment_types")
+        compiled.append(CompiledRule(
+            id=rule.get("id", metric),
+            metric=metric,
+            fields=METRIC_FIELDS[metric],
+            passes=OPERATORS[op],
+            limit=None if uses_contracted else float(limit),
+            factor=float(rule.get("factor", 1)),
+            uses_contracted=uses_contracted,
+            severity=severity,
+            employment_types=tuple(employment_types) if employment_types else None,
+            message=rule.get("message", f"{metric} {{value:.1f}} outside limit {{limit:g}}")
+        ))
+    return tuple(compiled)
+
+
+def rule_limits(rules, employment_type, contracted_hours=0):
+    """Limit per metric for one employment type (first matching rule wins)"""
+    limits = {}
+    for rule in rules:
+        if rule.employment_types is not None and employment_type not in rule.employment_types:
+            continue
+        if rule.metric in limits:
+            continue
+        base = float(contracted_hours or 0) if rule.uses_contracted else rule.limit
+        limits[rule.metric] = base * rule.factor
+    return limits
+
+
+def compute_metrics(groups, starts, ends, minutes, weeks, n_groups, offsite=None):
+    """Roster metrics for n_groups resources in one pass over their shift arrays.
+
+    groups are resource indices in [0, n_groups), starts/ends are datetimes,
+    minutes the scheduled duration and weeks 1 or 2 (0 = outside the period).
+    offsite is an optional (groups, dates, minutes, weeks) tuple of hours worked
+    at other locations: it counts towards hours and worked days but not gaps.
+    Returns a dict of float arrays indexed by group.
+    """
+    groups = np.asarray(groups, dtype=np.int64)
+    starts = np.asarray(starts, dtype="datetime64[m]")
+    ends = np.asarray(ends, dtype="datetime64[m]")
+    minutes = np.nan_to_num(np.asarray(minutes, dtype=float))
+    weeks = np.asarray(weeks, dtype=np.int64)
+
+    order = np.lexsort((ends, starts, groups))
+    groups, starts, ends = groups[order], starts[order], ends[order]
+    minutes, weeks = minutes[order], weeks[order]
+
+    if offsite is None:
+        offsite = ([], [], [], [])
+    off_groups = np.asarray(offsite[0], dtype=np.int64)
+    off_days = np.asarray(offsite[1], dtype="datetime64[D]").astype(np.int64)
+    off_minutes = np.nan_to_num(np.asarray(offsite[2], dtype=float))
+    off_weeks = np.asarray(offsite[3], dtype=np.int64)
+
+    # Hours per (resource, week)
+    week_hours = np.bincount(
+        np.r_[groups * 3 + weeks, off_groups * 3 + off_weeks],
+        weights=np.r_[minutes, off_minutes] / 60,
+        minlength=n_groups * 3
+    ).reshape(n_groups, 3)
+
+    # Gaps between each shift and the next one of the same resource
+    same_resource = groups[1:] == groups[:-1]
+    gaps = (starts[1:] - ends[:-1]).astype(np.int64) / 60
+    min_gap = np.full(n_groups, np.inf)
+    np.minimum.at(min_gap, groups[1:][same_resource], gaps[same_resource])
+
+    same_day = same_resource & (
+        ends[:-1].astype("datetime64[D]") == starts[1:].astype("datetime64[D]")
+    )
+    same_day_min_gap = np.full(n_groups, np.inf)
+    np.minimum.at(same_day_min_gap, groups[1:][same_day], gaps[same_day])
+
+    # Longest run of consecutive worked days inside each roster week
+    in_period = weeks > 0
+    days = starts[in_period].astype("datetime64[D]").astype(np.int64)
+    off_in_period = off_weeks > 0
+    keys = np.unique(np.r_[
+        ((groups[in_period] * 3 + weeks[in_period]) << 32) + days,
+        ((off_groups[off_in_period] * 3 + off_weeks[off_in_period]) << 32) + off_days[off_in_period]
+    ])
+    max_consecutive = np.zeros(n_groups)
+    if len(keys):
+        run_ids = np.cumsum(np.diff(keys, prepend=keys[0] - 2) != 1) - 1
+        run_lengths = np.bincount(run_ids)
+        run_groups = (keys[np.r_[0, np.flatnonzero(np.diff(run_ids)) + 1]] >> 32) // 3
+        np.maximum.at(max_consecutive, run_groups, run_lengths)
+
+    min_gap[np.isinf(min_gap)] = np.nan
+    same_day_min_gap[np.isinf(same_day_min_gap)] = np.nan
+    return {
+        'week1_hours': week_hours[:, 1],
+        'week2_hours': week_hours[:, 2],
+        'total_hours': week_hours[:, 1] + week_hours[:, 2],
+        'min_gap_hours': min_gap,
+        'same_day_min_gap': same_day_min_gap,
+        'max_consecutive_days': max_consecutive,
+    }
+
+
+def check_rules(rules, metrics, employment_types, contracted_hours):
+    """Apply every compiled rule to the metric arrays of all resources at once.
+
+    Returns one list of violation dicts per resource.
+    """
+    employment_types = np.asarray(employment_types, dtype=object)
+    contracted = np.asarray(
+        [np.nan if c is None else c for c in contracted_hours], dtype=float
+    )
+    findings = [[] for _ in range(len(employment_types))]
+
+    for rule in rules:
+        if rule.employment_types is None:
+            applies = np.ones(len(employment_types), dtype=bool)
+        else:
+            applies = np.isin(employment_types, rule.employment_types)
+        if not applies.any():
+            continue
+
+        if rule.uses_contracted:
+            limit = contracted * rule.factor
+        else:
+            limit = np.full(len(employment_types), rule.limit * rule.factor)
+
+        for field, week in rule.fields:
+            values = np.asarray(metrics[field], dtype=float)
+            with np.errstate(invalid="ignore"):
+                failed = applies & ~np.isnan(values) & ~np.isnan(limit) & ~rule.passes(values, limit)
+            for i in np.flatnonzero(failed):
+                findings[i].append({
+                    'rule': rule.id,
+                    'metric': rule.metric,
+                    'field': field,
+                    'week': week,
+                    'severity': rule.severity,
+                    'value': float(values[i]),
+                    'limit': float(limit[i]),
+                    'message': rule.message.format(value=values[i], limit=limit[i], week=week),
+                })
+    return findings
+
+
+def drop_shadowed(violations):
+    """A soft finding adds nothing when the same field already breaks a hard rule"""
+    hard_fields = {v['field'] for v in violations if v['severity'] == HARD}
+    return [v for v in violations if v['severity'] == HARD or v['field'] not in hard_fields]
+
+
+def shift_arrays(shift_details):
+    """Start/end/minutes/week arrays from shift_details records"""
+    starts = np.array([s['StartDateTime'] for s in shift_details], dtype="datetime64[m]")
+    ends = np.array([s['EndDateTime'] for s in shift_details], dtype="datetime64[m]")
+    minutes = np.array([s['DurationMinutes'] for s in shift_details], dtype=float)
+    weeks = np.array([s['Week'] for s in shift_details], dtype=np.int64)
+    return starts, ends, minutes, weeks
+
+
+def candidate_metrics(starts, ends, weeks, cand_start, cand_end, cand_week, offsite_days=()):
+    """Gap and consecutive-day metrics as seen from one prospective shift.
+
+    The gap is the smallest rest between the candidate and any existing shift
+    (negative when they overlap); the run is the consecutive-day streak in the
+    candidate's week that includes the candidate's day.
+    """
+    cand_start = np.datetime64(cand_start, "m")
+    cand_end = np.datetime64(cand_end, "m")
+
+    min_gap = np.nan
+    if len(starts):
+        gaps = np.maximum(
+            (starts - cand_end).astype(np.int64),
+            (cand_start - ends).astype(np.int64)
+        ) / 60
+        min_gap = float(gaps.min())
+
+    cand_day = cand_start.astype("datetime64[D]").astype(np.int64)
+    worked = set(starts[weeks == cand_week].astype("datetime64[D]").astype(np.int64).tolist())
+    worked.update(int(day) for day in offsite_days)
+    worked.add(int(cand_day))
+    first = last = int(cand_day)
+    while first - 1 in worked:
+        first -= 1
+    while last + 1 in worked:
+        last += 1
+
+    return {'min_gap_hours': min_gap, 'max_consecutive_days': float(last - first + 1)}
+
+
+def offsite_arrays(offsite):
+    """Date/minutes/week arrays from (date, minutes, week) offsite records"""
+    dates = np.array([o[0] for o in offsite], dtype="datetime64[D]")
+    minutes = np.array([o[1] for o in offsite], dtype=float)
+    weeks = np.array([o[2] for o in offsite], dtype=np.int64)
+    return dates, minutes, weeks
+
+
+def evaluate(rules, shift_details, employment_type, contracted_hours, candidate=None, offsite=()):
+    """Evaluate every rule for one resource.
+
+    shift_details are the resource's shifts in the roster period. candidate is an
+    optional (start, end, minutes, week) tuple for a prospective assignment: its
+    hours are added to the totals and the gap/consecutive checks are taken
+    relative to it, so existing issues elsewhere in the roster do not block it.
+    offsite holds (date, minutes, week) records worked at other locations.
+    """
+    starts, ends, minutes, weeks = shift_arrays(shift_details)
+    all_starts, all_ends, all_minutes, all_weeks = starts, ends, minutes, weeks
+    if candidate is not None:
+        cand_start, cand_end, cand_minutes, cand_week = candidate
+        all_starts = np.append(starts, np.datetime64(cand_start, "m"))
+        all_ends = np.append(ends, np.datetime64(cand_end, "m"))
+        all_minutes = np.append(minutes, float(cand_minutes))
+        all_weeks = np.append(weeks, int(cand_week))
+
+    off_dates, off_minutes, off_weeks = offsite_arrays(offsite)
+    metrics = compute_metrics(
+        np.zeros(len(all_starts), dtype=np.int64), all_starts, all_ends, all_minutes, all_weeks, 1,
+        offsite=(np.zeros(len(off_dates), dtype=np.int64), off_dates, off_minutes, off_weeks)
+    )
+    metrics = {key: float(values[0]) for key, values in metrics.items()}
+    if candidate is not None:
+        metrics.update(candidate_metrics(
+            starts, ends, weeks, cand_start, cand_end, cand_week,
+            off_dates[off_weeks == int(cand_week)].astype(np.int64)
+        ))
+
+    summary = summarize(rules, metrics, employment_type, contracted_hours, shift_details, offsite)
+    if candidate is not None:
+        # Only the candidate's week matters for a prospective assignment
+        summary['violations'] = [
+            v for v in summary['violations'] if v['week'] is None or v['week'] == int(cand_week)
+        ]
+        summary['hard_violation'] = any(v['severity'] == HARD for v in summary['violations'])
+    return summary
+
+
+def summarize(rules, metrics, employment_type, contracted_hours, shift_details, offsite=()):
+    """Constraint summary dict shared by the validation and display paths"""
+    violations = drop_shadowed(check_rules(
+        rules, {key: [value] for key, value in metrics.items()}, [employment_type], [contracted_hours]
+    )[0])
+
+    def flagged(field):
+        return any(v['field'] == field for v in violations)
+
+    min_gap = metrics['min_gap_hours']
+    same_day_gap = metrics['same_day_min_gap']
+    return {
+        'max_consecutive_days': int(metrics['max_consecutive_days']),
+        'min_hours_between_shifts': 'N/A' if np.isnan(min_gap) else f"{min_gap:.1f}",
+        'same_day_min_gap': 'N/A' if np.isnan(same_day_gap) else f"{same_day_gap:.1f}",
+        'week1_hours': metrics['week1_hours'],
+        'week2_hours': metrics['week2_hours'],
+        'total_hours': metrics['total_hours'],
+        'shift_details': shift_details,
+        'employmentType': employment_type,
+        'contractedHours': contracted_hours,
+        'gap_violation': flagged('min_gap_hours'),
+        'same_day_gap_violation': not np.isnan(same_day_gap) and same_day_gap < rule_limits(
+            rules, employment_type, contracted_hours).get('min_gap_hours', 0),
+        'week1_violation': flagged('week1_hours'),
+        'week2_violation': flagged('week2_hours'),
+        'total_violation': flagged('total_hours'),
+        'violations': violations,
+        'hard_violation': any(v['severity'] == HARD for v in violations),
+        'limits': rule_limits(rules, employment_type, contracted_hours),
+        'offsite': list(offsite),
+        'offsite_hours': sum(o[1] for o in offsite) / 60,
+    }
+
+
+def field_severity(constraints, field):
+    """Worst severity among violations on a summary field (None if clean)"""
+    severities = {v['severity'] for v in constraints.get('violations', []) if v['field'] == field}
+    if HARD in severities:
+        return HARD
+    if SOFT in severities:
+        return SOFT
+    return None
+
+
+def evaluate_many(rules, shifts, resources, offsite=None):
+    """Evaluate every rule for many resources in one vectorized pass.
+
+    shifts has Resource, StartDateTime, EndDateTime, DurationMinutes and Week
+    columns; resources has Resource, employmentType and hoursPerWeek (one row
+    per resource to report); offsite optionally has Resource, WorkDate, Minutes
+    and Week for hours worked elsewhere. Returns one row of metrics, severity
+    per field, violation dicts (findings) and messages for each resource.
+    """
+    resources = resources.reset_index(drop=True)
+    codes = {name: i for i, name in enumerate(resources['Resource'])}
+    n_groups = len(resources)
+
+    shifts = shifts[shifts['Resource'].isin(codes)]
+    groups = shifts['Resource'].map(codes).to_numpy(dtype=np.int64)
+    offsite_data = None
+    if offsite is not None and not offsite.empty:
+        offsite = offsite[offsite['Resource'].isin(codes)]
+        offsite_data = (
+            offsite['Resource'].map(codes).to_numpy(dtype=np.int64),
+            pd.to_datetime(offsite['WorkDate']).to_numpy(dtype="datetime64[D]"),
+            offsite['Minutes'].to_numpy(dtype=float),
+            offsite['Week'].to_numpy(dtype=np.int64),
+        )
+
+    metrics = compute_metrics(
+        groups,
+        pd.to_datetime(shifts['StartDateTime']).to_numpy(dtype="datetime64[m]"),
+        pd.to_datetime(shifts['EndDateTime']).to_numpy(dtype="datetime64[m]"),
+        shifts['DurationMinutes'].to_numpy(dtype=float),
+        shifts['Week'].to_numpy(dtype=np.int64),
+        n_groups,
+        offsite=offsite_data
+    )
+    findings = [
+        drop_shadowed(violations)
+        for violations in check_rules(rules, metrics, resources['employmentType'], resources['hoursPerWeek'])
+    ]
+
+    result = resources.copy()
+    for field, values in metrics.items():
+        result[field] = values
+    for field in ('max_consecutive_days', 'min_gap_hours', 'week1_hours', 'week2_hours', 'total_hours'):
+        result[f'{field}_severity'] = [
+            field_severity({'violations': violations}, field) for violations in findings
+        ]
+    result['findings'] = findings
+    result['violations'] = [[v['message'] for v in violations] for violations in findings]
+    result['hard_violations'] = [sum(v['severity'] == HARD for v in violations) for violations in findings]
+    result['soft_violations'] = [sum(v['severity'] == SOFT for v in violations) for violations in findings]
+    return result
@@ -0,0 +1,266 @@
+"""Incrementally maintained constraint state per (resource, roster period).
+
+A ConstraintState keeps running week totals, a sorted shift list, a
+day-occupancy bitmap per roster week and a multiset of gaps between
+neighbouring shifts, so inserting or removing one shift updates the summary
+without re-reading or re-aggregating the resource's appointments.
+"""
+import copy
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from heapq import heappop, heappush
+
+import numpy as np
+import pandas as pd
+
+from constraint_rules import summarize
+
+
+class MinMultiset:
+    """Multiset with O(log n) add/remove and amortised O(log n) min (lazy deletion heap)"""
+
+    def __init__(self):
+        self._heap = []
+        self._removed = Counter()
+        self._size = 0
+
+    def add(self, value):
+        heappush(self._heap, value)
+        self._size += 1
+
+    def remove(self, value):
+        self._removed[value] += 1
+        self._size -= 1
+
+    def min(self):
+        while self._heap and self._removed[self._heap[0]]:
+            self._removed[self._heap[0]] -= 1
+            heappop(self._heap)
+        return self._heap[0] if self._size else None
+
+
+def longest_run(bits):
+    """Length of the longest run of set bits (consecutive worked days)"""
+    run = 0
+    while bits:
+        bits &= bits >> 1
+        run += 1
+    return run
+
+
+class ConstraintState:
+    """Roster metrics for one resource over one location's roster period.
+
+    States are shared by every session through ConstraintStore, so reads and
+    updates hold the state's own lock: a summary is never built from a
+    half-applied shift.
+    """
+
+    def __init__(self, location, period_start, period_end, employment_type, contracted_hours):
+        self.location = location
+        self.period_start = pd.Timestamp(period_start).normalize()
+        self.period_end = pd.Timestamp(period_end).normalize()
+        self.employment_type = employment_type
+        self.contracted_hours = contracted_hours
+
+        self._shifts = []            # sorted (start, end, appointment_id)
+        self._details = {}           # appointment_id -> shift record
+        self._week_minutes = [0.0, 0.0, 0.0]
+        self._day_counts = Counter()  # (week, day offset) -> shifts that day
+        self._day_minutes = Counter()  # date -> scheduled minutes at this location
+        self._day_bits = {1: 0, 2: 0}
+        self._gaps = MinMultiset()           # minutes between neighbouring shifts
+        self._same_day_gaps = MinMultiset()
+        self._summary = None
+        self._summary_offsite = None
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def __contains__(self, appointment_id):
+        return appointment_id in self._details
+
+    def __len__(self):
+        return len(self._shifts)
+
+    def copy(self):
+        with self._lock:
+            return copy.deepcopy(self)
+
+    def matches_location(self, location_text):
+        """Same test as the LIKE '%location%' filter used to load the state"""
+        return bool(location_text) and self.location.lower() in location_text.lower()
+
+    def week_of(self, start):
+        """Roster week of a shift start (None when outside the period)"""
+        day = pd.Timestamp(start).normalize()
+        if day < self.period_start or day > self.period_end:
+            return None
+        return 1 if (day - self.period_start).days < 7 else 2
+
+    @staticmethod
+    def _gap(earlier, later):
+        return int((later[0] - earlier[1]).total_seconds() // 60)
+
+    def _link(self, earlier, later, add=True):
+        gap = self._gap(earlier, later)
+        op = "add" if add else "remove"
+        getattr(self._gaps, op)(gap)
+        if earlier[1].date() == later[0].date():
+            getattr(self._same_day_gaps, op)(gap)
+
+    def add(self, appointment_id, start, end, minutes):
+        """Insert one shift; returns False if it is already present or outside the period"""
+        with self._lock:
+            week = self.week_of(start)
+            if appointment_id in self._details or week is None:
+                return False
+            start, end = pd.Timestamp(start), pd.Timestamp(end)
+            shift = (start, end, appointment_id)
+
+            i = bisect_left(self._shifts, shift)
+            before = self._shifts[i - 1] if i > 0 else None
+            after = self._shifts[i] if i < len(self._shifts) else None
+            if before and after:
+                self._link(before, after, add=False)
+            if before:
+                self._link(before, shift)
+            if after:
+                self._link(shift, after)
+            insort(self._shifts, shift)
+
+            minutes = float(0 if minutes is None or pd.isna(minutes) else minutes)
+            self._week_minutes[week] += minutes
+            day = (start.normalize() - self.period_start).days
+            self._day_counts[(week, day)] += 1
+            self._day_bits[week] |= 1 << day
+            self._day_minutes[start.date()] += minutes
+
+            self._details[appointment_id] = {
+                'AppointmentID': appointment_id,
+                'StartDateTime': start,
+                'EndDateTime': end,
+                'DurationMinutes': minutes,
+                'Date': start.date(),
+                'Week': week,
+            }
+            self._summary = None
+            return True
+
+    def remove(self, appointment_id):
+        """Remove one shift; returns False if it is not part of this state"""
+        with self._lock:
+            record = self._details.pop(appointment_id, None)
+            if record is None:
+                return False
+            shift = (record['StartDateTime'], record['EndDateTime'], appointment_id)
+
+            i = bisect_left(self._shifts, shift)
+            before = self._shifts[i - 1] if i > 0 else None
+            after = self._shifts[i + 1] if i + 1 < len(self._shifts) else None
+            if before:
+                self._link(before, shift, add=False)
+            if after:
+                self._link(shift, after, add=False)
+            if before and after:
+                self._link(before, after)
+            del self._shifts[i]
+
+            week = record['Week']
+            self._week_minutes[week] -= record['DurationMinutes']
+            day = (record['StartDateTime'].normalize() - self.period_start).days
+            self._day_counts[(week, day)] -= 1
+            if not self._day_counts[(week, day)]:
+                del self._day_counts[(week, day)]
+                self._day_bits[week] &= ~(1 << day)
+            self._day_minutes[record['StartDateTime'].date()] -= record['DurationMinutes']
+            self._summary = None
+            return True
+
+    def day_minutes(self, day):
+        """Minutes scheduled at this location on one date"""
+        with self._lock:
+            return self._day_minutes.get(day, 0)
+
+    def metrics(self, offsite=()):
+        """Current metrics; offsite (date, minutes, week) records add hours and worked days"""
+        with self._lock:
+            week_minutes = list(self._week_minutes)
+            day_bits = dict(self._day_bits)
+            for day, minutes, week in offsite:
+                week_minutes[week] += minutes
+                day_bits[week] |= 1 << (pd.Timestamp(day) - self.period_start).days
+
+            min_gap = self._gaps.min()
+            same_day_gap = self._same_day_gaps.min()
+            return {
+                'week1_hours': week_minutes[1] / 60,
+                'week2_hours': week_minutes[2] / 60,
+                'total_hours': (week_minutes[1] + week_minutes[2]) / 60,
+                'min_gap_hours': np.nan if min_gap is None else min_gap / 60,
+                'same_day_min_gap': np.nan if same_day_gap is None else same_day_gap / 60,
+                'max_consecutive_days': float(max(longest_run(bits) for bits in day_bits.values())),
+            }
+
+    def summary(self, rules, offsite=()):
+        """Constraint summary, recomputed only after the state or offsite hours changed"""
+        with self._lock:
+            offsite = tuple(offsite)
+            if self._summary is None or self._summary_offsite != offsite:
+                shift_details = [self._details[appointment_id] for _, _, appointment_id in self._shifts]
+                self._summary = summarize(
+                    rules, self.metrics(offsite), self.employment_type, self.contracted_hours,
+                    shift_details, offsite
+                )
+                self._summary_offsite = offsite
+            return self._summary
+
+
+class ConstraintStore:
+    """Process-wide ConstraintStates keyed by (resource, location, period start)"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._states = {}
+        self._loaded_at = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """Cached state for key, built with loader() when missing or older than ttl"""
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None and time.monotonic() - self._loaded_at[key] < self.ttl:
+                return state
+        state = loader()
+        with self._lock:
+            self._states[key] = state
+            self._loaded_at[key] = time.monotonic()
+        return state
+
+    def add_shift(self, resource_name, location_text, appointment_id, start, end, minutes):
+        """Apply a committed assignment to every loaded state it belongs to"""
+        with self._lock:
+            for key, state in self._states.items():
+                if key[0] == resource_name and state.matches_location(location_text):
+                    state.add(appointment_id, start, end, minutes)
+
+    def remove_shift(self, appointment_id):
+        """Apply a committed unassignment to every loaded state holding the shift"""
+        with self._lock:
+            for state in self._states.values():
+                state.remove(appointment_id)
+
+    def discard(self, resource_name=None):
+        with self._lock:
+            for key in [key for key in self._states if resource_name in (None, key[0])]:
+                del self._states[key]
+                del self._loaded_at[key]
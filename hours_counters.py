@@ -0,0 +1,109 @@
+"""Maintained hours counters: scheduled minutes per resource per day.
+
+ResourceDailyHours (migrations/002_resource_daily_hours.sql) is adjusted by
+every write in the same transaction as the appointment update, so a
+resource's hours in a roster period are one aggregated primary-key seek
+instead of a re-read of its appointments. lock=True takes update locks on the
+counters so a cap check and the write that follows it are atomic: two
+coordinators assigning the same worker at once are serialized and the second
+sees the first one's hours.
+"""
+from constraint_rules import HARD
+
+PERIOD_HOURS = """
+SELECT
+    COALESCE(SUM(CASE WHEN WorkDate <= ? THEN Minutes END), 0) / 60.0 AS Week1Hours,
+    COALESCE(SUM(CASE WHEN WorkDate > ? THEN Minutes END), 0) / 60.0 AS Week2Hours
+FROM ResourceDailyHours {hint}
+WHERE Resource = ?
+AND WorkDate >= ?
+AND WorkDate <= ?
+"""
+
+
+def period_hours(cursor, resource_name, week_ranges, lock=False):
+    """[week 1 hours, week 2 hours] of a resource across every location in a roster period"""
+    hint = "WITH (UPDLOCK, HOLDLOCK)" if lock else ""
+    cursor.execute(
+        PERIOD_HOURS.format(hint=hint),
+        week_ranges['week1_end'],
+        week_ranges['week1_end'],
+        resource_name,
+        week_ranges['week1_start'],
+        week_ranges['week2_end']
+    )
+    row = cursor.fetchone()
+    return [float(row[0] or 0), float(row[1] or 0)]
+
+
+def adjust(cursor, resource_name, day, minutes):
+    """Add (or with negative minutes remove) scheduled minutes for one resource and day"""
+    cursor.execute(
+        "UPDATE ResourceDailyHours SET Minutes = Minutes + ? WHERE Resource = ? AND WorkDate = ?",
+        float(minutes or 0), resource_name, day
+    )
+    if cursor.rowcount == 0:
+        cursor.execute(
+            "INSERT INTO ResourceDailyHours (Resource, WorkDate, Minutes) VALUES (?, ?, ?)",
+            resource_name, day, float(minutes or 0)
+        )
+
+
+def hour_caps(rules, employment_type, contracted_hours=None):
+    """Tightest hard upper limit on week_hours and total_hours for one employment type"""
+    caps = {}
+    for rule in rules:
+        if rule.severity != HARD or rule.metric not in ('week_hours', 'total_hours'):
+            continue
+        if rule.employment_types is not None and employment_type not in rule.employment_types:
+            continue
+        if not rule.passes(0.0, 1.0):  # only upper limits (<=, <) are caps
+            continue
+        if rule.uses_contracted:
+            if contracted_hours is None or contracted_hours != contracted_hours:
+                continue
+            limit = float(contracted_hours) * rule.factor
+        else:
+            limit = rule.limit * rule.factor
+        caps[rule.metric] = min(caps.get(rule.metric, limit), limit)
+    return caps
+
+
+def min_gap_floor(rules, employment_type):
+    """Largest hard minimum rest gap in hours for one employment type, or None"""
+    floors = [
+        rule.limit * rule.factor
+        for rule in rules
+        if rule.severity == HARD and rule.metric == 'min_gap_hours' and not rule.uses_contracted
+        and (rule.employment_types is None or employment_type in rule.employment_types)
+        and rule.passes(1.0, 0.0)  # only lower limits (>=, >)
+    ]
+    return max(floors) if floors else None
+
+
+def max_consecutive_days(rules, employment_type):
+    """Longest hard-allowed run of consecutive worked days for one employment type, or None"""
+    caps = []
+    for rule in rules:
+        if rule.severity != HARD or rule.metric != 'consecutive_days' or rule.uses_contracted:
+            continue
+        if rule.employment_types is not None and employment_type not in rule.employment_types:
+            continue
+        if not rule.passes(0.0, 1.0):  # only upper limits (<=, <)
+            continue
+        limit = rule.limit * rule.factor
+        caps.append(int(limit) if rule.passes(float(int(limit)), limit) else int(limit) - 1)
+    return min(caps) if caps else None
+
+
+def cap_breach(caps, week_hours, week_num, extra_hours=0.0):
+    """Message for the first hard cap the period hours (plus extra_hours in week_num) break, or None"""
+    weeks = list(week_hours)
+    weeks[week_num - 1] += extra_hours
+    cap = caps.get('week_hours')
+    if cap is not None and weeks[week_num - 1] > cap + 1e-9:
+        return f"Week {week_num} hours would be {weeks[week_num - 1]:.1f}h (max {cap:g}h)"
+    cap = caps.get('total_hours')
+    if cap is not None and sum(weeks) > cap + 1e-9:
+        return f"Total hours would be {sum(weeks):.1f}h (max {cap:g}h)"
+    return None
@@ -0,0 +1,80 @@
+"""Organisation-wide hours ledger: scheduled minutes per resource per day.
+
+Built from one grouped query across every location, cached per process and
+updated in place on each write, so hour limits see a worker's shifts at all
+rosters without a per-(resource, location) query.
+"""
+import threading
+from collections import defaultdict
+
+import pandas as pd
+
+
+class HoursLedger:
+    """Scheduled minutes per normalized resource name per date, across all locations"""
+
+    def __init__(self, frame):
+        """frame has Resource, WorkDate and Minutes columns (one row per resource per day)"""
+        self._lock = threading.Lock()
+        self._minutes = defaultdict(dict)
+        if frame.empty:
+            return
+
+        frame = frame.assign(
+            Resource=frame['Resource'].str.split().str.join(' '),
+            WorkDate=pd.to_datetime(frame['WorkDate']).dt.date,
+            Minutes=frame['Minutes'].astype(float).fillna(0)
+        )
+        # Names that only differed by whitespace collapse onto the same key
+        frame = frame.groupby(['Resource', 'WorkDate'], as_index=False)['Minutes'].sum()
+        for resource, days in frame.groupby('Resource'):
+            self._minutes[resource] = dict(zip(days['WorkDate'], days['Minutes']))
+
+    def __len__(self):
+        return len(self._minutes)
+
+    def add(self, resource_name, day, minutes):
+        """Apply a committed write: positive minutes for an assign, negative for an unassign"""
+        with self._lock:
+            days = self._minutes[resource_name]
+            total = days.get(day, 0) + float(minutes or 0)
+            if total > 0:
+                days[day] = total
+            else:
+                days.pop(day, None)
+
+    def day_minutes(self, resource_name, start, end):
+        """{date: minutes} for one resource between two dates (inclusive)"""
+        with self._lock:
+            days = self._minutes.get(resource_name, {})
+            return {day: minutes for day, minutes in days.items() if start <= day <= end}
+
+    def offsite(self, resource_name, state, adjustments=None):
+        """(date, minutes, week) worked outside a ConstraintState's location in its period.
+
+        adjustments maps dates to minutes not yet in the ledger (e.g. staged
+        sandbox changes, negative for removals).
+        """
+        start = state.period_start.date()
+        end = state.period_end.date()
+        days = self.day_minutes(resource_name, start, end)
+        for day, minutes in (adjustments or {}).items():
+            if start <= day <= end:
+                days[day] = days.get(day, 0) + minutes
+
+        offsite = []
+        for day in sorted(days):
+            minutes = days[day] - state.day_minutes(day)
+            if minutes > 0:
+                offsite.append((day, minutes, state.week_of(day)))
+        return offsite
+
+    def frame(self, resource_names, start, end):
+        """Resource/WorkDate/Minutes rows for many resources between two dates (inclusive)"""
+        rows = []
+        with self._lock:
+            for resource in resource_names:
+                for day, minutes in self._minutes.get(resource, {}).items():
+                    if start <= day <= end:
+                        rows.append((resource, day, minutes))
+        return pd.DataFrame(rows, columns=['Resource', 'WorkDate', 'Minutes'])
@@ -0,0 +1,317 @@
+"""Simulate many coordinators using roster_app.py at once and check for regressions.
+
+Every simulated session drives the app through streamlit.testing AppTest:
+it opens the app, selects a roster, then repeatedly opens the assignment
+tab, expands a card, picks a resource, assigns it and switches to the
+calendar and team tabs. Sessions run in parallel worker processes against a
+scratch copy of a SQLite database (see ROSTER_LOCAL_DB), so the source
+database is never written. Queries are counted from the ROSTER_TRACE trace of
+each worker.
+
+The database needs the NewAppointments, Resources and ResourceDailyHours
+tables. Without a copy of the real ones, --seed N runs against a synthetic
+database instead: N rosters with a fortnight of shifts in the current cycle
+and a dozen workers each (create_fixture).
+
+    python load_test.py roster.db [--sessions 20] [--concurrency 4] [--iterations 2]
+                       [--max-p95-ms 2000] [--max-queries 25] [--max-session-kb 512]
+    python load_test.py --seed 5 [--sessions 20] ...
+
+Exits with status 1 when a threshold is exceeded or the app raised.
+"""
+import argparse
+import os
+import pickle
+import random
+import resource
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "roster_app.py")
+
+FIXTURE_SCHEMA = """
+CREATE TABLE NewAppointments (
+    Id TEXT PRIMARY KEY,
+    Name TEXT,
+    maica__Scheduled_Start__c TEXT,
+    maica__Scheduled_End__c TEXT,
+    maica__Scheduled_Duration_Minutes__c REAL,
+    maica__Participants__c TEXT,
+    maica__Participant_Location__c TEXT,
+    maica__Resources__c TEXT
+);
+CREATE INDEX ix_appointments_start ON NewAppointments (maica__Scheduled_Start__c);
+CREATE TABLE NewAppointmentsArchive (
+    Id TEXT PRIMARY KEY,
+    Name TEXT,
+    maica__Scheduled_Start__c TEXT,
+    maica__Scheduled_End__c TEXT,
+    maica__Scheduled_Duration_Minutes__c REAL,
+    maica__Participants__c TEXT,
+    maica__Participant_Location__c TEXT,
+    maica__Resources__c TEXT,
+    ArchivedAt TEXT
+);
+CREATE TABLE RosterCycles (
+    Location TEXT PRIMARY KEY,
+    CycleStart TEXT NOT NULL
+);
+CREATE TABLE Resources (
+    id TEXT PRIMARY KEY,
+    fullName TEXT,
+    employmentType TEXT,
+    hoursPerWeek REAL,
+    primaryLocation TEXT,
+    Status TEXT,
+    jobTitle TEXT
+);
+CREATE TABLE ResourceDailyHours (
+    Resource TEXT NOT NULL,
+    WorkDate TEXT NOT NULL,
+    Minutes REAL NOT NULL,
+    PRIMARY KEY (Resource, WorkDate)
+);
+"""
+SHIFT_HOURS = (7, 15, 23)  # three 8 hour shifts a day
+WORKERS_PER_ROSTER = 12
+EMPLOYMENT_TYPES = ("Full Time", "Part Time", "Casual")
+
+
+def create_fixture(path, rosters, assigned=0.5, seed=0):
+    """Write a synthetic roster database to path.
+
+    Each roster gets the current fortnight of shifts (the cycle starting on
+    Monday last week), WORKERS_PER_ROSTER workers based there and about
+    `assigned` of its shifts assigned to them; hours counters match.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    cycle_start = datetime.combine(today - timedelta(days=today.weekday() + 7), datetime.min.time())
+    resources, appointments = [], []
+    for roster in range(rosters):
+        location = f"Load Test House {roster + 1}"
+        workers = [f"Load Worker {roster + 1}-{worker + 1}" for worker in range(WORKERS_PER_ROSTER)]
+        for worker, name in enumerate(workers):
+            employment_type = EMPLOYMENT_TYPES[worker % len(EMPLOYMENT_TYPES)]
+            resources.append((
+                f"R{roster}-{worker}", name, employment_type, 38 if employment_type == "Full Time" else 20,
+                location, "Active", "Disability Support Worker"
+            ))
+        for day in range(14):
+            for hour in SHIFT_HOURS:
+                start = cycle_start + timedelta(days=day, hours=hour)
+                appointments.append((
+                    f"A{len(appointments)}", f"Shift {len(appointments)}",
+                    start.strftime("%Y-%m-%d %H:%M:%S"), (start + timedelta(hours=8)).strftime("%Y-%m-%d %H:%M:%S"),
+                    480.0, f"Roster {location}", location,
+                    rng.choice(workers) if rng.random() < assigned else None
+                ))
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(FIXTURE_SCHEMA)
+        conn.executemany("INSERT INTO Resources VALUES (?, ?, ?, ?, ?, ?, ?)", resources)
+        conn.executemany("INSERT INTO NewAppointments VALUES (?, ?, ?, ?, ?, ?, ?, ?)", appointments)
+        conn.execute("""
+        INSERT INTO ResourceDailyHours (Resource, WorkDate, Minutes)
+        SELECT maica__Resources__c, DATE(maica__Scheduled_Start__c), SUM(maica__Scheduled_Duration_Minutes__c)
+        FROM NewAppointments
+        WHERE maica__Resources__c IS NOT NULL
+        GROUP BY 1, 2
+        """)
+        conn.commit()
+    finally:
+        conn.close()
+    return len(appointments)
+
+
+def _init_worker(db_path, trace_dir):
+    """Each worker process reads the scratch database and writes its own trace"""
+    os.chdir(os.path.dirname(APP))  # the app loads styles.css and image.png relative to itself
+    os.environ["ROSTER_LOCAL_DB"] = db_path
+    os.environ["ROSTER_TRACE"] = os.path.join(trace_dir, f"trace-{os.getpid()}.jsonl")
+
+
+def _statements():
+    """Statements this worker has traced so far"""
+    try:
+        with open(os.environ["ROSTER_TRACE"], "rb") as f:
+            return f.read().count(b"\n")
+    except FileNotFoundError:
+        return 0
+
+
+def run_session(session, iterations, timeout):
+    """Drive one simulated coordinator; returns (step rows, session row)"""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    steps = []
+    errors = 0
+
+    def step(name, action):
+        nonlocal errors
+        before = _statements()
+        started = time.perf_counter()
+        action()
+        elapsed = (time.perf_counter() - started) * 1000
+        failed = len(at.exception)
+        errors += failed
+        steps.append({
+            'session': session,
+            'step': name,
+            'ms': elapsed,
+            'queries': _statements() - before,
+            'errors': failed,
+        })
+
+    def open_tab(tab):
+        at.session_state["main_tab"] = tab
+        at.run()
+
+    def keyed(widgets, prefix):
+        return [widget for widget in widgets if widget.key and widget.key.startswith(prefix)]
+
+    step("open", at.run)
+    rosters = at.selectbox(key="location_selectbox").options
+    roster = rosters[session % len(rosters)] if rosters else None
+    if roster:
+        step("select_roster", lambda: at.selectbox(key="location_selectbox").select(roster).run())
+
+    for _ in range(iterations):
+        step("tab_assign", lambda: open_tab("assign"))
+        cards = keyed(at.button, "expand-btn")
+        if cards:
+            step("expand", cards[session % len(cards)].click().run)
+            pickers = keyed(at.selectbox, "local_select")
+            if pickers and len(pickers[0].options) > 1:
+                picker = pickers[0]
+                choice = picker.options[1 + session % (len(picker.options) - 1)].split(" (")[0]
+
+                def pick():
+                    at.session_state[picker.key] = choice
+                    at.run()
+
+                step("pick_resource", pick)
+                buttons = keyed(at.button, "assign_btn")
+                if buttons:
+                    step("assign", buttons[0].click().run)
+        step("tab_calendar", lambda: open_tab("calendar"))
+        step("tab_team", lambda: open_tab("team"))
+
+    state = at.session_state.to_dict()
+    state_bytes = 0
+    for value in state.values():
+        try:
+            state_bytes += len(pickle.dumps(value))
+        except Exception:
+            pass
+    summary = {
+        'session': session,
+        'roster': roster,
+        'reruns': len(steps),
+        'total_ms': sum(row['ms'] for row in steps),
+        'queries': sum(row['queries'] for row in steps),
+        'state_kb': state_bytes / 1024,
+        'worker_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'errors': errors,
+    }
+    return steps, summary
+
+
+def run_sessions(sessions, iterations, timeout):
+    """One worker's share of the sessions, run back to back.
+
+    AppTest runs the app as __main__ in this process, so a worker takes a
+    single task and keeps its caches warm across its sessions like a server.
+    """
+    return [run_session(session, iterations, timeout) for session in sessions]
+
+
+def run_load(db, sessions, concurrency, iterations, timeout=60, seed_rosters=None):
+    """Run every session on a scratch copy of db (or a seed_rosters fixture); returns (per step, per session) frames"""
+    with tempfile.TemporaryDirectory() as scratch:
+        db_path = os.path.join(scratch, "roster.db")
+        if seed_rosters:
+            create_fixture(db_path, seed_rosters)
+        else:
+            shutil.copyfile(db, db_path)
+        with ProcessPoolExecutor(
+            max_workers=concurrency, initializer=_init_worker, initargs=(db_path, scratch)
+        ) as pool:
+            shares = [list(range(sessions))[worker::concurrency] for worker in range(concurrency)]
+            results = [
+                result
+                for share in pool.map(run_sessions, shares, [iterations] * concurrency, [timeout] * concurrency)
+                for result in share
+            ]
+    steps = pd.DataFrame([row for session_steps, _ in results for row in session_steps])
+    summary = pd.DataFrame([session_summary for _, session_summary in results])
+    return steps, summary
+
+
+def step_report(steps):
+    """Rerun latency percentiles and query counts per step type"""
+    return steps.groupby('step').agg(
+        reruns=('ms', 'size'),
+        p50_ms=('ms', 'median'),
+        p95_ms=('ms', lambda ms: np.percentile(ms, 95)),
+        p99_ms=('ms', lambda ms: np.percentile(ms, 99)),
+        max_ms=('ms', 'max'),
+        queries=('queries', 'mean'),
+        errors=('errors', 'sum'),
+    ).round(1)
+
+
+def check_thresholds(steps, summary, max_p95_ms, max_queries, max_session_kb):
+    """Human-readable failures; empty when the run passes"""
+    failures = []
+    p95 = np.percentile(steps['ms'], 95)
+    if p95 > max_p95_ms:
+        failures.append(f"rerun p95 {p95:.0f} ms > {max_p95_ms} ms")
+    worst = steps['queries'].max()
+    if worst > max_queries:
+        failures.append(f"{worst} queries in one rerun > {max_queries}")
+    largest = summary['state_kb'].max()
+    if largest > max_session_kb:
+        failures.append(f"session state {largest:.0f} KB > {max_session_kb} KB")
+    errors = summary['errors'].sum()
+    if errors:
+        failures.append(f"{errors} reruns raised an exception")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("db", nargs="?", help="SQLite copy of the roster tables (never modified)")
+    parser.add_argument("--seed", type=int, metavar="ROSTERS", help="run on a synthetic database with this many rosters")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed for one rerun")
+    parser.add_argument("--max-p95-ms", type=float, default=2000)
+    parser.add_argument("--max-queries", type=int, default=25, help="most queries allowed in one rerun")
+    parser.add_argument("--max-session-kb", type=float, default=512)
+    args = parser.parse_args()
+    if not args.db and not args.seed:
+        parser.error("give a database or --seed ROSTERS")
+
+    started = time.perf_counter()
+    steps, summary = run_load(args.db, args.sessions, args.concurrency, args.iterations, args.timeout, args.seed)
+    print(f"{len(summary)} sessions, {len(steps)} reruns in {time.perf_counter() - started:.1f}s")
+    print(step_report(steps).to_string())
+    print(summary.round(1).to_string(index=False))
+
+    failures = check_thresholds(steps, summary, args.max_p95_ms, args.max_queries, args.max_session_kb)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("FAIL" if failures else "PASS")
+    sys.exit(1 if failures else 0)
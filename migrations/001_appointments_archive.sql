@@ -0,0 +1,41 @@
+-- Cold storage for appointments older than the active roster window.
+--
+-- NewAppointmentsArchive has the columns NewAppointments had when it was
+-- cloned plus the time each row was archived. archive_job.py moves rows with
+-- named OUTPUT and INTO column lists (ARCHIVED_COLUMNS), so column order does
+-- not matter and columns added to the live table later, such as the
+-- replica's RowVer from 004, are not carried over.
+
+IF OBJECT_ID('dbo.NewAppointmentsArchive', 'U') IS NULL
+BEGIN
+    SELECT TOP 0 *
+    INTO dbo.NewAppointmentsArchive
+    FROM dbo.NewAppointments;
+
+    ALTER TABLE dbo.NewAppointmentsArchive
+        ADD ArchivedAt DATETIME2 NOT NULL
+            CONSTRAINT DF_NewAppointmentsArchive_ArchivedAt DEFAULT SYSUTCDATETIME();
+END
+GO
+
+-- History views read one location over a date range
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_NewAppointmentsArchive_Start')
+    CREATE INDEX IX_NewAppointmentsArchive_Start
+        ON dbo.NewAppointmentsArchive (maica__Scheduled_Start__c)
+        INCLUDE (maica__Participant_Location__c, maica__Resources__c);
+GO
+
+-- Live queries are bounded by scheduled start; with the archive keeping the
+-- table small this range seek replaces the full scans the LIKE filters forced
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_NewAppointments_Start')
+    CREATE INDEX IX_NewAppointments_Start
+        ON dbo.NewAppointments (maica__Scheduled_Start__c)
+        INCLUDE (
+            maica__Participant_Location__c,
+            maica__Participants__c,
+            maica__Resources__c,
+            maica__Scheduled_End__c,
+            maica__Scheduled_Duration_Minutes__c,
+            Name
+        );
+GO
@@ -0,0 +1,31 @@
+-- Maintained hours counters: scheduled minutes per resource per day across
+-- every location. The app adjusts a counter in the same transaction as each
+-- assign, unassign, sandbox commit and template insert (hours_counters.py),
+-- so hour caps are checked against one seek on the primary key.
+--
+-- Run while no one is assigning: the backfill below is a point-in-time copy.
+
+IF OBJECT_ID('dbo.ResourceDailyHours', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.ResourceDailyHours (
+        Resource NVARCHAR(255) NOT NULL,
+        WorkDate DATE NOT NULL,
+        Minutes FLOAT NOT NULL,
+        CONSTRAINT PK_ResourceDailyHours PRIMARY KEY CLUSTERED (Resource, WorkDate)
+    );
+
+    -- Names are stored the way the app normalizes them: trimmed, single spaces
+    INSERT INTO dbo.ResourceDailyHours (Resource, WorkDate, Minutes)
+    SELECT
+        REPLACE(REPLACE(LTRIM(RTRIM(maica__Resources__c)), '  ', ' '), '  ', ' '),
+        CAST(maica__Scheduled_Start__c AS DATE),
+        COALESCE(SUM(maica__Scheduled_Duration_Minutes__c), 0)
+    FROM dbo.NewAppointments
+    WHERE maica__Resources__c IS NOT NULL
+    AND LTRIM(RTRIM(maica__Resources__c)) != ''
+    AND maica__Resources__c != 'NULL'
+    GROUP BY
+        REPLACE(REPLACE(LTRIM(RTRIM(maica__Resources__c)), '  ', ' '), '  ', ' '),
+        CAST(maica__Scheduled_Start__c AS DATE);
+END
+GO
@@ -0,0 +1,199 @@
+-- Check-and-assign in one round trip and one transaction.
+--
+-- The app passes the roster period and the hard limits from roster_rules.toml
+-- (a NULL limit is not checked). The procedure locks the appointment and the
+-- resource's hours counters (migrations/002), checks that the appointment is
+-- still unassigned, the week/fortnight hour caps across every location, the
+-- rest gap to the resource's neighbouring shifts at this roster and the run
+-- of consecutive worked days (any location) within the shift's roster week,
+-- then assigns and updates the counter. It returns two result sets:
+--   1. rejection reasons (Rule, Message, Value, LimitValue); empty = assigned
+--   2. the appointment (StartDateTime, EndDateTime, DurationMinutes, Location, Week)
+-- Call it with autocommit on: it commits or rolls back its own transaction.
+
+CREATE OR ALTER PROCEDURE dbo.usp_AssignResource
+    @AppointmentId NVARCHAR(50),
+    @Resource NVARCHAR(255),
+    @Location NVARCHAR(255),
+    @Week1Start DATE,
+    @Week1End DATE,
+    @Week2End DATE,
+    @WeekCapHours FLOAT = NULL,
+    @TotalCapHours FLOAT = NULL,
+    @MinGapHours FLOAT = NULL,
+    @MaxConsecutiveDays INT = NULL
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    DECLARE @Reasons TABLE (
+        [Rule] NVARCHAR(50) NOT NULL,
+        Message NVARCHAR(400) NOT NULL,
+        Value FLOAT NULL,
+        LimitValue FLOAT NULL
+    );
+    DECLARE @Start DATETIME2, @End DATETIME2, @Minutes FLOAT;
+    DECLARE @ApptLocation NVARCHAR(255), @Current NVARCHAR(255);
+    DECLARE @WorkDate DATE, @Week INT;
+    DECLARE @WeekHours FLOAT, @TotalHours FLOAT, @GapHours FLOAT;
+    DECLARE @WeekStart DATE, @WeekEnd DATE, @Day DATE, @RunDays INT;
+
+    BEGIN TRANSACTION;
+
+    -- The update lock keeps the unassigned check true until the UPDATE below
+    SELECT
+        @Start = maica__Scheduled_Start__c,
+        @End = maica__Scheduled_End__c,
+        @Minutes = COALESCE(
+            maica__Scheduled_Duration_Minutes__c,
+            DATEDIFF(MINUTE, maica__Scheduled_Start__c, maica__Scheduled_End__c)
+        ),
+        @ApptLocation = maica__Participant_Location__c,
+        @Current = maica__Resources__c
+    FROM dbo.NewAppointments WITH (UPDLOCK, ROWLOCK)
+    WHERE Id = @AppointmentId;
+
+    IF @Start IS NULL
+        INSERT INTO @Reasons VALUES ('not_found', 'Appointment not found', NULL, NULL);
+    ELSE IF @Current IS NOT NULL AND LTRIM(RTRIM(@Current)) NOT IN ('', 'NULL')
+        INSERT INTO @Reasons VALUES ('already_assigned', CONCAT('Already assigned to ', @Current), NULL, NULL);
+    ELSE
+    BEGIN
+        SET @WorkDate = CAST(@Start AS DATE);
+        IF @WorkDate < @Week1Start OR @WorkDate > @Week2End
+            INSERT INTO @Reasons VALUES (
+                'outside_period',
+                CONCAT('Shift on ', CONVERT(VARCHAR(10), @WorkDate, 23), ' is outside the roster period'),
+                NULL, NULL
+            );
+    END
+
+    IF NOT EXISTS (SELECT 1 FROM @Reasons)
+    BEGIN
+        SET @Week = CASE WHEN @WorkDate > @Week1End THEN 2 ELSE 1 END;
+
+        -- Hours at every location in the period, locked until commit so two
+        -- assignments of the same worker are checked one after the other
+        SELECT
+            @WeekHours = (COALESCE(SUM(CASE WHEN (CASE WHEN WorkDate > @Week1End THEN 2 ELSE 1 END) = @Week
+                                            THEN Minutes END), 0) + @Minutes) / 60.0,
+            @TotalHours = (COALESCE(SUM(Minutes), 0) + @Minutes) / 60.0
+        FROM dbo.ResourceDailyHours WITH (UPDLOCK, HOLDLOCK)
+        WHERE Resource = @Resource
+        AND WorkDate >= @Week1Start
+        AND WorkDate <= @Week2End;
+
+        IF @WeekCapHours IS NOT NULL AND @WeekHours > @WeekCapHours
+            INSERT INTO @Reasons VALUES (
+                'week_hours',
+                CONCAT('Week ', @Week, ' hours would be ', FORMAT(@WeekHours, '0.0'), 'h (max ', @WeekCapHours, 'h)'),
+                @WeekHours, @WeekCapHours
+            );
+        IF @TotalCapHours IS NOT NULL AND @TotalHours > @TotalCapHours
+            INSERT INTO @Reasons VALUES (
+                'total_hours',
+                CONCAT('Total hours would be ', FORMAT(@TotalHours, '0.0'), 'h (max ', @TotalCapHours, 'h)'),
+                @TotalHours, @TotalCapHours
+            );
+
+        -- Rest gap to the shifts just before and just after at this roster
+        IF @MinGapHours IS NOT NULL
+        BEGIN
+            SELECT @GapHours = MIN(GapMinutes) / 60.0
+            FROM (
+                SELECT GapMinutes FROM (
+                    SELECT TOP 1 DATEDIFF(MINUTE, maica__Scheduled_End__c, @Start) AS GapMinutes
+                    FROM dbo.NewAppointments
+                    WHERE REPLACE(REPLACE(maica__Resources__c, '  ', ' '), '  ', ' ') = @Resource
+                    AND maica__Participant_Location__c LIKE '%' + @Location + '%'
+                    AND Id <> @AppointmentId
+                    AND maica__Scheduled_Start__c >= @Week1Start
+                    AND maica__Scheduled_Start__c <= @Start
+                    ORDER BY maica__Scheduled_Start__c DESC
+                ) AS previous_shift
+                UNION ALL
+                SELECT GapMinutes FROM (
+                    SELECT TOP 1 DATEDIFF(MINUTE, @End, maica__Scheduled_Start__c) AS GapMinutes
+                    FROM dbo.NewAppointments
+                    WHERE REPLACE(REPLACE(maica__Resources__c, '  ', ' '), '  ', ' ') = @Resource
+                    AND maica__Participant_Location__c LIKE '%' + @Location + '%'
+                    AND Id <> @AppointmentId
+                    AND maica__Scheduled_Start__c > @Start
+                    AND maica__Scheduled_Start__c < DATEADD(DAY, 1, @Week2End)
+                    ORDER BY maica__Scheduled_Start__c
+                ) AS next_shift
+            ) AS gaps;
+
+            IF @GapHours IS NOT NULL AND @GapHours < @MinGapHours
+                INSERT INTO @Reasons VALUES (
+                    'min_gap',
+                    CONCAT('Minimum ', @MinGapHours, 'h required between shifts (', FORMAT(@GapHours, '0.0'), 'h)'),
+                    @GapHours, @MinGapHours
+                );
+        END
+
+        -- Worked days either side of the shift inside its roster week, read
+        -- from the counters already locked above (at most six lookups each way)
+        IF @MaxConsecutiveDays IS NOT NULL
+        BEGIN
+            SET @WeekStart = CASE WHEN @Week = 2 THEN DATEADD(DAY, 1, @Week1End) ELSE @Week1Start END;
+            SET @WeekEnd = CASE WHEN @Week = 2 THEN @Week2End ELSE @Week1End END;
+            SET @RunDays = 1;
+
+            SET @Day = DATEADD(DAY, -1, @WorkDate);
+            WHILE @Day >= @WeekStart AND EXISTS (
+                SELECT 1 FROM dbo.ResourceDailyHours
+                WHERE Resource = @Resource AND WorkDate = @Day AND Minutes > 0
+            )
+            BEGIN
+                SET @RunDays += 1;
+                SET @Day = DATEADD(DAY, -1, @Day);
+            END
+
+            SET @Day = DATEADD(DAY, 1, @WorkDate);
+            WHILE @Day <= @WeekEnd AND EXISTS (
+                SELECT 1 FROM dbo.ResourceDailyHours
+                WHERE Resource = @Resource AND WorkDate = @Day AND Minutes > 0
+            )
+            BEGIN
+                SET @RunDays += 1;
+                SET @Day = DATEADD(DAY, 1, @Day);
+            END
+
+            IF @RunDays > @MaxConsecutiveDays
+                INSERT INTO @Reasons VALUES (
+                    'consecutive_days',
+                    CONCAT(@RunDays, ' consecutive days (max ', @MaxConsecutiveDays, ' allowed)'),
+                    @RunDays, @MaxConsecutiveDays
+                );
+        END
+    END
+
+    IF EXISTS (SELECT 1 FROM @Reasons)
+        ROLLBACK TRANSACTION;
+    ELSE
+    BEGIN
+        UPDATE dbo.NewAppointments
+        SET maica__Resources__c = @Resource
+        WHERE Id = @AppointmentId;
+
+        UPDATE dbo.ResourceDailyHours
+        SET Minutes = Minutes + @Minutes
+        WHERE Resource = @Resource AND WorkDate = @WorkDate;
+        IF @@ROWCOUNT = 0
+            INSERT INTO dbo.ResourceDailyHours (Resource, WorkDate, Minutes)
+            VALUES (@Resource, @WorkDate, @Minutes);
+
+        COMMIT TRANSACTION;
+    END
+
+    SELECT [Rule], Message, Value, LimitValue FROM @Reasons;
+    SELECT
+        @Start AS StartDateTime,
+        @End AS EndDateTime,
+        @Minutes AS DurationMinutes,
+        @ApptLocation AS Location,
+        @Week AS Week;
+END
+GO
@@ -0,0 +1,32 @@
+-- Change tracking for the local read replica (read_replica.py). SQL Server
+-- bumps a rowversion column on every insert and update, so the sync worker
+-- pulls only the rows changed since its last watermark. Deletes are found by
+-- the replica's periodic key reconcile.
+--
+-- The archive (001) is not given a RowVer: archive_job.py names the columns
+-- it moves, so apply this only with an archive_job.py whose MOVE_BATCH lists
+-- them rather than using OUTPUT DELETED.*.
+
+IF COL_LENGTH('dbo.NewAppointments', 'RowVer') IS NULL
+BEGIN
+    ALTER TABLE dbo.NewAppointments ADD RowVer ROWVERSION;
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_NewAppointments_RowVer')
+BEGIN
+    CREATE INDEX IX_NewAppointments_RowVer ON dbo.NewAppointments (RowVer);
+END
+GO
+
+IF COL_LENGTH('dbo.Resources', 'RowVer') IS NULL
+BEGIN
+    ALTER TABLE dbo.Resources ADD RowVer ROWVERSION;
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Resources_RowVer')
+BEGIN
+    CREATE INDEX IX_Resources_RowVer ON dbo.Resources (RowVer);
+END
+GO
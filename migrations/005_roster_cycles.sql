@@ -0,0 +1,17 @@
+-- Where each roster's fortnightly cycles begin.
+--
+-- Week 1 of every cycle falls a whole number of CYCLE_DAYS after CycleStart.
+-- roster_db.cycle_anchor records it the first time a roster is read, from its
+-- earliest Roster appointment live or archived, and only reads it after that,
+-- so archive_job.py moving old appointments never shifts the week grid.
+-- Correcting a roster's cycle is an UPDATE of its row here.
+
+IF OBJECT_ID('dbo.RosterCycles', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.RosterCycles (
+        Location NVARCHAR(255) NOT NULL
+            CONSTRAINT PK_RosterCycles PRIMARY KEY,
+        CycleStart DATE NOT NULL
+    );
+END
+GO
@@ -0,0 +1,268 @@
+"""Local read replica: the roster tables mirrored into SQLite and kept in sync.
+
+A background worker pulls the rows of NewAppointments and Resources changed
+since its last pull (rowversion watermark, migrations/004) into a local
+SQLite file with the same table and column names, so the app's fetchers run
+unchanged on it through roster_db.local_connection. Only appointments in the
+active window are mirrored. Deleted and archived rows are dropped by a
+periodic key reconcile. Writes still go to the primary; the writer applies
+its committed change to the replica with reflect() so it shows at once.
+
+    ROSTER_READ_REPLICA=replica.db streamlit run roster_app.py
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+
+from roster_db import active_window_start, db_connection, local_connection
+
+logger = logging.getLogger(__name__)
+
+READ_REPLICA = os.getenv("ROSTER_READ_REPLICA")  # SQLite file; reads go to the primary when unset
+SYNC_INTERVAL = float(os.getenv("ROSTER_REPLICA_INTERVAL", "5"))  # seconds between pulls
+SYNC_BATCH = 5000  # rows per pull statement
+RECONCILE_EVERY = 60  # pulls between full key reconciles
+
+TABLES = {
+    'NewAppointments': {
+        'key': 'Id',
+        'columns': [
+            'Id', 'Name', 'maica__Scheduled_Start__c', 'maica__Scheduled_End__c',
+            'maica__Scheduled_Duration_Minutes__c', 'maica__Participants__c',
+            'maica__Participant_Location__c', 'maica__Resources__c',
+        ],
+        'window': 'maica__Scheduled_Start__c',
+    },
+    'Resources': {
+        'key': 'id',
+        'columns': ['id', 'fullName', 'employmentType', 'hoursPerWeek', 'primaryLocation', 'Status', 'jobTitle'],
+        'window': None,
+    },
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS NewAppointments (
+    Id TEXT PRIMARY KEY,
+    Name TEXT,
+    maica__Scheduled_Start__c TEXT,
+    maica__Scheduled_End__c TEXT,
+    maica__Scheduled_Duration_Minutes__c REAL,
+    maica__Participants__c TEXT,
+    maica__Participant_Location__c TEXT,
+    maica__Resources__c TEXT,
+    RowVer INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_appointments_start ON NewAppointments (maica__Scheduled_Start__c);
+CREATE INDEX IF NOT EXISTS ix_appointments_resource ON NewAppointments (maica__Resources__c);
+CREATE TABLE IF NOT EXISTS Resources (
+    id TEXT PRIMARY KEY,
+    fullName TEXT,
+    employmentType TEXT,
+    hoursPerWeek REAL,
+    primaryLocation TEXT,
+    Status TEXT,
+    jobTitle TEXT,
+    RowVer INTEGER
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    table_name TEXT PRIMARY KEY,
+    watermark INTEGER NOT NULL,
+    synced_at TEXT NOT NULL
+);
+"""
+
+_ready = threading.Event()  # set once the replica holds a complete copy
+
+
+@contextmanager
+def read_connection():
+    """Connection for reads: the local replica once it has synced, otherwise the primary"""
+    if READ_REPLICA and _ready.is_set():
+        conn = local_connection(READ_REPLICA)
+        try:
+            yield conn
+        finally:
+            conn.close()
+    else:
+        with db_connection() as conn:
+            yield conn
+
+
+def _local_value(value):
+    """Store values the way the app's queries compare them (CONVERT(VARCHAR, ..., 120) text)"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+class Replica:
+    """SQLite mirror of the primary plus the worker that keeps it current.
+
+    on_synced(appointments, resources) runs after a pull that changed rows;
+    appointments is the set of resource names whose shifts changed (before
+    and after), resources is True when the Resources table changed.
+    """
+
+    def __init__(self, path=READ_REPLICA, connect=db_connection, on_synced=None, interval=SYNC_INTERVAL):
+        self.path = path
+        self.connect = connect
+        self.on_synced = on_synced
+        self.interval = interval
+        self.pulls = 0
+        self.last_sync = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._conn = local_connection(path)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+        if self.watermarks().keys() >= TABLES.keys():
+            _ready.set()  # a copy from an earlier run serves reads while the first pull catches up
+        self._thread = threading.Thread(target=self._run, name="read-replica", daemon=True)
+        self._thread.start()
+
+    def watermarks(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT table_name, watermark FROM sync_state").fetchall()
+        return dict(rows)
+
+    def status(self):
+        """Seconds since the last completed pull (None before the first) and the last error"""
+        age = None if self.last_sync is None else time.monotonic() - self.last_sync
+        return {'ready': _ready.is_set(), 'age': age, 'error': self.last_error}
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.sync()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning("Read replica sync failed: %s", e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def sync(self):
+        """Pull every change since the last watermark; reconcile keys every RECONCILE_EVERY pulls"""
+        watermarks = self.watermarks()
+        changed_resources = set()
+        resources_changed = False
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            for table, spec in TABLES.items():
+                while True:
+                    rows, watermark = self._pull(cursor, table, spec, watermarks.get(table, 0))
+                    if rows:
+                        names = self._upsert(table, spec, rows, watermark)
+                        changed_resources |= names
+                        resources_changed |= table == 'Resources'
+                    elif table not in watermarks:
+                        self._save_watermark(table, 0)
+                    watermarks[table] = watermark
+                    if len(rows) < SYNC_BATCH:
+                        break
+            if self.pulls % RECONCILE_EVERY == 0:
+                changed_resources |= self._reconcile(cursor)
+        self.pulls += 1
+        self.last_sync = time.monotonic()
+        self.last_error = None
+        _ready.set()
+        if (changed_resources or resources_changed) and self.on_synced:
+            self.on_synced(changed_resources, resources_changed)
+
+    def _pull(self, cursor, table, spec, watermark):
+        """Next batch of changed rows, below the oldest in-flight transaction so none are skipped"""
+        where = "RowVer > CAST(? AS BINARY(8)) AND RowVer < MIN_ACTIVE_ROWVERSION()"
+        params = [watermark]
+        if spec['window']:
+            where += f" AND {spec['window']} >= ?"
+            params.append(active_window_start())
+        cursor.execute(
+            f"SELECT TOP ({SYNC_BATCH}) {', '.join(spec['columns'])}, CAST(RowVer AS BIGINT) AS RowVer "
+            f"FROM {table} WHERE {where} ORDER BY RowVer",
+            params
+        )
+        rows = [[_local_value(value) for value in row] for row in cursor.fetchall()]
+        return rows, (rows[-1][-1] if rows else watermark)
+
+    def _upsert(self, table, spec, rows, watermark):
+        """Write a pulled batch and its watermark in one local transaction; returns touched resource names"""
+        columns = spec['columns'] + ['RowVer']
+        updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column != spec['key'])
+        with self._lock, self._conn:
+            names = set()
+            if table == 'NewAppointments':
+                ids = [row[0] for row in rows]
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    names.update(
+                        name for (name,) in self._conn.execute(
+                            f"SELECT maica__Resources__c FROM NewAppointments WHERE Id IN ({', '.join('?' * len(chunk))})",
+                            chunk
+                        )
+                    )
+                names.update(row[columns.index('maica__Resources__c')] for row in rows)
+            self._conn.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT({spec['key']}) DO UPDATE SET {updates}",
+                rows
+            )
+            self._save_watermark(table, watermark, commit=False)
+        return {' '.join(str(name).split()) for name in names if name and str(name).strip().upper() != 'NULL'}
+
+    def _save_watermark(self, table, watermark, commit=True):
+        statement = (
+            "INSERT INTO sync_state (table_name, watermark, synced_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(table_name) DO UPDATE SET watermark = excluded.watermark, synced_at = excluded.synced_at"
+        )
+        params = (table, watermark, datetime.now().isoformat())
+        if commit:
+            with self._lock, self._conn:
+                self._conn.execute(statement, params)
+        else:
+            self._conn.execute(statement, params)
+
+    def _reconcile(self, cursor):
+        """Drop local rows the primary no longer has (deleted, archived or out of the window)"""
+        names = set()
+        for table, spec in TABLES.items():
+            where, params = "", []
+            if spec['window']:
+                where, params = f" WHERE {spec['window']} >= ?", [active_window_start()]
+            cursor.execute(f"SELECT {spec['key']} FROM {table}{where}", params)
+            keys = [(row[0],) for row in cursor.fetchall()]
+            with self._lock, self._conn:
+                self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS primary_keys (key TEXT PRIMARY KEY)")
+                self._conn.execute("DELETE FROM primary_keys")
+                self._conn.executemany("INSERT OR IGNORE INTO primary_keys VALUES (?)", keys)
+                missing = f"{spec['key']} NOT IN (SELECT key FROM primary_keys)"
+                if table == 'NewAppointments':
+                    names.update(
+                        ' '.join(str(name).split())
+                        for (name,) in self._conn.execute(
+                            f"SELECT DISTINCT maica__Resources__c FROM {table} WHERE {missing}"
+                        )
+                        if name and str(name).strip().upper() != 'NULL'
+                    )
+                self._conn.execute(f"DELETE FROM {table} WHERE {missing}")
+        return names
+
+    def reflect(self, appointment_id, resource_name):
+        """Apply a write committed on the primary; the next pull brings the authoritative row"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE NewAppointments SET maica__Resources__c = ? WHERE Id = ?", (resource_name, appointment_id)
+            )
+        self.wake()
@@ -0,0 +1,112 @@
+"""In-memory search index over the resource directory for the resource pickers.
+
+Names are normalized (lower case, letters and digits only) and indexed by
+character trigram and by word prefix, with facets for primary location and
+employment type, so a search over thousands of workers is a few array
+operations and only the top matches are sent to the browser.
+"""
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+import numpy as np
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text):
+    """Lower-case words without punctuation, single spaced"""
+    return " ".join(_NON_WORD.sub(" ", str(text).lower()).split())
+
+
+def trigrams(text):
+    """Character trigrams of each word, padded so word starts and ends count"""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class ResourceIndex:
+    """Trigram and word-prefix index over resource names with location and employment type facets.
+
+    frame needs resource_name, primaryLocation and employmentType columns.
+    """
+
+    def __init__(self, frame):
+        frame = frame.drop_duplicates('resource_name').sort_values('resource_name').reset_index(drop=True)
+        frame = frame.fillna({'primaryLocation': 'Unknown', 'employmentType': 'Unknown'})
+        self.names = frame['resource_name'].tolist()
+        self.details = dict(zip(self.names, zip(frame['primaryLocation'], frame['employmentType'])))
+        self.facets = {
+            'location': self._facet(frame['primaryLocation']),
+            'employment_type': self._facet(frame['employmentType']),
+        }
+
+        grams = defaultdict(list)
+        words = []
+        for position, name in enumerate(self.names):
+            normalized = normalize(name)
+            for gram in trigrams(normalized):
+                grams[gram].append(position)
+            words.extend((word, position) for word in set(normalized.split()))
+        self.grams = {gram: np.array(positions, dtype=np.int32) for gram, positions in grams.items()}
+        words.sort()
+        self.words = [word for word, _ in words]
+        self.word_positions = np.array([position for _, position in words], dtype=np.int32)
+
+    @staticmethod
+    def _facet(values):
+        return {value: np.flatnonzero(values.to_numpy() == value) for value in sorted(values.unique())}
+
+    @property
+    def locations(self):
+        return list(self.facets['location'])
+
+    def _allowed(self, location, employment_type):
+        """Boolean mask of the resources matching the chosen facets"""
+        allowed = np.ones(len(self.names), dtype=bool)
+        for facet, value in (('location', location), ('employment_type', employment_type)):
+            if value is not None:
+                mask = np.zeros(len(self.names), dtype=bool)
+                mask[self.facets[facet].get(value, [])] = True
+                allowed &= mask
+        return allowed
+
+    def _prefixed(self, word):
+        """Positions of resources with a word starting with word"""
+        start = bisect_left(self.words, word)
+        end = bisect_left(self.words, word + "\uffff", start)
+        return self.word_positions[start:end]
+
+    def search(self, text, location=None, employment_type=None, limit=20):
+        """Best matching names for text, alphabetical when text is empty.
+
+        Scores are the share of the query's trigrams a name contains, with
+        a bonus for each query word that starts a word of the name, so
+        prefixes rank first and misspellings still match.
+        """
+        allowed = self._allowed(location, employment_type)
+        query = normalize(text)
+        if not query:
+            return [self.names[position] for position in np.flatnonzero(allowed)[:limit]]
+
+        scores = np.zeros(len(self.names))
+        query_grams = trigrams(query)
+        for gram in query_grams:
+            positions = self.grams.get(gram)
+            if positions is not None:
+                scores[positions] += 1.0 / len(query_grams)
+        for word in query.split():
+            scores[np.unique(self._prefixed(word))] += 1.0
+
+        scores[~allowed] = 0
+        candidates = np.flatnonzero(scores >= 0.3)
+        best = candidates[np.lexsort((candidates, -scores[candidates]))][:limit]
+        return [self.names[position] for position in best]
+
+    def label(self, name):
+        """Picker label: name with primary location and employment type"""
+        location, employment_type = self.details.get(name, ('Unknown', 'Unknown'))
+        return f"{name} ({location}, {employment_type})"
@@ -1,9 +1,39 @@
 import streamlit as st
-import pyodbc
 import pandas as pd
+import altair as alt
 from datetime import datetime, timedelta
+import logging
 import os
-from contextlib import contextmanager
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from constraint_rules import HARD, SOFT, compile_rules, evaluate, evaluate_many, field_severity, load_rules
+from constraint_state import ConstraintState, ConstraintStore
+from hours_counters import (
+    adjust as adjust_hours, cap_breach, hour_caps, max_consecutive_days, min_gap_floor, period_hours
+)
+from hours_ledger import HoursLedger
+from roster_db import (
+    LOCAL_DB, active_window_start, current_period, cycle_anchor, cycle_start, db_connection, normalize_location,
+    read_frame, read_result_sets
+)
+from read_replica import READ_REPLICA, Replica, read_connection
+from roster_cache import bounded_cache, bump_generation, cache_metrics, changed_elsewhere, clear_all
+from session_scope import enter_scope, scoped_key, session_state_report, sweep_scope
+from violation_scan import latest_scan
+from write_queue import FLUSH_INTERVAL, WRITE_JOURNAL, WriteBehind, WriteJournal
+from card_templates import (
+    CARD_DETAILS, RESOURCE_PANEL, appointment_card, assignment_header, day_disabled, day_heading, empty_state, notice
+)
+from resource_search import ResourceIndex
+from roster_assets import build_stylesheet
+from roster_templates import capture_cycle, drop_existing, insert_projected, project, validate
+
+logger = logging.getLogger(__name__)
 
 # Set page config must be first command
 st.set_page_config(
@@ -14,60 +44,21 @@ st.set_page_config(
 )
 
 # Custom CSS
+@st.cache_resource
+def get_stylesheet():
+    """styles.css minified and fingerprinted once per process"""
+    return build_stylesheet("styles.css")
+
 def load_css():
-    with open("styles.css", "r", encoding="utf-8", errors="ignore") as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+    stylesheet = get_stylesheet()
+    if st.get_option("server.enableStaticServing"):
+        # Browser caches the fingerprinted file; reruns only send the link
+        st.markdown(f'<link rel="stylesheet" href="{stylesheet["href"]}">', unsafe_allow_html=True)
+    else:
+        st.markdown(f"<style>{stylesheet['css']}</style>", unsafe_allow_html=True)
 
 load_css()
 
-# Database configuration
-DB_SERVER = "0.tcp.ap.ngrok.io"
-DB_PORT = "19125"  # Updated to match current ngrok forwarding port
-
-
-DB_NAME = "RosterManagement"
-DB_USERNAME = "my_user"
-DB_PASSWORD = "!Mynameisapp"
-
-# Database connection manager
-@contextmanager
-def db_connection():
-    conn = pyodbc.connect(
-        f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-        f"SERVER={DB_SERVER},{DB_PORT};"
-        f"DATABASE={DB_NAME};"
-        f"UID={DB_USERNAME};"
-        f"PWD={DB_PASSWORD};"
-        "Encrypt=no;"
-        "TrustServerCertificate=yes;"
-    )
-    try:
-        yield conn
-    finally:
-        conn.close()
-
-# Special locations mapping
-SPECIAL_LOCATIONS = {
-    "thomas street": "Thomas Street, Wollongong",
-    "albert street": "Albert Street, Erskinville",
-    "cecil street": "Cecil Street, Guildford",
-    "charles street": "Charles Street, Liverpool",
-    "cope street": "Cope Street, Redfern",
-    "copeland street": "Copeland Street, Liverpool",
-    "fisher street": "Fisher Street, Petersham",
-    "goulburn street": "Goulburn Street, Liverpool",
-    "todd street": "Todd Street, Merrylands",
-    "vine street": "Vine Street, Darlington",
-    "89 old south head road": "89 Old South Head Road, Bondi Junction",
-    "united for care": "United For Care",
-    "bell lane": "Bell Lane, Randwick",
-    "bexley": "Bexley",
-    "blacktown": "Blacktown",
-    "cared global pty ltd": "Cared Global Pty Ltd",
-    "castlereagh st": "Castlereagh St"
-}
-
-
 # Test connection
 # try:
 #     with db_connection() as conn:
@@ -75,175 +66,117 @@ SPECIAL_LOCATIONS = {
 # except Exception as e:
 #     st.sidebar.error(f"❌ Database connection failed: {str(e)}")
 
-# Helper function to normalize location names
-def normalize_location(location):
-    if not location:
-        return None
-    loc_lower = location.lower()
-    for key, value in SPECIAL_LOCATIONS.items():
-        if key in loc_lower:
-            return value
-    return location
-
 # Cached data functions
-@st.cache_data(ttl=3600)
+ROSTERS_QUERY = """
+SELECT DISTINCT
+    maica__Participant_Location__c AS location,
+    maica__Participants__c AS participant_name
+FROM NewAppointments
+WHERE maica__Participants__c LIKE '%Roster%'
+AND maica__Participant_Location__c IS NOT NULL
+AND maica__Scheduled_Start__c >= ?
+ORDER BY maica__Participants__c
+"""
+
+ACTIVE_RESOURCES_QUERY = """
+SELECT DISTINCT
+    r.fullName AS resource_name,
+    r.primaryLocation,
+    r.employmentType
+FROM Resources r
+WHERE r.Status = 'Active'
+AND r.jobTitle LIKE '%Disability Support Worker%'
+ORDER BY r.fullName
+"""
+
+@bounded_cache(ttl=3600)
+def get_reference_data():
+    """Sidebar reference data (rosters and active support workers) in one round trip"""
+    with read_connection() as conn:
+        rosters, resources = read_result_sets(conn, [
+            (ROSTERS_QUERY, [active_window_start()]),
+            (ACTIVE_RESOURCES_QUERY, []),
+        ])
+    resources['resource_name'] = resources['resource_name'].str.split().str.join(' ')
+    return {'rosters': rosters, 'resources': resources}
+
 def get_location_participant_mapping():
-    with db_connection() as conn:
-        query = """
-        SELECT DISTINCT 
-            maica__Participant_Location__c as location,
-            maica__Participants__c as participant
-        FROM NewAppointments
-        WHERE maica__Participants__c LIKE '%Roster%'
-        AND maica__Participant_Location__c IS NOT NULL
-        """
-        df = pd.read_sql(query, conn)
-    return df.set_index('location')['participant'].to_dict()
+    rosters = get_reference_data()['rosters']
+    return dict(zip(rosters['location'], rosters['participant_name']))
 
-@st.cache_data(ttl=3600)
 def get_locations_with_participants():
-    with db_connection() as conn:
-        query = """
-        SELECT DISTINCT 
-            maica__Participant_Location__c as location,
-            maica__Participants__c as participant_name
-        FROM NewAppointments
-        WHERE maica__Participants__c LIKE '%Roster%'
-        AND maica__Participant_Location__c IS NOT NULL
-        ORDER BY maica__Participants__c
-        """
-        df = pd.read_sql(query, conn)
-    
-    # Create list of dictionaries with display names and actual locations
-    locations = []
-    for _, row in df.iterrows():
-        locations.append({
-            'display_name': row['participant_name'],
-            'location': row['location']
-        })
-    
-    return locations
+    rosters = get_reference_data()['rosters']
+    return rosters.rename(columns={'participant_name': 'display_name'})[['display_name', 'location']].to_dict('records')
 
-@st.cache_data(ttl=3600)
 def get_all_resources(employment_type='All'):
-    """Get all active resources with caching"""
-    with db_connection() as conn:
-        if employment_type == 'All':
-            query = """
-            SELECT DISTINCT 
-                r.fullName as resource_name, 
-                r.primaryLocation,
-                r.employmentType
-            FROM Resources r
-            WHERE r.Status = 'Active'
-            AND r.jobTitle LIKE '%Disability Support Worker%'
-            ORDER BY r.fullName
-            """
-            params = []
-        else:
-            query = """
-            SELECT DISTINCT 
-                r.fullName as resource_name, 
-                r.primaryLocation,
-                r.employmentType
-            FROM Resources r
-            WHERE r.Status = 'Active'
-            AND r.jobTitle LIKE '%Disability Support Worker%'
-            AND r.employmentType = ?
-            ORDER BY r.fullName
-            """
-            params = [employment_type]
-        
-        df = pd.read_sql(query, conn, params=params)
-    
-    if not df.empty:
-        df['resource_name'] = df['resource_name'].apply(lambda x: ' '.join(x.split()))
-    return df
+    """Active support workers, optionally of one employment type"""
+    resources = get_reference_data()['resources']
+    if employment_type != 'All':
+        resources = resources[resources['employmentType'] == employment_type]
+    return resources
+
+@bounded_cache(ttl=600)
+def get_location_resources(location):
+    """Active support workers of every employment type whose primary location matches the roster"""
+    resources = get_all_resources()
+    at_location = resources['primaryLocation'].fillna('').str.contains(normalize_location(location), case=False, regex=False)
+    return resources[at_location]
+
+RESOURCE_SEARCH_LIMIT = int(os.getenv("ROSTER_SEARCH_LIMIT", "20"))  # matches offered by the All Resources picker
+
+@st.cache_resource(ttl=3600)
+def get_resource_index():
+    """Search index over every active support worker, rebuilt with the reference data"""
+    return ResourceIndex(get_all_resources())
 
-@st.cache_data(ttl=600)  # Cache for 10 minutes since this changes more frequently
 def get_resources_by_location(location, employment_type='All'):
-    norm_location = normalize_location(location)
-    
-    with db_connection() as conn:
-        if employment_type == 'All':
-            query = """
-            SELECT DISTINCT 
-                r.fullName as resource_name
-            FROM Resources r
-            WHERE r.primaryLocation LIKE '%' + ? + '%'
-            AND r.Status = 'Active'
-            AND r.jobTitle LIKE '%Disability Support Worker%'
-            ORDER BY r.fullName
-            """
-            params = [norm_location]
-        else:
-            query = """
-            SELECT DISTINCT 
-                r.fullName as resource_name
-            FROM Resources r
-            WHERE r.primaryLocation LIKE '%' + ? + '%'
-            AND r.employmentType = ?
-            AND r.Status = 'Active'
-            AND r.jobTitle LIKE '%Disability Support Worker%'
-            ORDER BY r.fullName
-            """
-            params = [norm_location, employment_type]
-        
-        df = pd.read_sql(query, conn, params=params)
-    
-    if not df.empty:
-        return [' '.join(name.split()) for name in df['resource_name'].tolist()]
-    return []
+    """Names of the roster's local workers, filtered by employment type in memory"""
+    resources = get_location_resources(location)
+    if employment_type != 'All':
+        resources = resources[resources['employmentType'] == employment_type]
+    return resources['resource_name'].drop_duplicates().tolist()
 
-@st.cache_data(ttl=300)
+@bounded_cache(ttl=300)
 def get_week_ranges(location):
-    """Get the start and end dates for week 1 and week 2 based on actual appointments for this location"""
+    """Get the start and end dates for week 1 and week 2 of the live cycle at this location"""
     norm_location = normalize_location(location)
+    roster_starts = """
+    SELECT 
+        MIN(maica__Scheduled_Start__c) as first_start,
+        MAX(maica__Scheduled_Start__c) as last_start
+    FROM NewAppointments
+    WHERE maica__Participant_Location__c LIKE '%' + ? + '%'
+    AND maica__Participants__c LIKE '%Roster%'
+    AND maica__Scheduled_Start__c >= ?
+    """
     
+    # Cycles begin on the roster's persisted start (read from the primary, which
+    # records it on first use); the live cycle is read from the one holding today
     with db_connection() as conn:
-        query = """
-        SELECT 
-            MIN(maica__Scheduled_Start__c) as first_start,
-            MAX(maica__Scheduled_Start__c) as last_start
-        FROM NewAppointments
-        WHERE maica__Participant_Location__c LIKE '%' + ? + '%'
-        AND maica__Participants__c LIKE '%Roster%'
-        """
-        df = pd.read_sql(query, conn, params=[norm_location])
+        anchor = cycle_anchor(conn, norm_location)
+    if anchor is None:
+        return current_period(None, None, None)
+    since = datetime.combine(cycle_start(anchor), datetime.min.time())
+    with read_connection() as conn:
+        df = pd.read_sql(roster_starts, conn, params=[norm_location, since])
     
     if df.empty or df.iloc[0]['first_start'] is None:
-        # Default to current week if no appointments found
-        today = datetime.now().date()
-        week1_start = today - timedelta(days=today.weekday())
-        week1_end = week1_start + timedelta(days=6)
-        week2_start = week1_end + timedelta(days=1)
-        week2_end = week2_start + timedelta(days=6)
-    else:
-        first_start = pd.to_datetime(df.iloc[0]['first_start']).date()
-        last_start = pd.to_datetime(df.iloc[0]['last_start']).date()
-        
-        # Calculate week ranges based on actual appointment dates
-        week1_start = first_start
-        week1_end = week1_start + timedelta(days=6)
-        week2_start = week1_end + timedelta(days=1)
-        week2_end = last_start  # Use last appointment date as end of week 2
-    
-    return {
-        'week1_start': week1_start,
-        'week1_end': week1_end,
-        'week2_start': week2_start,
-        'week2_end': week2_end
-    }
+        return current_period(anchor, None, None)
+    return current_period(
+        anchor,
+        pd.to_datetime(df.iloc[0]['first_start']).date(),
+        pd.to_datetime(df.iloc[0]['last_start']).date()
+    )
 
 
-@st.cache_data(ttl=300)
+@bounded_cache(ttl=300, max_entries=512, max_bytes=32 * 1024 * 1024)
 def get_appointments_by_resource_and_location(resource, location):
     norm_location = normalize_location(location)
     
     # First get the week ranges for this location
     week_ranges = get_week_ranges(location)
     
-    with db_connection() as conn:
+    with read_connection() as conn:
         query = """
         SELECT 
             Id AS AppointmentID,
@@ -256,10 +189,17 @@ def get_appointments_by_resource_and_location(resource, location):
         WHERE REPLACE(REPLACE(maica__Resources__c, '  ', ' '), '  ', ' ') = ?
         AND maica__Participant_Location__c LIKE '%' + ? + '%'
         AND maica__Participants__c LIKE '%Roster%'
+        AND maica__Scheduled_Start__c >= ?
+        AND maica__Scheduled_Start__c < ?
         ORDER BY maica__Scheduled_Start__c
         """
         normalized_resource = ' '.join(resource.split())
-        params = [normalized_resource, norm_location]
+        params = [
+            normalized_resource,
+            norm_location,
+            week_ranges['week1_start'],
+            week_ranges['week2_end'] + timedelta(days=1)
+        ]
         
         df = pd.read_sql(query, conn, params=params)
     
@@ -282,31 +222,16 @@ def get_appointments_by_resource_and_location(resource, location):
         df['Week'] = df['StartDate'].apply(calculate_week)
     return df
 
-@st.cache_data(ttl=600)
 def get_resource_counts_by_location(location):
-    norm_location = normalize_location(location)
-    
-    with db_connection() as conn:
-        query = """
-        SELECT 
-            employmentType,
-            COUNT(*) as resource_count
-        FROM Resources
-        WHERE primaryLocation LIKE '%' + ? + '%'
-        AND Status = 'Active'
-        AND jobTitle LIKE '%Disability Support Worker%'
-        GROUP BY employmentType
-        """
-        params = [norm_location]
-        
-        df = pd.read_sql(query, conn, params=params)
-    return df
+    """Active support workers per employment type whose primary location matches the roster"""
+    counts = get_location_resources(location).groupby('employmentType').size()
+    return counts.rename('resource_count').rename_axis('employmentType').reset_index()
 
-@st.cache_data(ttl=600)
+@bounded_cache(ttl=600, max_entries=512)
 def get_resource_details(resource_name):
     normalized_name = ' '.join(resource_name.split())
     
-    with db_connection() as conn:
+    with read_connection() as conn:
         query = """
         SELECT 
             id,
@@ -339,14 +264,34 @@ def get_resource_details(resource_name):
             'primaryLocation': 'Unknown'
         }
 
-@st.cache_data(ttl=300)
+@bounded_cache(ttl=600)
+def get_resource_directory():
+    """Employment details for every resource in one query, keyed by normalized name"""
+    with read_connection() as conn:
+        query = """
+        SELECT 
+            fullName,
+            employmentType,
+            hoursPerWeek,
+            primaryLocation
+        FROM Resources
+        """
+        df = pd.read_sql(query, conn)
+    
+    df['Resource'] = df['fullName'].fillna('').str.split().str.join(' ')
+    df['employmentType'] = df['employmentType'].fillna('Unknown')
+    df['hoursPerWeek'] = df['hoursPerWeek'].where(df['employmentType'] != 'Casual', 0)
+    df['primaryLocation'] = df['primaryLocation'].fillna('Unknown')
+    return df.drop_duplicates('Resource')[['Resource', 'employmentType', 'hoursPerWeek', 'primaryLocation']]
+
+@bounded_cache(ttl=300)
 def get_unassigned_appointments(location):
     norm_location = normalize_location(location)
     
     # First get the week ranges for this location
     week_ranges = get_week_ranges(location)
     
-    with db_connection() as conn:
+    with read_connection() as conn:
         query = """
         SELECT 
             Id AS AppointmentID,
@@ -359,9 +304,11 @@ def get_unassigned_appointments(location):
         WHERE (maica__Resources__c IS NULL OR maica__Resources__c = 'NULL')
         AND maica__Participant_Location__c LIKE '%' + ? + '%'
         AND maica__Participants__c LIKE '%Roster%'
+        AND maica__Scheduled_Start__c >= ?
+        AND maica__Scheduled_Start__c < ?
         ORDER BY maica__Scheduled_Start__c
         """
-        params = [norm_location]
+        params = [norm_location, week_ranges['week1_start'], week_ranges['week2_end'] + timedelta(days=1)]
         
         df = pd.read_sql(query, conn, params=params)
     
@@ -384,6 +331,59 @@ def get_unassigned_appointments(location):
         df['Week'] = df['StartDate'].apply(calculate_week)
     return df
 
+# Assign through usp_AssignResource (migrations/003); the SQLite stand-in has no procedures
+ASSIGN_PROCEDURE = os.getenv("ROSTER_ASSIGN_PROCEDURE", "0" if LOCAL_DB else "1") == "1"
+
+def assign_with_procedure(appointment_id, resource_name, location):
+    """
+    Check-and-assign in one round trip: the stored procedure re-checks that
+    the appointment is unassigned, the hard hour caps, the rest gap and the
+    consecutive-day limit, and writes in the same transaction.
+
+    Returns:
+        (assigned, reasons, appointment): reasons are dicts with rule,
+        message, value and limit; appointment has StartDateTime,
+        EndDateTime, DurationMinutes, Location and Week.
+    """
+    normalized_name = ' '.join(resource_name.split())
+    resource_details = get_resource_details(resource_name)
+    week_ranges = get_week_ranges(location)
+    rules = get_rule_set()
+    caps = hour_caps(rules, resource_details['employmentType'], resource_details['hoursPerWeek'])
+
+    with db_connection() as conn:
+        conn.autocommit = True  # the procedure commits or rolls back its own transaction
+        cursor = conn.cursor()
+        cursor.execute(
+            "EXEC dbo.usp_AssignResource ?, ?, ?, ?, ?, ?, ?, ?, ?, ?",
+            appointment_id,
+            normalized_name,
+            normalize_location(location),
+            week_ranges['week1_start'],
+            week_ranges['week1_end'],
+            week_ranges['week2_end'],
+            caps.get('week_hours'),
+            caps.get('total_hours'),
+            min_gap_floor(rules, resource_details['employmentType']),
+            max_consecutive_days(rules, resource_details['employmentType'])
+        )
+        reasons = [
+            {'rule': row[0], 'message': row[1], 'value': row[2], 'limit': row[3]}
+            for row in cursor.fetchall()
+        ]
+        cursor.nextset()
+        row = cursor.fetchone()
+        appointment = dict(zip([column[0] for column in cursor.description], row)) if row else None
+    return not reasons, reasons, appointment
+
+def record_assignment(resource_name, appointment_id, location, start, end, minutes):
+    """Apply a committed assignment to the hours ledger, loaded constraint states and touched caches"""
+    normalized_name = ' '.join(resource_name.split())
+    get_hours_ledger().add(normalized_name, start.date(), minutes or 0)
+    get_constraint_store().add_shift(normalized_name, location, appointment_id, start, end, minutes)
+    reflect_write(appointment_id, normalized_name)
+    invalidate_roster_caches(location, normalized_name)
+
 def assign_resource_to_appointment(appointment_id, resource_name):
     """
     Assigns a resource to an appointment after performing final validation checks.
@@ -391,6 +391,8 @@ def assign_resource_to_appointment(appointment_id, resource_name):
     Handles hour limits, consecutive days, min hours between shifts, and
     employment type specific rules. Shows errors for hard limits and
     warnings for soft limits (like exceeding PT contracted hours).
+    With ASSIGN_PROCEDURE on, the write goes through usp_AssignResource,
+    which re-checks the rules that must hold at write time in one round trip.
 
     Returns:
         bool: True if assignment was successful, False otherwise.
@@ -410,10 +412,6 @@ def assign_resource_to_appointment(appointment_id, resource_name):
             # Check for None, 'NULL', or any non-empty string indicating assignment
             if current_assignment and current_assignment.strip() and current_assignment.upper() != 'NULL':
                 st.error(f"❌ Assignment Failed: This appointment was already assigned to {current_assignment} (database state). Please refresh.")
-                # Clear potentially stale session state if mismatch found
-                if f"assigned_{appointment_id}" in st.session_state:
-                    st.session_state[f"assigned_{appointment_id}"] = True
-                    st.session_state[f"selected_resource_{appointment_id}"] = current_assignment
                 return False
     except Exception as e:
         st.error(f"Database error checking current assignment: {e}")
@@ -426,7 +424,8 @@ def assign_resource_to_appointment(appointment_id, resource_name):
             SELECT
                 maica__Scheduled_Start__c,
                 maica__Scheduled_End__c,
-                maica__Scheduled_Duration_Minutes__c
+                maica__Scheduled_Duration_Minutes__c,
+                maica__Participant_Location__c
             FROM NewAppointments
             WHERE Id = ?
             """
@@ -441,8 +440,9 @@ def assign_resource_to_appointment(appointment_id, resource_name):
              st.error(f"Error: Could not retrieve details for Resource {resource_name}.")
              return False
 
-        # Use resource's primary location for constraint calculation unless specified otherwise
-        constraints = calculate_constraints(resource_name, resource_details['primaryLocation'])
+        # Evaluate against the appointment's roster; the hours ledger adds every other location
+        appointment_location = appt_details['maica__Participant_Location__c']
+        constraints = calculate_constraints(resource_name, appointment_location)
         if not constraints:
             st.error(f"Error: Could not calculate constraints for Resource {resource_name}.")
             return False
@@ -451,38 +451,14 @@ def assign_resource_to_appointment(appointment_id, resource_name):
         st.error(f"Error retrieving appointment/resource details or constraints: {e}")
         return False
 
-    # --- 3. Perform Constraint Validations ---
-    appt_hours = appt_details['maica__Scheduled_Duration_Minutes__c'] / 60
+    # --- 3. Determine Week Number ---
+    end_datetime = pd.to_datetime(appt_details['maica__Scheduled_End__c'])
     start_datetime = pd.to_datetime(appt_details['maica__Scheduled_Start__c'])
     start_date = start_datetime.date()
-
-    # Basic time conflict check (handled by validate_assignment usually, but good failsafe)
-    # Add check here if validate_assignment isn't comprehensive enough
-
-    # Check minimum hours between shifts (using calculated constraints BEFORE adding new appt)
-    # This check might need refinement based on how calculate_constraints works
-    # If calculate_constraints *includes* the potential new shift, this logic is wrong.
-    # Assuming calculate_constraints shows the state *before* this assignment:
-    # Need to recalculate potential min hours *with* this new appointment.
-    # This is complex - validate_assignment is likely better suited for this.
-    # Let's rely on validate_assignment for time clashes & min hours between.
-
-    # Check consecutive days (assuming constraints['max_consecutive_days'] is calculated BEFORE adding this appt)
-    # Similar to min hours, checking this *after* adding requires recalculation.
-    # Relying on validate_assignment for this is safer.
-    # Simplified Check (may not be accurate if appt spans midnight):
-    # potential_consecutive = check_potential_consecutive_days(resource_name, start_date) # Needs helper
-    # if potential_consecutive > 5:
-    #     st.error(f"❌ Cannot assign - Would exceed maximum 5 consecutive work days.")
-    #     return False
-
-
-    # --- 4. Determine Week Number ---
     try:
-        # Assuming primaryLocation is the relevant one for week ranges
-        week_ranges = get_week_ranges(resource_details['primaryLocation'])
+        week_ranges = get_week_ranges(appointment_location)
         if not week_ranges:
-             st.error(f"Error: Could not determine week ranges for location {resource_details['primaryLocation']}.")
+             st.error(f"Error: Could not determine week ranges for location {appointment_location}.")
              return False
 
         if week_ranges['week1_start'] <= start_date <= week_ranges['week1_end']:
@@ -490,7 +466,7 @@ def assign_resource_to_appointment(appointment_id, resource_name):
         elif week_ranges['week2_start'] <= start_date <= week_ranges['week2_end']:
             week_num = 2
         else:
-             st.error(f"Error: Appointment date {start_date} does not fall within defined week ranges for {resource_details['primaryLocation']}.")
+             st.error(f"Error: Appointment date {start_date} does not fall within defined week ranges for {appointment_location}.")
              # Log this error for investigation
              print(f"Date mismatch: {start_date}, Week1: {week_ranges['week1_start']}-{week_ranges['week1_end']}, Week2: {week_ranges['week2_start']}-{week_ranges['week2_end']}")
              return False
@@ -498,75 +474,68 @@ def assign_resource_to_appointment(appointment_id, resource_name):
         st.error(f"Error determining week number: {e}")
         return False
 
-    # --- 5. Employment Type Specific Hour Validation ---
-    # Calculate potential hours *if* assignment happens
-    potential_week1_hours = constraints['week1_hours'] + appt_hours if week_num == 1 else constraints['week1_hours']
-    potential_week2_hours = constraints['week2_hours'] + appt_hours if week_num == 2 else constraints['week2_hours']
-    potential_total_hours = constraints['total_hours'] + appt_hours
-
-    validation_passed = True # Assume pass unless an error occurs
-
-    if resource_details['employmentType'] == 'Full Time':
-        if potential_week1_hours > 38:
-            st.error(f"❌ Cannot assign - Full Time Week 1 hours would exceed 38 (would be {potential_week1_hours:.1f}h)")
-            validation_passed = False
-        if potential_week2_hours > 38:
-            st.error(f"❌ Cannot assign - Full Time Week 2 hours would exceed 38 (would be {potential_week2_hours:.1f}h)")
-            validation_passed = False
-        if potential_total_hours > 76:
-            st.error(f"❌ Cannot assign - Full Time Total hours would exceed 76 (would be {potential_total_hours:.1f}h)")
-            validation_passed = False
-
-    elif resource_details['employmentType'] == 'Part Time':
-        contracted_hours = resource_details['hoursPerWeek']
-        total_contracted_hours = contracted_hours * 2
-
-        # 1. Hard cap at 38h/week
-        if potential_week1_hours > 38:
-            st.error(f"❌ Cannot assign - Part Time Week 1 would exceed absolute maximum of 38h (would be {potential_week1_hours:.1f}h)")
-            validation_passed = False
-        if potential_week2_hours > 38:
-            st.error(f"❌ Cannot assign - Part Time Week 2 would exceed absolute maximum of 38h (would be {potential_week2_hours:.1f}h)")
-            validation_passed = False
-
-        # 2. Hard cap at total contracted hours
-        if potential_total_hours > total_contracted_hours:
-            st.error(f"❌ Cannot assign - Part Time would exceed total contracted hours of {total_contracted_hours}h (would be {potential_total_hours:.1f}h)")
-            validation_passed = False
-
-        # 3. Warning ONLY if exceeding weekly contracted but within other limits
-        #    (No checkbox needed here, confirmation happened via separate button in UI)
-        #    Only show warning if no HARD errors occurred above.
-        if validation_passed: # Only show warning if otherwise valid
-             potential_current_week_hours = potential_week1_hours if week_num == 1 else potential_week2_hours
-             if potential_current_week_hours > contracted_hours:
-                 warning_msg = (f"⚠️ Proceeding with assignment: Week {week_num} hours ({potential_current_week_hours:.1f}h) "
-                                f"will exceed contracted {contracted_hours}h.")
-                 st.warning(warning_msg) # Display warning during final assignment step
-
-
-    elif resource_details['employmentType'] == 'Casual':
-        # 1. Up to 38h/week allowed
-        if potential_week1_hours > 38:
-            st.error(f"❌ Cannot assign - Casual Week 1 would exceed 38h limit (would be {potential_week1_hours:.1f}h)")
-            validation_passed = False
-        if potential_week2_hours > 38:
-            st.error(f"❌ Cannot assign - Casual Week 2 would exceed 38h limit (would be {potential_week2_hours:.1f}h)")
-            validation_passed = False
-
-        # 2. Up to 76h total allowed
-        if potential_total_hours > 76:
-            st.error(f"❌ Cannot assign - Casual would exceed total limit of 76h (would be {potential_total_hours:.1f}h)")
-            validation_passed = False
-
-    # --- 6. Proceed with Assignment if All Checks Passed ---
+    # --- 4. Workforce Rule Validation ---
+    # Hours, rest gap and consecutive days all come from the shared rule engine
+    result = evaluate_constraints(constraints, (
+        start_datetime,
+        end_datetime,
+        appt_details['maica__Scheduled_Duration_Minutes__c'],
+        week_num
+    ))
+    hard_violations = [v for v in result['violations'] if v['severity'] == HARD]
+    soft_violations = [v for v in result['violations'] if v['severity'] == SOFT]
+
+    for violation in hard_violations:
+        st.error(f"❌ Cannot assign - {resource_details['employmentType']} {violation['message']}")
+
+    # Warnings only if otherwise valid (confirmation happened via separate button in UI)
+    if not hard_violations:
+        for violation in soft_violations:
+            st.warning(f"⚠️ Proceeding with assignment: {violation['message']}")
+
+    validation_passed = not hard_violations
+
+    # --- 5. Proceed with Assignment if All Checks Passed ---
     if not validation_passed:
         return False # Exit if any hard limit was hit
 
     # If we reach here, all validations passed (or only warnings were issued)
+    if ASSIGN_PROCEDURE:
+        # The procedure re-checks the hard rules against the database under locks and
+        # writes in the same transaction, so a shift it rejects is never committed
+        try:
+            assigned, reasons, _ = assign_with_procedure(appointment_id, normalized_name, appointment_location)
+        except Exception as e:
+            st.error(f"❌ Database error during assignment update: {str(e)}")
+            return False
+        if not assigned:
+            for reason in reasons:
+                st.error(f"❌ Assignment Failed: {reason['message']}. The roster changed since it was checked.")
+            return False
+        record_assignment(
+            normalized_name, appointment_id, appointment_location, start_datetime, end_datetime,
+            appt_details['maica__Scheduled_Duration_Minutes__c']
+        )
+        st.balloons()
+        st.success(f"✅ Successfully assigned {resource_name} to this appointment!")
+        return True
+
     try:
         with db_connection() as conn:
             cursor = conn.cursor()
+
+            # Re-check the hard hour caps against the maintained counters under update
+            # locks, so a concurrent assignment of the same worker can't slip past them
+            appt_minutes = appt_details['maica__Scheduled_Duration_Minutes__c'] or 0
+            caps = hour_caps(get_rule_set(), resource_details['employmentType'], resource_details['hoursPerWeek'])
+            breach = cap_breach(
+                caps, period_hours(cursor, normalized_name, week_ranges, lock=True), week_num, appt_minutes / 60
+            )
+            if breach:
+                conn.rollback()
+                st.error(f"❌ Assignment Failed: {breach}. The roster changed since it was checked.")
+                return False
+
             update_query = """
             UPDATE NewAppointments
             SET maica__Resources__c = ?
@@ -583,16 +552,15 @@ def assign_resource_to_appointment(appointment_id, resource_name):
                  result = pd.read_sql(check_query, conn, params=[appointment_id])
                  current_assignment = result.iloc[0,0] if not result.empty else 'Error - Not Found'
                  st.error(f"❌ Assignment Failed: Appointment was likely assigned to '{current_assignment}' by another user just before confirmation.")
-                 # Update session state to reflect the actual DB state
-                 if f"assigned_{appointment_id}" in st.session_state and current_assignment != 'Error - Not Found':
-                     st.session_state[f"assigned_{appointment_id}"] = True
-                     st.session_state[f"selected_resource_{appointment_id}"] = current_assignment
                  return False
             else:
+                adjust_hours(cursor, normalized_name, start_date, appt_minutes)
                 conn.commit() # Commit only if rows were affected
 
-                # Clear relevant caches after successful update
-                st.cache_data.clear() # Consider more targeted cache clearing if possible
+                record_assignment(
+                    normalized_name, appointment_id, appointment_location, start_datetime, end_datetime,
+                    appt_details['maica__Scheduled_Duration_Minutes__c']
+                )
 
                 # Show success message with balloons animation
                 st.balloons()
@@ -607,313 +575,195 @@ def assign_resource_to_appointment(appointment_id, resource_name):
         st.error(f"❌ Database error during assignment update: {str(e)}")
         return False       
 
-@st.cache_data(ttl=300)
-@st.cache_data(ttl=300)
-def calculate_constraints(resource_name, location):
+@st.cache_resource
+def get_rule_set():
+    """Compile the workforce rules once per process"""
+    return compile_rules(load_rules())
+
+def get_week_numbers(start_dates, week_ranges):
+    """Week number (1 or 2) of each date within the location's roster period"""
+    dates = pd.to_datetime(pd.Series(start_dates))
+    week2_start = pd.Timestamp(week_ranges['week2_start'])
+    week2_end = pd.Timestamp(week_ranges['week2_end']) + pd.Timedelta(days=1)
+    return np.where((dates >= week2_start) & (dates < week2_end), 2, 1)
+
+def evaluate_constraints(constraints, candidate=None):
+    """Re-evaluate a constraint summary, optionally with a prospective (start, end, minutes, week) shift"""
+    return evaluate(
+        get_rule_set(),
+        constraints['shift_details'],
+        constraints['employmentType'],
+        constraints['contractedHours'],
+        candidate,
+        constraints.get('offsite', ())
+    )
+
+CONSTRAINT_STATE_TTL = 300  # seconds before a resource's state is re-read from the database
+
+@st.cache_resource
+def get_constraint_store():
+    """Process-wide constraint states, updated in place on every assign/unassign"""
+    return ConstraintStore(ttl=CONSTRAINT_STATE_TTL)
+
+def load_constraint_state(resource_name, location, cursor=None):
+    """Read a resource's shifts in the location's roster period into a fresh ConstraintState.
+
+    With cursor the shifts are read inside that transaction, including its
+    uncommitted writes, instead of from the read connection.
+    """
     norm_location = normalize_location(location)
     normalized_name = ' '.join(resource_name.split())
+    week_ranges = get_week_ranges(location)
+    resource_details = get_resource_details(resource_name)
     
-    with db_connection() as conn:
-        # Get resource details
-        resource_query = """
-        SELECT employmentType, hoursPerWeek 
-        FROM Resources 
-        WHERE REPLACE(REPLACE(fullName, '  ', ' '), '  ', ' ') = ?
-        """
-        resource_df = pd.read_sql(resource_query, conn, params=[normalized_name])
-        
-        if resource_df.empty:
-            return {
-                'max_consecutive_days': 0,
-                'min_hours_between_shifts': 'N/A',
-                'same_day_min_gap': 'N/A',
-                'week1_hours': 0,
-                'week2_hours': 0,
-                'total_hours': 0,
-                'shift_details': [],
-                'employmentType': 'Unknown',
-                'contractedHours': 0,
-                'gap_violation': False,
-                'same_day_gap_violation': False,
-                'week1_violation': False,
-                'week2_violation': False,
-                'total_violation': False
-            }
-            
-        resource_details = resource_df.iloc[0]
-        
-        # Get appointments sorted by start time
-        query = """
-        SELECT 
-            a.Id AS AppointmentID,
-            a.maica__Scheduled_Start__c AS StartDateTime,
-            a.maica__Scheduled_End__c AS EndDateTime,
-            a.maica__Scheduled_Duration_Minutes__c AS DurationMinutes
-        FROM NewAppointments a
-        WHERE REPLACE(REPLACE(a.maica__Resources__c, '  ', ' '), '  ', ' ') = ?
-        AND a.maica__Participant_Location__c LIKE '%' + ? + '%'
-        ORDER BY a.maica__Scheduled_Start__c
-        """
-        params = [normalized_name, norm_location]
-        df = pd.read_sql(query, conn, params=params)
-    
-    if df.empty:
-        return {
-            'max_consecutive_days': 0,
-            'min_hours_between_shifts': 'N/A',
-            'same_day_min_gap': 'N/A',
-            'week1_hours': 0,
-            'week2_hours': 0,
-            'total_hours': 0,
-            'shift_details': [],
-            'employmentType': resource_details['employmentType'],
-            'contractedHours': resource_details['hoursPerWeek'],
-            'gap_violation': False,
-            'same_day_gap_violation': False,
-            'week1_violation': False,
-            'week2_violation': False,
-            'total_violation': False
-        }
-    
-    df['StartDateTime'] = pd.to_datetime(df['StartDateTime'])
-    df['EndDateTime'] = pd.to_datetime(df['EndDateTime'])
-    df = df.sort_values('StartDateTime')
-    df['Date'] = df['StartDateTime'].dt.date
-    df['Week'] = df['StartDateTime'].apply(lambda x: 1 if (x.date() - df['StartDateTime'].min().date()).days < 7 else 2)
-    
-    # Calculate consecutive days PER WEEK
-    max_consecutive_days = 0
-    for week_num in [1, 2]:
-        week_df = df[df['Week'] == week_num]
-        if not week_df.empty:
-            unique_dates = week_df.drop_duplicates('Date').sort_values('Date')
-            if len(unique_dates) > 1:
-                unique_dates['DayDiff'] = unique_dates['Date'].diff().dt.days.fillna(1)
-                unique_dates['ConsecutiveGroup'] = (unique_dates['DayDiff'] != 1).cumsum()
-                consecutive_counts = unique_dates.groupby('ConsecutiveGroup').size()
-                week_max = consecutive_counts.max()
-                if week_max > max_consecutive_days:
-                    max_consecutive_days = week_max
-    
-    # Calculate minimum hours between ALL consecutive shifts
-    min_hours_between = None
-    gap_violation = False
-    
-    # Calculate same-day minimum gap
-    same_day_min_gap = None
-    same_day_gap_violation = False
-    
-    # Check gaps between all consecutive shifts
-    for i in range(len(df)-1):
-        current_end = df.iloc[i]['EndDateTime']
-        next_start = df.iloc[i+1]['StartDateTime']
-        gap = (next_start - current_end).total_seconds() / 3600
-        
-        # Update overall minimum gap
-        if min_hours_between is None or gap < min_hours_between:
-            min_hours_between = gap
-            if gap < 10:
-                gap_violation = True
-        
-        # Update same-day gap if applicable
-        if current_end.date() == next_start.date():
-            if same_day_min_gap is None or gap < same_day_min_gap:
-                same_day_min_gap = gap
-                if gap < 10:
-                    same_day_gap_violation = True
-    
-    # Calculate weekly hours
-    weekly_hours = df.groupby('Week')['DurationMinutes'].sum() / 60
-    week1_hours = weekly_hours.get(1, 0)
-    week2_hours = weekly_hours.get(2, 0)
-    total_hours = weekly_hours.sum()
-    
-    # Check for violations
-    week1_violation = False
-    week2_violation = False
-    total_violation = False
-    
-    if resource_details['employmentType'] == 'Full Time':
-        if week1_hours > 38:
-            week1_violation = True
-        if week2_hours > 38:
-            week2_violation = True
-        if total_hours > 76:
-            total_violation = True
-    elif resource_details['employmentType'] == 'Part Time':
-        contracted_hours = resource_details['hoursPerWeek']
-        if week1_hours > contracted_hours:
-            week1_violation = True
-        if week2_hours > contracted_hours:
-            week2_violation = True
-        if total_hours > (contracted_hours * 2):
-            total_violation = True
-    
-    return {
-        'max_consecutive_days': max_consecutive_days,
-        'min_hours_between_shifts': f"{min_hours_between:.1f}" if min_hours_between is not None else 'N/A',
-        'same_day_min_gap': f"{same_day_min_gap:.1f}" if same_day_min_gap is not None else 'N/A',
-        'week1_hours': week1_hours,
-        'week2_hours': week2_hours,
-        'total_hours': total_hours,
-        'shift_details': df.to_dict('records'),
-        'employmentType': resource_details['employmentType'],
-        'contractedHours': resource_details['hoursPerWeek'],
-        'gap_violation': gap_violation,
-        'same_day_gap_violation': same_day_gap_violation,
-        'week1_violation': week1_violation,
-        'week2_violation': week2_violation,
-        'total_violation': total_violation
-    }
+    # Get the resource's appointments in this roster period sorted by start time
+    query = """
+    SELECT 
+        a.Id AS AppointmentID,
+        a.maica__Scheduled_Start__c AS StartDateTime,
+        a.maica__Scheduled_End__c AS EndDateTime,
+        a.maica__Scheduled_Duration_Minutes__c AS DurationMinutes
+    FROM NewAppointments a
+    WHERE REPLACE(REPLACE(a.maica__Resources__c, '  ', ' '), '  ', ' ') = ?
+    AND a.maica__Participant_Location__c LIKE '%' + ? + '%'
+    AND a.maica__Scheduled_Start__c >= ?
+    AND a.maica__Scheduled_Start__c < ?
+    ORDER BY a.maica__Scheduled_Start__c
+    """
+    params = [
+        normalized_name,
+        norm_location,
+        week_ranges['week1_start'],
+        week_ranges['week2_end'] + timedelta(days=1)
+    ]
+    if cursor is None:
+        with read_connection() as conn:
+            rows = pd.read_sql(query, conn, params=params).itertuples(index=False)
+    else:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    
+    state = ConstraintState(
+        norm_location,
+        week_ranges['week1_start'],
+        week_ranges['week2_end'],
+        resource_details['employmentType'],
+        resource_details['hoursPerWeek']
+    )
+    for appointment_id, start, end, minutes in rows:
+        state.add(appointment_id, pd.to_datetime(start), pd.to_datetime(end), minutes)
+    return state
+
+def get_constraint_state(resource_name, location):
+    normalized_name = ' '.join(resource_name.split())
+    week_ranges = get_week_ranges(location)
+    key = (normalized_name, normalize_location(location), week_ranges['week1_start'])
+    return get_constraint_store().get(key, lambda: load_constraint_state(resource_name, location))
+
+LEDGER_TTL = 600  # seconds before the hours ledger is rebuilt from the database
+
+@st.cache_resource(ttl=LEDGER_TTL)
+def get_hours_ledger():
+    """Org-wide hours per resource per day, read from the maintained counters"""
+    query = """
+    SELECT Resource, WorkDate, Minutes
+    FROM ResourceDailyHours
+    WHERE WorkDate >= ?
+    AND Minutes > 0
+    """
+    df = read_frame(query, [active_window_start().date()], dtypes={'Minutes': 'float64'})
+    return HoursLedger(df)
+
+def calculate_constraints(resource_name, location):
+    """Constraint summary at a location, with hours worked at other locations from the ledger"""
+    normalized_name = ' '.join(resource_name.split())
+    state = get_constraint_state(resource_name, location)
+    offsite = get_hours_ledger().offsite(normalized_name, state)
+    return state.summary(get_rule_set(), offsite)
+
+ROSTER_WRITES = "roster-writes"  # shared generation bumped on every committed write
+
+def sync_replica_state():
+    """Reload in-place roster state after another replica committed a write"""
+    if changed_elsewhere(ROSTER_WRITES):
+        get_constraint_store().discard()
+        get_hours_ledger.clear()
+
+def invalidate_roster_caches(location, resource_name=None):
+    """Drop only the cached roster frames a write touched instead of every cache"""
+    bump_generation(ROSTER_WRITES)
+    get_unassigned_appointments.clear(location)
+    get_all_assigned_appointments.clear(location)
+    if resource_name:
+        get_appointments_by_resource_and_location.clear(' '.join(resource_name.split()), location)
+
+def _replica_synced(resource_names, resources_changed):
+    """Drop what a read replica pull made stale: roster frames and the changed resources' states"""
+    for fetch in (get_unassigned_appointments, get_all_assigned_appointments, get_appointments_by_resource_and_location):
+        fetch.clear()
+    store = get_constraint_store()
+    for resource_name in resource_names:
+        store.discard(resource_name)
+    if resources_changed:
+        for fetch in (get_reference_data, get_location_resources, get_resource_details, get_resource_directory):
+            fetch.clear()
+        get_resource_index.clear()
+
+@st.cache_resource
+def get_replica():
+    """Local mirror of the roster tables and its sync worker, shared by every session"""
+    return Replica(READ_REPLICA, on_synced=_replica_synced)
+
+def reflect_write(appointment_id, resource_name):
+    """Show an assignment committed on the primary in the read replica before the next pull"""
+    if READ_REPLICA:
+        get_replica().reflect(appointment_id, resource_name)
 
 def validate_assignment(resource_name, location, new_appt_start, new_appt_end, week_num=None):
     """Validate if new assignment would violate constraints"""
-    constraints = calculate_constraints(resource_name, location)
+    constraints = current_constraints(resource_name, location)
     new_start = pd.to_datetime(new_appt_start)
     new_end = pd.to_datetime(new_appt_end)
-    appt_hours = (new_end - new_start).total_seconds() / 3600
-    
-    # Get resource details
-    resource_details = get_resource_details(resource_name)
-    
-    # Calculate potential new totals
-    new_week_hours = constraints[f'week{week_num}_hours'] + appt_hours
-    new_total_hours = constraints['total_hours'] + appt_hours
-    
-    # 1. Check minimum hours between shifts (10 hours)
-    min_gap = None
-    for appt in constraints['shift_details']:
-        if appt['Week'] == week_num:
-            existing_start = pd.to_datetime(appt['StartDateTime'])
-            existing_end = pd.to_datetime(appt['EndDateTime'])
-            
-            gap_before = (existing_start - new_end).total_seconds() / 3600
-            gap_after = (new_start - existing_end).total_seconds() / 3600
-            
-            if gap_before > 0 and gap_after > 0:
-                gap = min(gap_before, gap_after)
-            else:
-                gap = max(gap_before, gap_after)
-            
-            if min_gap is None or gap < min_gap:
-                min_gap = gap
-    
-    if min_gap is not None and min_gap < 10:
-        return False, f"Minimum 10 hours required between shifts (would be {min_gap:.1f}h)"
-
-    # 2. Check consecutive days (max 5)
-    current_week_dates = [pd.to_datetime(appt['StartDateTime']).date() 
-                         for appt in constraints['shift_details'] 
-                         if appt['Week'] == week_num]
-    current_week_dates = list(set(current_week_dates))
-    new_date = new_start.date()
-    
-    if current_week_dates:
-        all_dates = sorted(current_week_dates + [new_date])
-        consecutive_count = 1
-        max_consecutive = 1
-        for i in range(1, len(all_dates)):
-            if (all_dates[i] - all_dates[i-1]).days == 1:
-                consecutive_count += 1
-                max_consecutive = max(max_consecutive, consecutive_count)
-            else:
-                consecutive_count = 1
-        
-        if max_consecutive > 5:
-            return False, f"Would have {max_consecutive} consecutive days (max 5 allowed)"
-
-    # 3. Employment type specific rules
-    if resource_details['employmentType'] == 'Full Time':
-        if new_week_hours > 38:
-            return False, f"Week {week_num} would exceed 38h (would be {new_week_hours:.1f}h)"
-        if new_total_hours > 76:
-            return False, f"Total would exceed 76h (would be {new_total_hours:.1f}h)"
-    
-    elif resource_details['employmentType'] == 'Part Time':
-        # Part-time can go up to 38h/week but total can't exceed 2x contracted hours
-        if new_week_hours > 38:
-            return False, f"Week {week_num} would exceed maximum 38h (would be {new_week_hours:.1f}h)"
-        if new_total_hours > (resource_details['hoursPerWeek'] * 2):
-            return False, f"Total would exceed contracted {resource_details['hoursPerWeek']*2}h (would be {new_total_hours:.1f}h)"
-        if new_week_hours > resource_details['hoursPerWeek']:
-            return True, f"Warning: Week {week_num} exceeds contracted {resource_details['hoursPerWeek']}h (would be {new_week_hours:.1f}h)"
-    
-    elif resource_details['employmentType'] == 'Casual':
-        # Casual workers have 38h/week and 76h/fortnight limits
-        if new_week_hours > 38:
-            return False, f"Week {week_num} would exceed 38h (would be {new_week_hours:.1f}h)"
-        if new_total_hours > 76:
-            return False, f"Total would exceed 76h (would be {new_total_hours:.1f}h)"
-    
+    appt_minutes = (new_end - new_start).total_seconds() / 60
+    if week_num is None:
+        week_num = get_week_numbers([new_start], get_week_ranges(location))[0]
+    
+    result = evaluate_constraints(constraints, (new_start, new_end, appt_minutes, week_num))
+    hard_violations = [v['message'] for v in result['violations'] if v['severity'] == HARD]
+    soft_violations = [v['message'] for v in result['violations'] if v['severity'] == SOFT]
+    
+    if hard_violations:
+        return False, "; ".join(hard_violations)
+    if soft_violations:
+        return True, "Warning: " + "; ".join(soft_violations)
     return True, "Valid assignment"
 
 def calculate_constraints_with_potential_assignment(resource_name, location, new_appt_start, new_appt_end):
     """Calculate constraints including a potential new assignment"""
     constraints = calculate_constraints(resource_name, location)
+    new_start = pd.to_datetime(new_appt_start)
+    new_end = pd.to_datetime(new_appt_end)
+    week_num = get_week_numbers([new_start], get_week_ranges(location))[0]
     
-    if constraints['shift_details']:
-        # Check if new appointment overlaps or has insufficient gap with existing ones
-        new_start = pd.to_datetime(new_appt_start)
-        new_end = pd.to_datetime(new_appt_end)
-        
-        # Find closest appointments before and after
-        min_gap = None
-        for appt in constraints['shift_details']:
-            existing_start = pd.to_datetime(appt['StartDateTime'])
-            existing_end = pd.to_datetime(appt['EndDateTime'])
-            
-            # Only check gaps for same-day appointments
-            if existing_start.date() == new_start.date():
-                if new_start < existing_end:  # Overlapping
-                    gap = (existing_start - new_end).total_seconds() / 3600
-                else:
-                    gap = (new_start - existing_end).total_seconds() / 3600
-                
-                if min_gap is None or gap < min_gap:
-                    min_gap = gap
-        
-        if min_gap is not None and min_gap < 10:
-            constraints['min_hours_between_shifts'] = f"{min_gap:.1f}"
-            constraints['gap_violation'] = True
-        else:
-            constraints['gap_violation'] = False
-    
-    return constraints
+    return evaluate_constraints(constraints, (
+        new_start, new_end, (new_end - new_start).total_seconds() / 60, week_num
+    ))
+
+def metric_card_class(constraints, field):
+    severity = field_severity(constraints, field)
+    if severity == HARD:
+        return "metric-card alert-danger"
+    if severity == SOFT:
+        return "metric-card alert-warning"
+    return "metric-card"
 
 def display_constraints(constraints):
-    consecutive_class = "metric-card"
-    if constraints['max_consecutive_days'] >= 5:
-        consecutive_class = "metric-card alert-danger"
-    
-    hours_class = "metric-card"
-    if constraints['min_hours_between_shifts'] != 'N/A' and float(constraints['min_hours_between_shifts']) < 10:
-        hours_class = "metric-card alert-danger"
-    
-    week1_class = "metric-card"
-    if constraints['week1_violation']:
-        if constraints['employmentType'] == 'Part Time' and constraints['week1_hours'] <= 38:
-            week1_class = "metric-card alert-warning"
-        else:
-            week1_class = "metric-card alert-danger"
-    
-    week2_class = "metric-card"
-    if constraints['week2_violation']:
-        if constraints['employmentType'] == 'Part Time' and constraints['week2_hours'] <= 38:
-            week2_class = "metric-card alert-warning"
-        else:
-            week2_class = "metric-card alert-danger"
-    
-    total_class = "metric-card"
-    if constraints['total_violation']:
-        if constraints['employmentType'] == 'Part Time' and constraints['total_hours'] <= (constraints['contractedHours'] * 2):
-            total_class = "metric-card alert-warning"
-        else:
-            total_class = "metric-card alert-danger"
+    consecutive_limit = constraints.get('limits', {}).get('consecutive_days', 5)
     
     st.markdown("""
     <div class="metric-container">
         <div class="{consecutive_class}">
-            <div class="metric-value">{max_consecutive_days}/5</div>
+            <div class="metric-value">{max_consecutive_days}/{consecutive_limit:g}</div>
             <div class="metric-label">Consecutive Days</div>
         </div>
         <div class="{hours_class}">
@@ -935,45 +785,26 @@ def display_constraints(constraints):
     </div>
     """.format(
         max_consecutive_days=constraints['max_consecutive_days'],
+        consecutive_limit=consecutive_limit,
         min_hours_between_shifts=constraints['min_hours_between_shifts'],
         week1_hours=constraints['week1_hours'],
         week2_hours=constraints['week2_hours'],
         total_hours=constraints['total_hours'],
-        consecutive_class=consecutive_class,
-        hours_class=hours_class,
-        week1_class=week1_class,
-        week2_class=week2_class,
-        total_class=total_class
+        consecutive_class=metric_card_class(constraints, 'max_consecutive_days'),
+        hours_class=metric_card_class(constraints, 'min_gap_hours'),
+        week1_class=metric_card_class(constraints, 'week1_hours'),
+        week2_class=metric_card_class(constraints, 'week2_hours'),
+        total_class=metric_card_class(constraints, 'total_hours')
     ), unsafe_allow_html=True)
 
-    # Validate constraints
-    constraint_errors = []
-    if constraints['max_consecutive_days'] > 5:
-        constraint_errors.append(f"❌ This resource has {constraints['max_consecutive_days']} consecutive days (max 5 allowed)")
-    
-    if constraints['min_hours_between_shifts'] != 'N/A' and float(constraints['min_hours_between_shifts']) < 10:
-        constraint_errors.append(f"❌ Only {constraints['min_hours_between_shifts']} hours between shifts on the same day (min 10 required)")
-    
-    if constraints['employmentType'] == 'Full Time':
-        if constraints['week1_hours'] > 38:
-            constraint_errors.append(f"❌ Week 1 hours exceed 38 (currently {constraints['week1_hours']:.1f}h)")
-        if constraints['week2_hours'] > 38:
-            constraint_errors.append(f"❌ Week 2 hours exceed 38 (currently {constraints['week2_hours']:.1f}h)")
-        if constraints['total_hours'] > 76:
-            constraint_errors.append(f"❌ Total hours exceed 76 (currently {constraints['total_hours']:.1f}h)")
-    elif constraints['employmentType'] == 'Part Time':
-        if constraints['week1_hours'] > constraints['contractedHours']:
-            if constraints['week1_hours'] <= 38:
-                constraint_errors.append(f"⚠️ Week 1 hours exceed contracted {constraints['contractedHours']}h (currently {constraints['week1_hours']:.1f}h)")
-            else:
-                constraint_errors.append(f"❌ Week 1 hours exceed maximum 38h (currently {constraints['week1_hours']:.1f}h)")
-        if constraints['week2_hours'] > constraints['contractedHours']:
-            if constraints['week2_hours'] <= 38:
-                constraint_errors.append(f"⚠️ Week 2 hours exceed contracted {constraints['contractedHours']}h (currently {constraints['week2_hours']:.1f}h)")
-            else:
-                constraint_errors.append(f"❌ Week 2 hours exceed maximum 38h (currently {constraints['week2_hours']:.1f}h)")
-        if constraints['total_hours'] > (constraints['contractedHours'] * 2):
-            constraint_errors.append(f"❌ Total hours exceed contracted {constraints['contractedHours']*2}h (currently {constraints['total_hours']:.1f}h)")
+    if constraints.get('offsite_hours'):
+        st.caption(f"Includes {constraints['offsite_hours']:.1f}h scheduled at other locations")
+
+    # Violations found by the rule engine
+    constraint_errors = [
+        f"{'❌' if v['severity'] == HARD else '⚠️'} {v['message']}"
+        for v in constraints.get('violations', [])
+    ]
     
     if constraint_errors:
         st.markdown("""
@@ -1017,48 +848,6 @@ def display_resource_details(resource_details):
         primaryLocation=resource_details.get('primaryLocation', 'Unknown')
     ), unsafe_allow_html=True)
 
-def display_constraints(constraints):
-    consecutive_class = "metric-card"
-    if constraints['max_consecutive_days'] >= 5:
-        consecutive_class = "metric-card alert-danger"
-    
-    hours_class = "metric-card"
-    if constraints['min_hours_between_shifts'] != 'N/A' and float(constraints['min_hours_between_shifts']) < 10:
-        hours_class = "metric-card alert-danger"
-    
-    st.markdown("""
-    <div class="metric-container">
-        <div class="{consecutive_class}">
-            <div class="metric-value">{max_consecutive_days}/5</div>
-            <div class="metric-label">Consecutive Days</div>
-        </div>
-        <div class="{hours_class}">
-            <div class="metric-value">{min_hours_between_shifts}h</div>
-            <div class="metric-label">Min Between Shifts</div>
-        </div>
-        <div class="metric-card">
-            <div class="metric-value">{week1_hours:.1f}h</div>
-            <div class="metric-label">Week 1 Hours</div>
-        </div>
-        <div class="metric-card">
-            <div class="metric-value">{week2_hours:.1f}h</div>
-            <div class="metric-label">Week 2 Hours</div>
-        </div>
-        <div class="metric-card">
-            <div class="metric-value">{total_hours:.1f}h</div>
-            <div class="metric-label">Total Hours</div>
-        </div>
-    </div>
-    """.format(
-        max_consecutive_days=constraints['max_consecutive_days'],
-        min_hours_between_shifts=constraints['min_hours_between_shifts'],
-        week1_hours=constraints['week1_hours'],
-        week2_hours=constraints['week2_hours'],
-        total_hours=constraints['total_hours'],
-        consecutive_class=consecutive_class,
-        hours_class=hours_class
-    ), unsafe_allow_html=True)
-
 def display_appointment_card(row):
     # Format the date and time display to include days
     start_datetime = pd.to_datetime(row['StartDateTime'])
@@ -1095,103 +884,374 @@ def display_day_tabs(days, selected_day, week_num=None):
             if st.button(day, key=key, disabled=(day not in days)):
                 selected_day = day
     
-    # Show which day is currently selected
-    st.markdown(f"**Showing appointments for:** {selected_day}")
-    return selected_day
+    # Show which day is currently selected
+    st.markdown(f"**Showing appointments for:** {selected_day}")
+    return selected_day
+
+def _keep_tab(key):
+    """Segmented controls can be deselected; a tab bar always keeps one tab open"""
+    if st.session_state.get(key) is None:
+        st.session_state[key] = st.session_state.get(f"{key}_last")
+    st.session_state[f"{key}_last"] = st.session_state[key]
+
+def lazy_tabs(options, key, format_func=str):
+    """Tab bar whose selection lives in session state; returns the active option.
+
+    Unlike st.tabs, which runs the body of every tab on each rerun, callers
+    render only the returned tab.
+    """
+    options = list(options)
+    last = st.session_state.get(f"{key}_last")
+    if st.session_state.get(key) not in options:
+        st.session_state[key] = last if last in options else options[0]
+    st.session_state[f"{key}_last"] = st.session_state[key]
+    st.segmented_control(
+        "Tabs", options, format_func=format_func, key=key,
+        label_visibility="collapsed", on_change=_keep_tab, args=(key,)
+    )
+    return st.session_state[key]
+
+def display_resource_constraints(resource_name, location):
+    """Show current constraints without adding potential assignment hours"""
+    display_constraints(calculate_constraints(resource_name, location))
+
+def calculate_team_constraints(location):
+    """Constraint metrics and violations for every worker at a location in one batch"""
+    week_ranges = get_week_ranges(location)
+    snapshot = get_all_assigned_appointments(location)
+    
+    shift_columns = ['Resource', 'StartDateTime', 'EndDateTime', 'DurationMinutes', 'Week', 'StartDate']
+    if snapshot.empty:
+        shifts = pd.DataFrame(columns=shift_columns)
+    else:
+        shifts = snapshot.assign(Resource=snapshot['Resource'].str.split().str.join(' '))[shift_columns]
+        shifts = shifts[
+            (shifts['StartDate'] >= week_ranges['week1_start'])
+            & (shifts['StartDate'] <= week_ranges['week2_end'])
+        ]
+    
+    # Everyone rostered here plus local workers without shifts yet
+    names = sorted(set(get_resources_by_location(location)) | set(shifts['Resource']))
+    resources = pd.DataFrame({'Resource': names}).merge(
+        get_resource_directory(), on='Resource', how='left'
+    )
+    resources['employmentType'] = resources['employmentType'].fillna('Unknown')
+    resources['hoursPerWeek'] = resources['hoursPerWeek'].fillna(0)
+    
+    # Hours at other locations: org-wide ledger minus this location's daily totals
+    ledger = get_hours_ledger().frame(names, week_ranges['week1_start'], week_ranges['week2_end'])
+    local = shifts.groupby(['Resource', 'StartDate'])['DurationMinutes'].sum().rename('LocalMinutes')
+    offsite = ledger.merge(
+        local, left_on=['Resource', 'WorkDate'], right_index=True, how='left'
+    )
+    offsite['Minutes'] = offsite['Minutes'] - offsite['LocalMinutes'].fillna(0)
+    offsite = offsite[offsite['Minutes'] > 0]
+    offsite['Week'] = get_week_numbers(offsite['WorkDate'], week_ranges) if not offsite.empty else []
+    
+    return evaluate_many(get_rule_set(), shifts, resources, offsite)
+
+def display_team_constraints_tab(selected_location, selected_employment_type):
+    """One sortable table of constraint metrics for every worker at the location"""
+    team = calculate_team_constraints(selected_location)
+    if selected_employment_type != 'All':
+        team = team[team['employmentType'] == selected_employment_type]
+    
+    if team.empty:
+        st.markdown("""
+        <div class="empty-state">
+            <div class="empty-state-icon">⚠️</div>
+            <div class="empty-state-text">No resources found for this location and employment type.</div>
+        </div>
+        """, unsafe_allow_html=True)
+        return
+    
+    team = team.sort_values(['hard_violations', 'soft_violations', 'total_hours'], ascending=False)
+    hard_count = int((team['hard_violations'] > 0).sum())
+    soft_count = int(((team['hard_violations'] == 0) & (team['soft_violations'] > 0)).sum())
+    
+    st.markdown(f"""
+    <div class="card">
+        <div class="card-header">
+            <span class="icon">🧮</span> Team Constraints at {selected_location}
+        </div>
+        <div>{len(team)} workers · {hard_count} with violations · {soft_count} with warnings</div>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    table = pd.DataFrame({
+        'Worker': team['Resource'],
+        'Type': team['employmentType'],
+        'Contracted (h/wk)': team['hoursPerWeek'],
+        'Consecutive Days': team['max_consecutive_days'].astype(int),
+        'Min Gap (h)': team['min_gap_hours'],
+        'Week 1 (h)': team['week1_hours'],
+        'Week 2 (h)': team['week2_hours'],
+        'Total (h)': team['total_hours'],
+        'Violations': team['violations'].str.join('; '),
+    })
+    severities = pd.DataFrame('', index=table.index, columns=table.columns)
+    for column, field in [
+        ('Consecutive Days', 'max_consecutive_days'),
+        ('Min Gap (h)', 'min_gap_hours'),
+        ('Week 1 (h)', 'week1_hours'),
+        ('Week 2 (h)', 'week2_hours'),
+        ('Total (h)', 'total_hours'),
+    ]:
+        severities[column] = team[f'{field}_severity'].map({
+            HARD: 'background-color: #ffebee; color: #c62828; font-weight: 600',
+            SOFT: 'background-color: #fff3e0; color: #e65100',
+        }).fillna('')
+    
+    st.dataframe(
+        table.style.apply(lambda _: severities, axis=None).format(
+            precision=1, na_rep='N/A', subset=['Min Gap (h)', 'Week 1 (h)', 'Week 2 (h)', 'Total (h)']
+        ),
+        hide_index=True
+    )
+
+@bounded_cache(ttl=3600)
+def get_appointment_history(location, start_date, end_date):
+    """Past appointments at a location from the archive (plus live rows not archived yet)"""
+    norm_location = normalize_location(location)
+    
+    query = """
+    SELECT 
+        Id AS AppointmentID,
+        Name,
+        CONVERT(VARCHAR, maica__Scheduled_Start__c, 120) AS StartDateTime,
+        CONVERT(VARCHAR, maica__Scheduled_End__c, 120) AS EndDateTime,
+        maica__Scheduled_Duration_Minutes__c AS DurationMinutes,
+        maica__Participants__c AS Participant,
+        maica__Resources__c AS Resource
+    FROM NewAppointmentsArchive
+    WHERE maica__Scheduled_Start__c >= ?
+    AND maica__Scheduled_Start__c < ?
+    AND maica__Participant_Location__c LIKE '%' + ? + '%'
+    UNION ALL
+    SELECT 
+        Id AS AppointmentID,
+        Name,
+        CONVERT(VARCHAR, maica__Scheduled_Start__c, 120) AS StartDateTime,
+        CONVERT(VARCHAR, maica__Scheduled_End__c, 120) AS EndDateTime,
+        maica__Scheduled_Duration_Minutes__c AS DurationMinutes,
+        maica__Participants__c AS Participant,
+        maica__Resources__c AS Resource
+    FROM NewAppointments
+    WHERE maica__Scheduled_Start__c >= ?
+    AND maica__Scheduled_Start__c < ?
+    AND maica__Scheduled_Start__c < ?
+    AND maica__Participant_Location__c LIKE '%' + ? + '%'
+    ORDER BY StartDateTime
+    """
+    end_exclusive = end_date + timedelta(days=1)
+    params = [
+        start_date, end_exclusive, norm_location,
+        start_date, end_exclusive, active_window_start(), norm_location
+    ]
+    df = read_frame(query, params, dtypes={'DurationMinutes': 'float64'})
+    
+    if not df.empty:
+        df['DurationHours'] = df['DurationMinutes'] / 60
+        df['Resource'] = df['Resource'].where(
+            df['Resource'].notna() & (df['Resource'] != 'NULL'), 'Unassigned'
+        )
+    return df
+
+def display_history_tab(selected_location):
+    """Archived cycles for the location, loaded only when a date range is requested"""
+    window_start = active_window_start().date()
+    st.caption(f"Appointments before {window_start:%d %b %Y} are archived and only read here")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        start_date = st.date_input("From", window_start - timedelta(days=28), key="history_from")
+    with col2:
+        end_date = st.date_input("To", window_start - timedelta(days=1), key="history_to")
+    
+    if not st.button("Load history", key="load_history"):
+        return
+    try:
+        history = get_appointment_history(selected_location, start_date, end_date)
+    except Exception as e:
+        st.error(f"Could not read the appointment archive: {str(e)}")
+        return
+    if history.empty:
+        st.info("No appointments in this date range")
+        return
+    
+    hours = history.groupby('Resource', as_index=False)['DurationHours'].sum()
+    st.markdown(f"**{len(history)}** appointments · **{hours['DurationHours'].sum():.1f}h** scheduled")
+    st.dataframe(hours.sort_values('DurationHours', ascending=False), hide_index=True)
+    st.dataframe(
+        history[['StartDateTime', 'EndDateTime', 'Name', 'Participant', 'Resource', 'DurationHours']],
+        hide_index=True
+    )
+
+def plan_next_cycles(location, cycles):
+    """Current cycle projected forward, without duplicates and re-validated against the rules"""
+    norm_location = normalize_location(location)
+    week_ranges = get_week_ranges(location)
+    with read_connection() as conn:
+        template = capture_cycle(conn, norm_location, week_ranges)
+        if template.empty:
+            return template, pd.DataFrame()
+        projected = drop_existing(conn, project(template, week_ranges['week1_start'], cycles), norm_location)
+    if projected.empty:
+        return projected, pd.DataFrame()
+    
+    workers = projected['Resource'].dropna().unique().tolist()
+    booked = get_hours_ledger().frame(
+        workers,
+        projected['StartDateTime'].min().date(),
+        projected['StartDateTime'].max().date()
+    )
+    return validate(get_rule_set(), projected, get_resource_directory(), booked)
+
+def display_roster_templates_tab(selected_location):
+    """Repeat the current cycle's shifts and assignments for the next cycles"""
+    st.markdown(f"""
+    <div class="card">
+        <div class="card-header">
+            <span class="icon">🔁</span> Next Cycles from Current Roster
+        </div>
+        <div>Copies every shift and assignment of the current fortnight at {selected_location}</div>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    cycles = int(st.number_input("Cycles to create", min_value=1, max_value=6, value=1, key="template_cycles"))
+    # Planning reads and validates the whole cycle, so it runs on request and the
+    # plan is kept for this roster until it is created or previewed again
+    plan_key = scoped_key('template_plan')
+    if st.button("Preview", key="preview_template"):
+        st.session_state[plan_key] = (cycles, *plan_next_cycles(selected_location, cycles))
+    plan = st.session_state.get(plan_key)
+    if plan is None or plan[0] != cycles:
+        st.caption("Preview the next cycles to check them against the rules before creating them.")
+        return
+    _, projected, findings = plan
+    if projected.empty:
+        st.info("Nothing to create: the current cycle is empty or the next cycles already exist.")
+        return
+    
+    assigned = int(projected['Assign'].notna().sum())
+    blocked = int(projected['Blocked'].sum())
+    st.markdown(
+        f"**{len(projected)}** shifts · **{assigned}** assigned · "
+        f"**{blocked}** left unassigned because of rule violations"
+    )
+    if not findings.empty:
+        st.dataframe(
+            findings.assign(violations=findings['violations'].str.join('; ')),
+            hide_index=True
+        )
+    
+    if st.button(f"Create {len(projected)} shifts", type="primary", key="create_from_template"):
+        try:
+            with db_connection() as conn:
+                # Shifts created since the preview are not created twice
+                created = insert_projected(conn, drop_existing(conn, projected, normalize_location(selected_location)))
+        except Exception as e:
+            st.error(f"Database error while creating shifts: {str(e)}")
+            return
+        st.session_state.pop(plan_key, None)
+        bump_generation(ROSTER_WRITES)
+        clear_all()
+        if READ_REPLICA:
+            get_replica().wake()  # the new shifts reach the replica with the next pull
+        get_hours_ledger.clear()
+        get_constraint_store().discard()
+        st.success(f"✅ Created {created} shifts")
+
+SCAN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "violation_scan.py")
+
+@st.cache_resource
+def get_scan_runner():
+    """The background violation scan process, at most one for the whole app"""
+    return {'process': None, 'lock': threading.Lock()}
+
+def scan_running():
+    """Whether a scan started from the app is still running; reaps a finished one"""
+    runner = get_scan_runner()
+    with runner['lock']:
+        process = runner['process']
+        if process is not None and process.poll() is not None:
+            runner['process'] = process = None
+        return process is not None
+
+def start_violation_scan():
+    """Start violation_scan.py in its own process; returns False when a scan is already running"""
+    runner = get_scan_runner()
+    with runner['lock']:
+        process = runner['process']
+        if process is not None and process.poll() is None:
+            return False
+        # Same working directory as the app, so the scan writes the results table latest_scan reads
+        runner['process'] = subprocess.Popen([sys.executable, SCAN_SCRIPT])
+        return True
 
-def display_resource_constraints(resource_name, location):
-    """Show current constraints without adding potential assignment hours"""
-    constraints = calculate_constraints(resource_name, location)
+def display_violations_tab(selected_location, selected_employment_type):
+    """Findings of the latest background violation scan, read from the local results table"""
+    run, findings = latest_scan()
     
-    # Display constraints in metrics cards
-    consecutive_class = "metric-card"
-    if constraints['max_consecutive_days'] > 5:
-        consecutive_class = "metric-card alert-danger"
+    col1, col2 = st.columns([0.8, 0.2])
+    with col2:
+        if st.button("Run scan now", key="run_violation_scan", disabled=scan_running()):
+            # Runs in its own process pool; results show up on the next refresh
+            if start_violation_scan():
+                st.info("Scan started in the background")
+            else:
+                st.warning("A scan is already running")
+        elif scan_running():
+            st.caption("Scan running…")
     
-    hours_class = "metric-card"
-    if constraints['min_hours_between_shifts'] != 'N/A' and float(constraints['min_hours_between_shifts']) < 10:
-        hours_class = "metric-card alert-danger"
+    if run is None:
+        st.markdown("""
+        <div class="empty-state">
+            <div class="empty-state-icon">🔎</div>
+            <div class="empty-state-text">No scan results yet. Run violation_scan.py or start a scan here.</div>
+        </div>
+        """, unsafe_allow_html=True)
+        return
     
-    week1_class = "metric-card"
-    if constraints['week1_violation']:
-        week1_class = "metric-card alert-danger"
+    with col1:
+        st.caption(
+            f"Scan #{run['run_id']} finished {run['finished_at']} · {run['rosters']} rosters · "
+            f"{run['resources']} resources · {run['seconds']:.1f}s on {run['workers']} workers"
+        )
     
-    week2_class = "metric-card"
-    if constraints['week2_violation']:
-        week2_class = "metric-card alert-danger"
+    scope = st.radio("Show", ["This roster", "All rosters"], horizontal=True, key="violations_scope")
+    if scope == "This roster":
+        findings = findings[findings['location'] == normalize_location(selected_location)]
+    if selected_employment_type != 'All':
+        findings = findings[findings['employment_type'] == selected_employment_type]
     
-    total_class = "metric-card"
-    if constraints['total_violation']:
-        total_class = "metric-card alert-danger"
+    if findings.empty:
+        st.success("✅ No violations found")
+        return
     
-    st.markdown("""
-    <div class="metric-container">
-        <div class="{consecutive_class}">
-            <div class="metric-value">{max_consecutive_days}/5</div>
-            <div class="metric-label">Consecutive Days</div>
-        </div>
-        <div class="{hours_class}">
-            <div class="metric-value">{min_hours_between_shifts}h</div>
-            <div class="metric-label">Min Between Shifts</div>
-        </div>
-        <div class="{week1_class}">
-            <div class="metric-value">{week1_hours:.1f}h</div>
-            <div class="metric-label">Week 1 Hours</div>
-        </div>
-        <div class="{week2_class}">
-            <div class="metric-value">{week2_hours:.1f}h</div>
-            <div class="metric-label">Week 2 Hours</div>
-        </div>
-        <div class="{total_class}">
-            <div class="metric-value">{total_hours:.1f}h</div>
-            <div class="metric-label">Total Hours</div>
+    hard_count = int((findings['severity'] == HARD).sum())
+    st.markdown(f"""
+    <div class="card">
+        <div class="card-header">
+            <span class="icon">🚨</span> {len(findings)} findings
         </div>
+        <div>{hard_count} violations · {len(findings) - hard_count} warnings · {findings['resource'].nunique()} workers</div>
     </div>
-    """.format(
-        max_consecutive_days=constraints['max_consecutive_days'],
-        min_hours_between_shifts=constraints['min_hours_between_shifts'],
-        week1_hours=constraints['week1_hours'],
-        week2_hours=constraints['week2_hours'],
-        total_hours=constraints['total_hours'],
-        consecutive_class=consecutive_class,
-        hours_class=hours_class,
-        week1_class=week1_class,
-        week2_class=week2_class,
-        total_class=total_class
-    ), unsafe_allow_html=True)
-
-    # Validate constraints
-    constraint_errors = []
-    if constraints['max_consecutive_days'] > 5:
-        constraint_errors.append(f"❌ This resource has {constraints['max_consecutive_days']} consecutive days (max 5 allowed)")
-    
-    if constraints['min_hours_between_shifts'] != 'N/A' and float(constraints['min_hours_between_shifts']) < 10:
-        constraint_errors.append(f"❌ Only {constraints['min_hours_between_shifts']} hours between shifts (min 10 required)")
-    
-    if constraints['employmentType'] == 'Full Time':
-        if constraints['week1_hours'] > 38:
-            constraint_errors.append(f"❌ Week 1 hours exceed 38 (currently {constraints['week1_hours']:.1f}h)")
-        if constraints['week2_hours'] > 38:
-            constraint_errors.append(f"❌ Week 2 hours exceed 38 (currently {constraints['week2_hours']:.1f}h)")
-        if constraints['total_hours'] > 76:
-            constraint_errors.append(f"❌ Total hours exceed 76 (currently {constraints['total_hours']:.1f}h)")
-    elif constraints['employmentType'] == 'Part Time':
-        if constraints['week1_hours'] > constraints['contractedHours']:
-            constraint_errors.append(f"❌ Week 1 hours exceed contracted {constraints['contractedHours']}h (currently {constraints['week1_hours']:.1f}h)")
-        if constraints['week2_hours'] > constraints['contractedHours']:
-            constraint_errors.append(f"❌ Week 2 hours exceed contracted {constraints['contractedHours']}h (currently {constraints['week2_hours']:.1f}h)")
-        if constraints['total_hours'] > (constraints['contractedHours'] * 2):
-            constraint_errors.append(f"❌ Total hours exceed contracted {constraints['contractedHours']*2}h (currently {constraints['total_hours']:.1f}h)")
+    """, unsafe_allow_html=True)
     
-    if constraint_errors:
-        st.markdown("""
-        <div class="alert alert-danger">
-            <strong>⚠️ Constraint Violations Detected</strong>
-            <ul>
-        """, unsafe_allow_html=True)
-        for error in constraint_errors:
-            st.markdown(f'<li>{error}</li>', unsafe_allow_html=True)
-        st.markdown("</ul></div>", unsafe_allow_html=True)
+    table = findings.sort_values(['severity', 'location', 'resource'])[
+        ['severity', 'location', 'resource', 'employment_type', 'week', 'message']
+    ]
+    st.dataframe(
+        table.style.apply(
+            lambda column: column.map({
+                HARD: 'background-color: #ffebee; color: #c62828; font-weight: 600',
+                SOFT: 'background-color: #fff3e0; color: #e65100',
+            }).fillna(''),
+            subset=['severity']
+        ),
+        hide_index=True
+    )
 
 def display_assigned_tab(selected_location, selected_employment_type, selected_resource):
     resources = get_resources_by_location(selected_location, selected_employment_type)
@@ -1318,16 +1378,12 @@ def display_assigned_tab(selected_location, selected_employment_type, selected_r
     week_tab1_label = get_date_range_label(week1_df, "📅 Week 1")
     week_tab2_label = get_date_range_label(week2_df, "📅 Week 2")
 
-    week_tab1, week_tab2 = st.tabs([week_tab1_label, week_tab2_label])
+    week_labels = {1: week_tab1_label, 2: week_tab2_label}
+    week = lazy_tabs(week_labels, "calendar_week", format_func=week_labels.get)
+    render_week_calendar(week1_df if week == 1 else week2_df, f"Week {week}")
 
-    with week_tab1:
-        render_week_calendar(week1_df, "Week 1")
 
-    with week_tab2:
-        render_week_calendar(week2_df, "Week 2")
-
-
-@st.cache_data(ttl=300)
+@bounded_cache(ttl=300)
 def get_all_assigned_appointments(location):
     """Get all assigned appointments for a location"""
     norm_location = normalize_location(location)
@@ -1335,7 +1391,7 @@ def get_all_assigned_appointments(location):
     # First get the week ranges for this location
     week_ranges = get_week_ranges(location)
     
-    with db_connection() as conn:
+    with read_connection() as conn:
         query = """
         SELECT 
             Id AS AppointmentID,
@@ -1350,9 +1406,11 @@ def get_all_assigned_appointments(location):
         AND maica__Resources__c != 'NULL'
         AND maica__Participant_Location__c LIKE '%' + ? + '%'
         AND maica__Participants__c LIKE '%Roster%'
+        AND maica__Scheduled_Start__c >= ?
+        AND maica__Scheduled_Start__c < ?
         ORDER BY maica__Scheduled_Start__c
         """
-        params = [norm_location]
+        params = [norm_location, week_ranges['week1_start'], week_ranges['week2_end'] + timedelta(days=1)]
         
         df = pd.read_sql(query, conn, params=params)
     
@@ -1382,7 +1440,8 @@ def display_assigned_week(week_data, location, week_num):
     
     # Create day tabs
     cols = st.columns(len(days_order))
-    selected_day = st.session_state.get(f'assigned_selected_day_week{week_num}', available_days[0] if len(available_days) > 0 else 'Monday')
+    day_key = scoped_key('assigned_selected_day', week_num=week_num)
+    selected_day = st.session_state.get(day_key, available_days[0] if len(available_days) > 0 else 'Monday')
     
     for i, day in enumerate(days_order):
         with cols[i]:
@@ -1391,64 +1450,26 @@ def display_assigned_week(week_data, location, week_num):
                 if st.button(
                     f"{day[:3]} {f'({day_count})' if day_count > 0 else ''}",
                     key=f"assigned_day_{day}_week{week_num}",
-                    on_click=lambda d=day: st.session_state.update({f'assigned_selected_day_week{week_num}': d})
+                    on_click=lambda d=day: st.session_state.update({day_key: d})
                 ):
                     selected_day = day
             else:
-                st.markdown(f"""
-                <div style="
-                    padding: 8px 15px;
-                    border-radius: 20px;
-                    margin: 0 3px;
-                    font-weight: 500;
-                    color: #9e9e9e;
-                    border: 1px solid #e0e0e0;
-                    background-color: #fafafa;
-                    text-align: center;
-                ">
-                    {day[:3]}
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(day_disabled(day), unsafe_allow_html=True)
     
     st.markdown("---")
     
     # Show highlighted day heading
     day_appointments = week_data[week_data['DayOfWeek'] == selected_day]
 
-    st.markdown(f"""
-    <div style="
-        background-color: #2e7d32;
-        color: white;
-        padding: 10px 20px;
-        border-radius: 25px;
-        display: inline-block;
-        font-weight: bold;
-        font-size: 1.2rem;
-        margin-top: 20px;
-        margin-bottom: 20px;
-        box-shadow: 0 2px 6px rgba(0,0,0,0.2);
-    ">
-        {selected_day} — {len(day_appointments)} appointment{'s' if len(day_appointments) != 1 else ''}
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(day_heading(selected_day, len(day_appointments)), unsafe_allow_html=True)
 
     # Display appointments or fallback message
     if not day_appointments.empty:
-        for _, row in day_appointments.iterrows():
+        for row in day_appointments.itertuples(index=False):
+            row = row._asdict()
             display_assigned_appointment_card(row, location, week_num)
     else:
-        st.markdown(f"""
-        <div style="
-            text-align: center; 
-            padding: 30px; 
-            background-color: #f5f5f5; 
-            border-radius: 10px;
-            margin: 20px 0;
-        ">
-            <div style="font-size: 1.5rem;">📅</div>
-            <div style="font-weight: 600;">No assigned appointments on {selected_day}</div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(empty_state("📅", f"No assigned appointments on {selected_day}"), unsafe_allow_html=True)
 
 def display_assigned_appointment_card(row, location, week_num):
     """Display an assigned appointment card with resource details"""
@@ -1458,51 +1479,23 @@ def display_assigned_appointment_card(row, location, week_num):
     resource_name = row['Resource']
     
     # Track card expansion state
-    expand_key = f"assigned_expand_{appt_id}_w{week_num}"
+    expand_key = scoped_key("assigned_expand", appt_id, week_num)
     if expand_key not in st.session_state:
         st.session_state[expand_key] = False
     
     # Card header with collapse icon
     col1, col2 = st.columns([0.9, 0.1])
     with col1:
-        st.markdown(f"""
-        <div style="
-            border: 1px solid #e0e0e0;
-            border-radius: 8px;
-            padding: 12px;
-            margin-bottom: 8px;
-            background: white;
-        ">
-            <div style="font-weight: 600; font-size: 1rem; color: #333;">
-                {row.get('Name', 'Unnamed Appointment')}
-            </div>
-            <div style="display: flex; gap: 8px; margin-top: 4px;">
-                <span style="
-                    background: #fff3e0;
-                    color: #e65100;
-                    padding: 2px 8px;
-                    border-radius: 12px;
-                    font-size: 0.8rem;
-                ">{row['DurationHours']:.1f}h</span>
-                <span style="
-                    background: #e8f5e9;
-                    color: #388e3c;
-                    padding: 2px 8px;
-                    border-radius: 12px;
-                    font-size: 0.8rem;
-                ">{row.get('Participant', 'No participant')}</span>
-                <span style="
-                    background: #e3f2fd;
-                    color: #1565c0;
-                    padding: 2px 8px;
-                    border-radius: 12px;
-                    font-size: 0.8rem;
-                ">{resource_name}</span>
-            </div>
-            <div style="font-size: 0.85rem; color: #666; margin-top: 4px;">
-                {start_datetime.strftime('%a, %b %d • %I:%M %p')} - {end_datetime.strftime('%I:%M %p')}
-            </div>
-        """, unsafe_allow_html=True)
+        st.markdown(appointment_card(
+            row.get('Name', 'Unnamed Appointment'),
+            row['DurationHours'],
+            row.get('Participant', 'No participant'),
+            start_datetime,
+            end_datetime,
+            resource=resource_name,
+            staged=row.get('Staged', False),
+            pending=row.get('Pending', False)
+        ), unsafe_allow_html=True)
     
     with col2:
         # Collapse/expand icon button
@@ -1515,240 +1508,112 @@ def display_assigned_appointment_card(row, location, week_num):
     # Expanded content (only shown if expanded)
     if st.session_state[expand_key]:
         with st.container():
-            st.markdown(f"""
-            <div style="
-                border: 1px solid #e0e0e0;
-                border-top: none;
-                border-radius: 0 0 8px 8px;
-                padding: 12px;
-                margin-top: -8px;
-                margin-bottom: 12px;
-                background: white;
-            ">
-            """, unsafe_allow_html=True)
+            st.markdown(CARD_DETAILS, unsafe_allow_html=True)
             
             # Show resource details and constraints
             resource_details = get_resource_details(resource_name)
             if resource_details:
                 display_resource_details(resource_details)
-                constraints = calculate_constraints(resource_name, location)
+                constraints = current_constraints(resource_name, location)
                 if constraints:
                     st.markdown("**Current Constraints:**")
                     display_constraints(constraints)
             
+            if row.get('Pending', False):
+                st.markdown("⏳ This assignment is being saved")
+            elif row.get('Staged', False):
+                # Tentative assignment from the what-if sandbox
+                if st.button("Unstage", key=f"unstage_{appt_id}_w{week_num}"):
+                    unstage(appt_id)
+                    st.rerun()
+            elif sandbox_active():
+                if st.button("Stage unassign", key=f"unassign_{appt_id}_w{week_num}"):
+                    stage_unassignment(row, location, week_num)
+                    st.rerun()
+            elif WRITE_BEHIND:
+                if st.button("Unassign", key=f"unassign_{appt_id}_w{week_num}"):
+                    queue_unassignment(row, location, week_num)
+                    st.rerun()
             # Unassign button
-            if st.button("Unassign", key=f"unassign_{appt_id}_w{week_num}"):
-                if unassign_resource_from_appointment(appt_id):
+            elif st.button("Unassign", key=f"unassign_{appt_id}_w{week_num}"):
+                if unassign_resource_from_appointment(appt_id, resource_name, location):
                     st.success(f"Successfully unassigned {resource_name} from this appointment!")
                     st.rerun()
-            
-            st.markdown("</div>", unsafe_allow_html=True)
                 
 def display_unassigned_tab(selected_location, selected_employment_type):
     """Displays the UI tab for handling unassigned appointments with enhanced header"""
     try:
         unassigned_appointments = get_unassigned_appointments(selected_location)
-        all_resources_df = get_all_resources(selected_employment_type)
         local_resources = get_resources_by_location(selected_location, selected_employment_type)
         
         # Get all assigned appointments for this location
         assigned_appointments = get_all_assigned_appointments(selected_location)
+
+        # Show queued and staged what-if changes on top of the cached roster
+        unassigned_appointments, assigned_appointments = apply_pending(
+            unassigned_appointments, assigned_appointments, selected_location
+        )
+        unassigned_appointments, assigned_appointments = apply_sandbox(
+            unassigned_appointments, assigned_appointments
+        )
     except Exception as e:
-        st.error(f"""
-        <div style="
-            background-color: #ffebee;
-            padding: 15px;
-            border-radius: 8px;
-            border-left: 5px solid #f44336;
-            margin-bottom: 15px;
-        ">
-            <div style="font-weight: 600; color: #d32f2f;">⚠️ Error Loading Data</div>
-            <div style="color: #555;">{str(e)}</div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(notice("⚠️ Error Loading Data", e, tone='error'), unsafe_allow_html=True)
         return
 
     # Enhanced header with professional styling
     unassigned_count = len(unassigned_appointments)
     assigned_count = len(assigned_appointments)
-    st.markdown(f"""
-    <div style="
-        background: linear-gradient(135deg, #ff6b6b, #ff8e8e);
-        color: white;
-        padding: 16px;
-        border-radius: 10px;
-        margin-bottom: 20px;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-    ">
-        <div style="
-            font-size: 1.3rem;
-            font-weight: 600;
-            display: flex;
-            align-items: center;
-            gap: 10px;
-        ">
-            <span style="font-size: 1.5rem;">📅</span>
-            Appointment Assignment at {selected_location}
-        </div>
-        <div style="
-            font-size: 1rem;
-            margin-top: 8px;
-            display: flex;
-            align-items: center;
-            gap: 8px;
-        ">
-            <span style="
-                background: white;
-                color: #ff6b6b;
-                padding: 4px 10px;
-                border-radius: 12px;
-                font-weight: 600;
-                font-size: 0.9rem;
-            ">{unassigned_count} unassigned</span>
-            <span style="
-                background: white;
-                color: #4CAF50;
-                padding: 4px 10px;
-                border-radius: 12px;
-                font-weight: 600;
-                font-size: 0.9rem;
-            ">{assigned_count} assigned</span>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(
+        assignment_header(selected_location, unassigned_count, assigned_count),
+        unsafe_allow_html=True
+    )
 
-    # Create tabs for Unassigned and Assigned appointments
-    tab_unassigned, tab_assigned = st.tabs(["Unassigned Appointments", "Assigned Appointments"])
-    
-    with tab_unassigned:
+    # Only the open sub-tab and week are built
+    sub_tabs = {'unassigned': "Unassigned Appointments", 'assigned': "Assigned Appointments"}
+    sub_tab = lazy_tabs(sub_tabs, "assignment_tab", format_func=sub_tabs.get)
+
+    if sub_tab == 'unassigned':
         if unassigned_appointments.empty:
-            st.markdown("""
-            <div style="
-                text-align: center; 
-                padding: 40px; 
-                background-color: #e8f5e9; 
-                border-radius: 10px;
-                margin: 20px 0;
-            ">
-                <div style="font-size: 2rem;">🎉</div>
-                <div style="font-size: 1.2rem; font-weight: 600; margin-top: 10px;">
-                    All appointments are assigned!
-                </div>
-                <div style="color: #666; margin-top: 5px;">
-                    Great work! There are no unassigned shifts.
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(empty_state(
+                "🎉", "All appointments are assigned!",
+                detail="Great work! There are no unassigned shifts.", tone='success', large=True
+            ), unsafe_allow_html=True)
         else:
-            # Week tabs for unassigned
-            week_tab1, week_tab2 = st.tabs([
-                f"Week 1 ({unassigned_appointments[unassigned_appointments['Week'] == 1]['DayOfWeek'].nunique()} days)", 
-                f"Week 2 ({unassigned_appointments[unassigned_appointments['Week'] == 2]['DayOfWeek'].nunique()} days)"
-            ])
-
-            with week_tab1:
-                week_data = unassigned_appointments[unassigned_appointments['Week'] == 1]
-                if not week_data.empty:
-                    display_week_with_enhanced_tabs(week_data, selected_location, all_resources_df, local_resources, 1)
-                else:
-                    st.markdown("""
-                    <div style="
-                        text-align: center; 
-                        padding: 30px; 
-                        background-color: #f5f5f5; 
-                        border-radius: 10px;
-                        margin: 20px 0;
-                    ">
-                        <div style="font-size: 1.5rem;">📅</div>
-                        <div style="font-weight: 600;">No unassigned appointments in Week 1</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-
-            with week_tab2:
-                week_data = unassigned_appointments[unassigned_appointments['Week'] == 2]
-                if not week_data.empty:
-                    display_week_with_enhanced_tabs(week_data, selected_location, all_resources_df, local_resources, 2)
-                else:
-                    st.markdown("""
-                    <div style="
-                        text-align: center; 
-                        padding: 30px; 
-                        background-color: #f5f5f5; 
-                        border-radius: 10px;
-                        margin: 20px 0;
-                    ">
-                        <div style="font-size: 1.5rem;">📅</div>
-                        <div style="font-weight: 600;">No unassigned appointments in Week 2</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-    
-    with tab_assigned:
+            week_num = display_week_selector(unassigned_appointments, "unassigned_week")
+            week_data = unassigned_appointments[unassigned_appointments['Week'] == week_num]
+            if not week_data.empty:
+                display_week_with_enhanced_tabs(week_data, selected_location, local_resources, week_num)
+            else:
+                st.markdown(empty_state("📅", f"No unassigned appointments in Week {week_num}"), unsafe_allow_html=True)
+    else:
         if assigned_appointments.empty:
-            st.markdown("""
-            <div style="
-                text-align: center; 
-                padding: 40px; 
-                background-color: #f5f5f5; 
-                border-radius: 10px;
-                margin: 20px 0;
-            ">
-                <div style="font-size: 2rem;">⚠️</div>
-                <div style="font-size: 1.2rem; font-weight: 600; margin-top: 10px;">
-                    No assigned appointments found
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(
+                empty_state("⚠️", "No assigned appointments found", large=True),
+                unsafe_allow_html=True
+            )
         else:
-            # Week tabs for assigned
-            week_tab1, week_tab2 = st.tabs([
-                f"Week 1 ({assigned_appointments[assigned_appointments['Week'] == 1]['DayOfWeek'].nunique()} days)", 
-                f"Week 2 ({assigned_appointments[assigned_appointments['Week'] == 2]['DayOfWeek'].nunique()} days)"
-            ])
-
-            with week_tab1:
-                week_data = assigned_appointments[assigned_appointments['Week'] == 1]
-                if not week_data.empty:
-                    display_assigned_week(week_data, selected_location, 1)
-                else:
-                    st.markdown("""
-                    <div style="
-                        text-align: center; 
-                        padding: 30px; 
-                        background-color: #f5f5f5; 
-                        border-radius: 10px;
-                        margin: 20px 0;
-                    ">
-                        <div style="font-size: 1.5rem;">📅</div>
-                        <div style="font-weight: 600;">No assigned appointments in Week 1</div>
-                    </div>
-                    """, unsafe_allow_html=True)
+            week_num = display_week_selector(assigned_appointments, "assigned_week")
+            week_data = assigned_appointments[assigned_appointments['Week'] == week_num]
+            if not week_data.empty:
+                display_assigned_week(week_data, selected_location, week_num)
+            else:
+                st.markdown(empty_state("📅", f"No assigned appointments in Week {week_num}"), unsafe_allow_html=True)
 
-            with week_tab2:
-                week_data = assigned_appointments[assigned_appointments['Week'] == 2]
-                if not week_data.empty:
-                    display_assigned_week(week_data, selected_location, 2)
-                else:
-                    st.markdown("""
-                    <div style="
-                        text-align: center; 
-                        padding: 30px; 
-                        background-color: #f5f5f5; 
-                        border-radius: 10px;
-                        margin: 20px 0;
-                    ">
-                        <div style="font-size: 1.5rem;">📅</div>
-                        <div style="font-weight: 600;">No assigned appointments in Week 2</div>
-                    </div>
-                    """, unsafe_allow_html=True)
+def display_week_selector(appointments, kind):
+    """Week 1 / Week 2 tab bar labelled with the number of days that have appointments"""
+    days = appointments.groupby('Week')['DayOfWeek'].nunique()
+    labels = {week: f"Week {week} ({days.get(week, 0)} days)" for week in (1, 2)}
+    return lazy_tabs(labels, kind, format_func=labels.get)
 
-def display_week_with_enhanced_tabs(week_data, selected_location, all_resources_df, local_resources, week_num):
+def display_week_with_enhanced_tabs(week_data, selected_location, local_resources, week_num):
     """Displays the week with enhanced day tabs and appointment cards"""
     days_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
     available_days = week_data['DayOfWeek'].unique()
     
     # Create day tabs
     cols = st.columns(len(days_order))
-    selected_day = st.session_state.get(f'selected_day_week{week_num}', available_days[0] if len(available_days) > 0 else 'Monday')
+    day_key = scoped_key('selected_day', week_num=week_num)
+    selected_day = st.session_state.get(day_key, available_days[0] if len(available_days) > 0 else 'Monday')
     
     for i, day in enumerate(days_order):
         with cols[i]:
@@ -1757,110 +1622,49 @@ def display_week_with_enhanced_tabs(week_data, selected_location, all_resources_
                 if st.button(
                     f"{day[:3]} {f'({day_count})' if day_count > 0 else ''}",
                     key=f"day_{day}_week{week_num}",
-                    on_click=lambda d=day: st.session_state.update({f'selected_day_week{week_num}': d})
+                    on_click=lambda d=day: st.session_state.update({day_key: d})
                 ):
                     selected_day = day
             else:
-                st.markdown(f"""
-                <div style="
-                    padding: 8px 15px;
-                    border-radius: 20px;
-                    margin: 0 3px;
-                    font-weight: 500;
-                    color: #9e9e9e;
-                    border: 1px solid #e0e0e0;
-                    background-color: #fafafa;
-                    text-align: center;
-                ">
-                    {day[:3]}
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(day_disabled(day), unsafe_allow_html=True)
     
     st.markdown("---")
     
     # Show highlighted day heading
     day_appointments = week_data[week_data['DayOfWeek'] == selected_day]
 
-    st.markdown(f"""
-    <div style="
-        background-color: #2e7d32;
-        color: white;
-        padding: 10px 20px;
-        border-radius: 25px;
-        display: inline-block;
-        font-weight: bold;
-        font-size: 1.2rem;
-        margin-top: 20px;
-        margin-bottom: 20px;
-        box-shadow: 0 2px 6px rgba(0,0,0,0.2);
-    ">
-        {selected_day} — {len(day_appointments)} appointment{'s' if len(day_appointments) != 1 else ''}
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(day_heading(selected_day, len(day_appointments)), unsafe_allow_html=True)
 
     # Display appointments or fallback message
     if not day_appointments.empty:
-        for _, row in day_appointments.iterrows():
-            display_enhanced_appointment_card(row, selected_location, all_resources_df, local_resources, week_num)
+        for row in day_appointments.itertuples(index=False):
+            row = row._asdict()
+            display_enhanced_appointment_card(row, selected_location, local_resources, week_num)
     else:
-        st.markdown(f"""
-        <div style="
-            text-align: center; 
-            padding: 30px; 
-            background-color: #f5f5f5; 
-            border-radius: 10px;
-            margin: 20px 0;
-        ">
-            <div style="font-size: 1.5rem;">📅</div>
-            <div style="font-weight: 600;">No unassigned appointments on {selected_day}</div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(empty_state("📅", f"No unassigned appointments on {selected_day}"), unsafe_allow_html=True)
 
-def display_enhanced_appointment_card(row, selected_location, all_resources_df, local_resources, week_num):
+def display_enhanced_appointment_card(row, selected_location, local_resources, week_num):
     """Displays a clean appointment card with simple collapse/expand icon"""
     appt_id = row['AppointmentID']
     start_datetime = pd.to_datetime(row['StartDateTime'])
     end_datetime = pd.to_datetime(row['EndDateTime'])
     
     # Track card expansion state
-    expand_key = f"expand_{appt_id}_w{week_num}"
+    expand_key = scoped_key("expand", appt_id, week_num)
     if expand_key not in st.session_state:
         st.session_state[expand_key] = False
     
     # Card header with collapse icon
     col1, col2 = st.columns([0.9, 0.1])
     with col1:
-        st.markdown(f"""
-        <div style="
-            border: 1px solid #e0e0e0;
-            border-radius: 8px;
-            padding: 12px;
-            margin-bottom: 8px;
-            background: white;
-        ">
-            <div style="font-weight: 600; font-size: 1rem; color: #333;">
-                {row.get('Name', 'Unnamed Appointment')}
-            </div>
-            <div style="display: flex; gap: 8px; margin-top: 4px;">
-                <span style="
-                    background: #fff3e0;
-                    color: #e65100;
-                    padding: 2px 8px;
-                    border-radius: 12px;
-                    font-size: 0.8rem;
-                ">{row['DurationHours']:.1f}h</span>
-                <span style="
-                    background: #e8f5e9;
-                    color: #388e3c;
-                    padding: 2px 8px;
-                    border-radius: 12px;
-                    font-size: 0.8rem;
-                ">{row.get('Participant', 'No participant')}</span>
-            </div>
-            <div style="font-size: 0.85rem; color: #666; margin-top: 4px;">
-                {start_datetime.strftime('%a, %b %d • %I:%M %p')} - {end_datetime.strftime('%I:%M %p')}
-            </div>
-        """, unsafe_allow_html=True)
+        st.markdown(appointment_card(
+            row.get('Name', 'Unnamed Appointment'),
+            row['DurationHours'],
+            row.get('Participant', 'No participant'),
+            start_datetime,
+            end_datetime,
+            pending=row.get('Pending', False)
+        ), unsafe_allow_html=True)
     
     with col2:
         # Collapse/expand icon button
@@ -1873,25 +1677,24 @@ def display_enhanced_appointment_card(row, selected_location, all_resources_df,
     # Expanded content (only shown if expanded)
     if st.session_state[expand_key]:
         with st.container():
-            st.markdown(f"""
-            <div style="
-                border: 1px solid #e0e0e0;
-                border-top: none;
-                border-radius: 0 0 8px 8px;
-                padding: 12px;
-                margin-top: -8px;
-                margin-bottom: 12px;
-                background: white;
-            ">
-            """, unsafe_allow_html=True)
-            
-            assigned_state_key = f"assigned_{appt_id}"
-            resource_state_key = f"selected_resource_{appt_id}_w{week_num}"
+            st.markdown(CARD_DETAILS, unsafe_allow_html=True)
             
+            if row.get('Pending', False):
+                st.markdown("⏳ Unassignment is being saved")
+                return
+
+            if row.get('Staged', False):
+                # Staged unassignment from the what-if sandbox
+                st.markdown(f"🧪 Staged to unassign from **{get_sandbox()['staged'][appt_id]['previous']}**")
+                if st.button("Unstage", key=f"unstage_{appt_id}_w{week_num}"):
+                    unstage(appt_id)
+                    st.rerun()
+                return
+
             # Check if already assigned
             assigned_to_db = None
             try:
-                with db_connection() as conn:
+                with read_connection() as conn:
                     check_query = "SELECT maica__Resources__c FROM NewAppointments WHERE Id = ?"
                     result = pd.read_sql(check_query, conn, params=[appt_id])
                     if not result.empty:
@@ -1902,18 +1705,10 @@ def display_enhanced_appointment_card(row, selected_location, all_resources_df,
                 st.error(f"Database error: {str(e)}")
             
             if assigned_to_db:
-                st.markdown(f"""
-                <div style="
-                    background-color: #e8f5e9;
-                    padding: 12px;
-                    border-radius: 8px;
-                    margin-bottom: 12px;
-                    border-left: 4px solid #388e3c;
-                ">
-                    <div style="font-weight: 600; color: #388e3c;">✅ Already Assigned</div>
-                    <div style="margin-top: 5px;">Assigned to: {assigned_to_db}</div>
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(
+                    notice("✅ Already Assigned", f"Assigned to: {assigned_to_db}"),
+                    unsafe_allow_html=True
+                )
             else:
                 # Resource selection
                 st.markdown('<div style="margin-bottom: 8px;">', unsafe_allow_html=True)
@@ -1922,21 +1717,42 @@ def display_enhanced_appointment_card(row, selected_location, all_resources_df,
                 local_selected = st.selectbox(
                     "Local Resources:",
                     ["Select local resource..."] + local_resources,
-                    key=f"local_select_{appt_id}_w{week_num}",
+                    key=scoped_key("local_select", appt_id, week_num),
                     format_func=lambda x: x if x == "Select local resource..." else (
                         f"{x} ({get_resource_details(x)['employmentType']})"
                     )
                 )
                 
-                # All resources dropdown
+                # All resources: search the prebuilt index and offer only the top matches
+                index = get_resource_index()
+                search = st.text_input(
+                    "Search all resources:",
+                    key=scoped_key("all_search", appt_id, week_num),
+                    placeholder="Type part of a name"
+                )
+                employment_types = [None, 'Full Time', 'Part Time', 'Casual']
+                facet_col1, facet_col2 = st.columns(2)
+                with facet_col1:
+                    location_facet = st.selectbox(
+                        "Location:",
+                        [None] + index.locations,
+                        key=scoped_key("all_location", appt_id, week_num),
+                        format_func=lambda x: "Any location" if x is None else x
+                    )
+                with facet_col2:
+                    type_facet = st.selectbox(
+                        "Employment type:",
+                        employment_types,
+                        index=employment_types.index(st.session_state.get('selected_employment_type'))
+                        if st.session_state.get('selected_employment_type') in employment_types else 0,
+                        key=scoped_key("all_type", appt_id, week_num),
+                        format_func=lambda x: "Any type" if x is None else x
+                    )
                 all_selected = st.selectbox(
                     "All Resources:",
-                    ["Select from all resources..."] + all_resources_df['resource_name'].unique().tolist(),
-                    key=f"all_select_{appt_id}_w{week_num}",
-                    format_func=lambda x: x if x == "Select from all resources..." else (
-                        f"{x} ({all_resources_df[all_resources_df['resource_name'] == x]['primaryLocation'].values[0]}, "
-                        f"{all_resources_df[all_resources_df['resource_name'] == x]['employmentType'].values[0]})"
-                    )
+                    ["Select from all resources..."] + index.search(search, location_facet, type_facet, RESOURCE_SEARCH_LIMIT),
+                    key=scoped_key("all_select", appt_id, week_num),
+                    format_func=lambda x: x if x == "Select from all resources..." else index.label(x)
                 )
                 
                 # Process selection
@@ -1950,23 +1766,17 @@ def display_enhanced_appointment_card(row, selected_location, all_resources_df,
                     try:
                         resource_details = get_resource_details(determined_selection)
                         if resource_details:
-                            st.markdown("""
-                            <div style="
-                                margin-top: 12px;
-                                padding: 12px;
-                                background-color: #f5f5f5;
-                                border-radius: 8px;
-                            ">
-                            """, unsafe_allow_html=True)
+                            st.markdown(RESOURCE_PANEL, unsafe_allow_html=True)
                             
                             display_resource_details(resource_details)
                             
-                            constraints = calculate_constraints(determined_selection, selected_location)
+                            constraints = current_constraints(determined_selection, selected_location)
                             if constraints:
                                 st.markdown("**Current Constraints:**")
                                 display_constraints(constraints)
                             
-                            if st.button(f"Assign {determined_selection.split()[0]}", 
+                            action = "Stage" if sandbox_active() else "Assign"
+                            if st.button(f"{action} {determined_selection.split()[0]}", 
                                         key=f"assign_btn_{appt_id}_w{week_num}",
                                         type="primary"):
                                 is_valid, message = validate_assignment(
@@ -1976,24 +1786,34 @@ def display_enhanced_appointment_card(row, selected_location, all_resources_df,
                                     end_datetime,
                                     week_num=week_num
                                 )
-                                if is_valid:
+                                if is_valid and sandbox_active():
+                                    stage_assignment(row, determined_selection, selected_location, week_num)
+                                    st.rerun()
+                                elif is_valid and WRITE_BEHIND:
+                                    queue_assignment(row, determined_selection, selected_location, week_num)
+                                    st.rerun()
+                                elif is_valid:
                                     if assign_resource_to_appointment(appt_id, determined_selection):
                                         st.success(f"✅ Successfully assigned {determined_selection}!")
                                         st.rerun()
                                 else:
                                     st.error(message)
-                            
-                            st.markdown("</div>", unsafe_allow_html=True)
                     except Exception as e:
                         st.error(f"Error loading details: {str(e)}")
-            
-            st.markdown("</div>", unsafe_allow_html=True)
 
-def unassign_resource_from_appointment(appointment_id):
+def unassign_resource_from_appointment(appointment_id, resource_name=None, location=None):
     """Unassigns a resource from an appointment"""
     try:
         with db_connection() as conn:
             cursor = conn.cursor()
+            # Read what is being removed so the hours ledger can be updated
+            cursor.execute("""
+            SELECT maica__Resources__c, maica__Scheduled_Start__c, maica__Scheduled_Duration_Minutes__c
+            FROM NewAppointments
+            WHERE Id = ?
+            """, (appointment_id,))
+            current = cursor.fetchone()
+
             update_query = """
             UPDATE NewAppointments
             SET maica__Resources__c = NULL
@@ -2006,8 +1826,20 @@ def unassign_resource_from_appointment(appointment_id):
                 st.error("Failed to unassign - appointment may not exist")
                 return False
             else:
+                was_assigned = current and current[0] and str(current[0]).strip().upper() != 'NULL'
+                if was_assigned:
+                    previous = (' '.join(current[0].split()), pd.to_datetime(current[1]).date(), -(current[2] or 0))
+                    adjust_hours(cursor, *previous)
                 conn.commit()
-                st.cache_data.clear()  # Clear relevant caches
+                if was_assigned:
+                    get_hours_ledger().add(*previous)
+                get_constraint_store().remove_shift(appointment_id)
+                reflect_write(appointment_id, None)
+                if location:
+                    invalidate_roster_caches(location, resource_name)
+                else:
+                    bump_generation(ROSTER_WRITES)
+                    clear_all()
                 return True
     except Exception as e:
         try:
@@ -2016,9 +1848,595 @@ def unassign_resource_from_appointment(appointment_id):
             pass
         st.error(f"Database error during unassignment: {str(e)}")
         return False
+
+# What-if sandbox: tentative assignments live in session state on top of the
+# cached roster and only reach the database when the sandbox is committed.
+def get_sandbox():
+    if 'sandbox' not in st.session_state:
+        st.session_state.sandbox = {'enabled': False, 'staged': {}, 'states': {}}
+    return st.session_state.sandbox
+
+def sandbox_active():
+    return get_sandbox()['enabled']
+
+def _apply_to_sandbox_states(change, undo=False):
+    """Update the sandbox's copies of the affected resources' constraint states in place"""
+    for (resource_name, _), state in get_sandbox()['states'].items():
+        adds = change['resource'] == resource_name
+        removes = change['previous'] == resource_name
+        if undo:
+            adds, removes = removes, adds
+        if removes:
+            state.remove(change['appointment_id'])
+        if adds and state.matches_location(change['location']):
+            state.add(change['appointment_id'], change['start'], change['end'], change['minutes'])
+
+def _change(row, resource_name, previous, location, week_num):
+    """One assignment change of a card's appointment, as staged or queued"""
+    start = pd.to_datetime(row['StartDateTime'])
+    end = pd.to_datetime(row['EndDateTime'])
+    return {
+        'appointment_id': row['AppointmentID'],
+        'name': row.get('Name', 'Unnamed Appointment'),
+        'resource': resource_name,
+        'previous': previous,
+        'location': location,
+        'start': start,
+        'end': end,
+        'minutes': row.get('DurationMinutes', (end - start).total_seconds() / 60),
+        'week': week_num,
+    }
+
+def _stage(row, resource_name, previous, location, week_num):
+    change = _change(row, resource_name, previous, location, week_num)
+    get_sandbox()['staged'][row['AppointmentID']] = change
+    _apply_to_sandbox_states(change)
+
+def stage_assignment(row, resource_name, location, week_num):
+    """Stage a tentative assignment without touching the database"""
+    _stage(row, ' '.join(resource_name.split()), None, location, week_num)
+
+def stage_unassignment(row, location, week_num):
+    """Stage removal of an existing assignment without touching the database"""
+    _stage(row, None, ' '.join(row['Resource'].split()), location, week_num)
+
+def unstage(appointment_id):
+    change = get_sandbox()['staged'].pop(appointment_id, None)
+    if change:
+        _apply_to_sandbox_states(change, undo=True)
+
+def sandbox_constraints(resource_name, location):
+    """Constraint summary with staged changes applied to a session-local copy of the state"""
+    normalized_name = ' '.join(resource_name.split())
+    sandbox = get_sandbox()
+    key = (normalized_name, location)
+    state = sandbox['states'].get(key)
+    if state is None:
+        state = get_constraint_state(resource_name, location).copy()
+        for change in sandbox['staged'].values():
+            if change['previous'] == normalized_name:
+                state.remove(change['appointment_id'])
+            if change['resource'] == normalized_name and state.matches_location(change['location']):
+                state.add(change['appointment_id'], change['start'], change['end'], change['minutes'])
+        sandbox['states'][key] = state
+
+    # Staged changes are not in the ledger yet; pass them as adjustments
+    offsite = get_hours_ledger().offsite(normalized_name, state, staged_adjustments(sandbox['staged'].values(), normalized_name))
+    return state.summary(get_rule_set(), offsite)
+
+def staged_adjustments(changes, normalized_name):
+    """Minutes per day the changes add to (or take from) a resource"""
+    adjustments = {}
+    for change in changes:
+        sign = 1 if change['resource'] == normalized_name else -1 if change['previous'] == normalized_name else 0
+        if sign:
+            day = change['start'].date()
+            adjustments[day] = adjustments.get(day, 0) + sign * change['minutes']
+    return adjustments
+
+def current_constraints(resource_name, location):
+    """Constraints as the scheduler should see them (sandbox overlay when exploring)"""
+    if sandbox_active():
+        return sandbox_constraints(resource_name, location)
+    return calculate_constraints(resource_name, location)
+
+def overlay_changes(unassigned_df, assigned_df, changes, flag):
+    """Move the appointments in changes between the unassigned/assigned frames, marking them with column flag"""
+    assign_ids = [appt_id for appt_id, change in changes.items() if change['resource']]
+    unassign_ids = [appt_id for appt_id, change in changes.items() if not change['resource']]
+
+    moved_in = unassigned_df[unassigned_df['AppointmentID'].isin(assign_ids)].copy()
+    moved_in['Resource'] = moved_in['AppointmentID'].map(lambda appt_id: changes[appt_id]['resource'])
+    moved_out = assigned_df[assigned_df['AppointmentID'].isin(unassign_ids)].drop(columns=['Resource'])
+
+    unassigned = pd.concat([
+        unassigned_df[~unassigned_df['AppointmentID'].isin(assign_ids)].assign(**{flag: False}),
+        moved_out.assign(**{flag: True})
+    ]).sort_values('StartDateTime')
+    assigned = pd.concat([
+        assigned_df[~assigned_df['AppointmentID'].isin(unassign_ids)].assign(**{flag: False}),
+        moved_in.assign(**{flag: True})
+    ]).sort_values('StartDateTime')
+    return unassigned, assigned
+
+def apply_sandbox(unassigned_df, assigned_df):
+    """Overlay staged changes on the cached unassigned/assigned appointment frames"""
+    staged = get_sandbox()['staged']
+    if not sandbox_active() or not staged:
+        return unassigned_df, assigned_df
+    return overlay_changes(unassigned_df, assigned_df, staged, 'Staged')
+
+def commit_sandbox():
+    """Write all staged changes in one transaction, rolling back if any row changed underneath"""
+    sandbox = get_sandbox()
+    staged = list(sandbox['staged'].values())
+    if not staged:
+        return True
+
+    # Resolve each roster's weeks before the write transaction: anchoring a roster
+    # for the first time writes RosterCycles from its own connection
+    for location in {change['location'] for change in staged}:
+        get_week_ranges(location)
+
+    conflicts = []
+    breaches = []
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            for change in staged:
+                if change['resource']:
+                    cursor.execute("""
+                    UPDATE NewAppointments
+                    SET maica__Resources__c = ?
+                    WHERE Id = ? AND (maica__Resources__c IS NULL OR maica__Resources__c = '' OR maica__Resources__c = 'NULL')
+                    """, (change['resource'], change['appointment_id']))
+                else:
+                    cursor.execute("""
+                    UPDATE NewAppointments
+                    SET maica__Resources__c = NULL
+                    WHERE Id = ? AND REPLACE(REPLACE(maica__Resources__c, '  ', ' '), '  ', ' ') = ?
+                    """, (change['appointment_id'], change['previous']))
+                if cursor.rowcount == 0:
+                    conflicts.append(change)
+                    continue
+                if change['previous']:
+                    adjust_hours(cursor, change['previous'], change['start'].date(), -change['minutes'])
+                if change['resource']:
+                    adjust_hours(cursor, change['resource'], change['start'].date(), change['minutes'])
+
+            # Hard hour caps over everything staged, against the counters under update locks
+            breaches = []
+            for change in staged:
+                if conflicts or not change['resource']:
+                    continue
+                details = get_resource_details(change['resource'])
+                caps = hour_caps(get_rule_set(), details['employmentType'], details['hoursPerWeek'])
+                week_ranges = get_week_ranges(change['location'])
+                breach = cap_breach(caps, period_hours(cursor, change['resource'], week_ranges, lock=True), change['week'])
+                if breach:
+                    breaches.append(f"{change['resource']}: {breach}")
+
+            # Every hard rule, against the rosters as this transaction leaves them
+            # rather than the session's copies the changes were staged on
+            checked = set()
+            for change in staged:
+                key = (change['resource'], change['location'])
+                if conflicts or not change['resource'] or key in checked:
+                    continue
+                checked.add(key)
+                state = load_constraint_state(change['resource'], change['location'], cursor)
+                offsite = get_hours_ledger().offsite(change['resource'], state, staged_adjustments(staged, change['resource']))
+                result = evaluate_constraints(state.summary(get_rule_set(), offsite))
+                breaches.extend(
+                    f"{change['resource']}: {v['message']}" for v in result['violations'] if v['severity'] == HARD
+                )
+
+            if conflicts or breaches:
+                conn.rollback()
+            else:
+                conn.commit()
+    except Exception as e:
+        try:
+            conn.rollback()
+        except Exception:
+            logger.exception("Error during sandbox rollback")
+        st.error(f"❌ Database error while committing sandbox: {str(e)}")
+        return False
+
+    if breaches:
+        st.error("❌ Sandbox not committed - hard rules would be broken:")
+        for breach in sorted(set(breaches)):
+            st.markdown(f"- {breach}")
+        return False
+
+    if conflicts:
+        st.error(f"❌ Sandbox not committed - {len(conflicts)} appointment(s) changed in the database since they were staged. Unstage them and try again:")
+        for change in conflicts:
+            st.markdown(f"- {change['name']} ({change['start'].strftime('%a, %b %d %I:%M %p')})")
+        return False
+
+    store = get_constraint_store()
+    ledger = get_hours_ledger()
+    for change in staged:
+        if change['previous']:
+            ledger.add(change['previous'], change['start'].date(), -change['minutes'])
+            store.remove_shift(change['appointment_id'])
+        if change['resource']:
+            ledger.add(change['resource'], change['start'].date(), change['minutes'])
+            store.add_shift(
+                change['resource'], change['location'], change['appointment_id'],
+                change['start'], change['end'], change['minutes']
+            )
+        reflect_write(change['appointment_id'], change['resource'])
+        invalidate_roster_caches(change['location'], change['resource'] or change['previous'])
+
+    sandbox['staged'] = {}
+    sandbox['states'] = {}
+    return True
+
+def display_sandbox_controls():
+    """Sidebar toggle plus commit/discard actions for the what-if sandbox"""
+    sandbox = get_sandbox()
+    sandbox['enabled'] = st.toggle(
+        "What-if sandbox",
+        value=sandbox['enabled'],
+        help="Stage assignments in memory and commit them together"
+    )
+    if not sandbox['enabled']:
+        return
+
+    staged_count = len(sandbox['staged'])
+    st.markdown(f"**{staged_count}** staged change{'s' if staged_count != 1 else ''}")
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Commit sandbox", type="primary", disabled=staged_count == 0, key="sandbox_commit"):
+            if commit_sandbox():
+                st.success(f"✅ Committed {staged_count} change{'s' if staged_count != 1 else ''}")
+                st.rerun()
+    with col2:
+        if st.button("Discard", disabled=staged_count == 0, key="sandbox_discard"):
+            sandbox['staged'] = {}
+            sandbox['states'] = {}
+            st.rerun()
         
+
+# Write-behind: validated changes are journaled locally, shown straight away and
+# written to the database by a background worker (write_queue.py).
+WRITE_BEHIND = os.getenv("ROSTER_WRITE_BEHIND", "0") == "1"
+
+def _after_flush(changes, results, queue):
+    """Worker callback: hand the outcome to the next session rerun, which applies it with apply_flushed"""
+    with queue['lock']:
+        queue['flushed'].append((changes, results))
+
+def apply_flushed():
+    """Undo the optimistic update of changes the database refused, then drop the touched caches.
+
+    Runs on a session rerun rather than on the worker thread, once per
+    flushed batch for the whole process.
+    """
+    if not WRITE_BEHIND:
+        return
+    queue = get_write_queue()
+    store = get_constraint_store()
+    ledger = get_hours_ledger()
+    with queue['lock']:
+        flushed, queue['flushed'] = queue['flushed'], []
+        for changes, results in flushed:
+            for change in changes:
+                status, _ = results[change['seq']]
+                if status == 'done':
+                    reflect_write(change['appointment_id'], change['resource'])
+                elif change['seq'] in queue['optimistic']:
+                    day = change['start'].date()
+                    if change['resource']:
+                        ledger.add(change['resource'], day, -change['minutes'])
+                        store.remove_shift(change['appointment_id'])
+                    if change['previous']:
+                        ledger.add(change['previous'], day, change['minutes'])
+                        store.discard(change['previous'])
+                queue['optimistic'].discard(change['seq'])
+                invalidate_roster_caches(change['location'], change['resource'] or change['previous'])
+
+@st.cache_resource
+def get_write_queue():
+    """Journal plus the worker flushing it, shared by every session"""
+    journal = WriteJournal(WRITE_JOURNAL)
+    journal.prune()
+    # Sequence numbers queued by this process, already applied to the ledger and constraint store
+    # and flushed batches waiting for apply_flushed
+    queue = {'journal': journal, 'optimistic': set(), 'flushed': [], 'lock': threading.Lock()}
+    queue['worker'] = WriteBehind(journal, db_connection, lambda changes, results: _after_flush(changes, results, queue))
+    return queue
+
+def queue_change(row, resource_name, previous, location, week_num):
+    """Journal a validated change and apply it to the in-memory roster state straight away"""
+    change = _change(row, resource_name, previous, location, week_num)
+    week_ranges = get_week_ranges(location)
+    change.update({name: week_ranges[name] for name in ('week1_start', 'week1_end', 'week2_end')})
+    if resource_name:
+        details = get_resource_details(resource_name)
+        caps = hour_caps(get_rule_set(), details['employmentType'], details['hoursPerWeek'])
+        change['week_cap'] = caps.get('week_hours')
+        change['total_cap'] = caps.get('total_hours')
+
+    queue = get_write_queue()
+    day = change['start'].date()
+    with queue['lock']:
+        if previous:
+            get_hours_ledger().add(previous, day, -change['minutes'])
+            get_constraint_store().remove_shift(change['appointment_id'])
+        if resource_name:
+            get_hours_ledger().add(resource_name, day, change['minutes'])
+            get_constraint_store().add_shift(
+                resource_name, location, change['appointment_id'], change['start'], change['end'], change['minutes']
+            )
+        queue['optimistic'].add(queue['worker'].submit(change))
+
+def queue_assignment(row, resource_name, location, week_num):
+    queue_change(row, ' '.join(resource_name.split()), None, location, week_num)
+
+def queue_unassignment(row, location, week_num):
+    queue_change(row, None, ' '.join(row['Resource'].split()), location, week_num)
+
+def apply_pending(unassigned_df, assigned_df, location):
+    """Overlay queued changes that have not reached the database yet"""
+    if not WRITE_BEHIND:
+        return unassigned_df, assigned_df
+    pending = {
+        change['appointment_id']: change
+        for change in get_write_queue()['journal'].pending()
+        if change['location'] == location
+    }
+    return overlay_changes(unassigned_df, assigned_df, pending, 'Pending')
+
+@st.fragment(run_every=FLUSH_INTERVAL)
+def display_write_queue():
+    """Sidebar status of the write-behind queue, with the changes that could not be saved"""
+    queue = get_write_queue()
+    journal = queue['journal']
+    worker = queue['worker']
+    apply_flushed()
+    pending = journal.counts().get('pending', 0)
+
+    # Redraw the roster once queued changes have been written
+    if pending < st.session_state.get('write_queue_pending', 0):
+        st.session_state.write_queue_pending = pending
+        st.rerun()
+    st.session_state.write_queue_pending = pending
+
+    if pending and worker.last_error:
+        st.warning(f"⏳ {pending} change{'s' if pending != 1 else ''} waiting - database unreachable, retrying")
+    elif pending:
+        st.caption(f"⏳ Saving {pending} change{'s' if pending != 1 else ''}…")
+    if pending and st.button("Retry now", key="write_queue_retry"):
+        worker.wake()
+
+    problems = journal.problems()
+    if problems:
+        st.error(f"❌ {len(problems)} change{'s' if len(problems) != 1 else ''} could not be saved:")
+        for change in problems:
+            action = f"Assign {change['resource']}" if change['resource'] else f"Unassign {change['previous']}"
+            st.markdown(
+                f"- {action} to {change['name']} ({change['start'].strftime('%a, %b %d %I:%M %p')}): {change['error']}"
+            )
+            if st.button("Dismiss", key=f"write_queue_dismiss_{change['seq']}"):
+                journal.dismiss(change['seq'])
+                st.rerun()
+
+def display_cache_metrics():
+    """Sidebar panel with hit rates, evictions and resident bytes per cached fetcher"""
+    with st.expander("Cache metrics"):
+        if READ_REPLICA:
+            status = get_replica().status()
+            if not status['ready']:
+                st.caption("Read replica: first sync in progress, reading from the database")
+            elif status['age'] is not None:
+                st.caption(f"Read replica: synced {status['age']:.0f}s ago")
+            if status['error']:
+                st.caption(f"Read replica sync failing: {status['error']}")
+        metrics = cache_metrics()
+        if metrics.empty:
+            st.caption("No cached calls yet")
+            return
+        st.caption(f"{metrics['resident_bytes'].sum() / 1024 / 1024:.1f} MB resident across {len(metrics)} caches")
+        metrics['function'] = metrics['function'].str.rsplit('.', n=1).str[-1]
+        st.dataframe(
+            metrics[['function', 'entries', 'resident_bytes', 'hit_rate', 'hits', 'misses', 'shared_hits', 'evictions', 'expirations']],
+            hide_index=True,
+            column_config={
+                'resident_bytes': st.column_config.NumberColumn('bytes', format='%d'),
+                'hit_rate': st.column_config.ProgressColumn('hit rate', min_value=0, max_value=1, format='%.2f'),
+            }
+        )
+        report = session_state_report()
+        st.caption(
+            f"Session state: {report['keys']} keys ({report['scoped_keys']} card keys), "
+            f"{report['bytes'] / 1024:.1f} KB"
+        )
+        if st.button("Clear caches", key="clear_caches"):
+            clear_all()
+            get_resource_index.clear()
+            st.rerun()
                              
+MAIN_TABS = {
+    'calendar': "View Shifts Calender",
+    'assign': "Assign and Unassigned Shifts",
+    'team': "Team Constraints",
+    'violations': "Violations",
+    'templates': "Next Cycles",
+    'history': "History",
+}
+PREFETCH_TABS = os.getenv("ROSTER_PREFETCH_TABS", "1") == "1"  # warm hidden tabs' data in the background
+
+@st.cache_resource
+def get_prefetcher():
+    """Worker pool plus the prefetches currently in flight, shared by every session"""
+    return {'pool': ThreadPoolExecutor(max_workers=2), 'pending': set(), 'lock': threading.Lock()}
+
+def _prefetch(prefetcher, job, fetch):
+    try:
+        fetch()
+    except Exception:
+        # Nothing is shown for a hidden tab; the tab's own fetch reports the error when it is opened
+        logger.exception("Prefetch of the %s tab failed", job[0])
+    finally:
+        with prefetcher['lock']:
+            prefetcher['pending'].discard(job)
+
+def prefetch_tabs(active_tab, location, employment_type):
+    """Fill the bounded caches behind the hidden calendar and assignment tabs.
+
+    Only cached fetchers run off the script thread, so opening one of those
+    tabs later is a cache hit; nothing is rendered for them in this run.
+    """
+    jobs = {}
+    if active_tab != 'assign':
+        jobs[('assign', location, employment_type)] = lambda: (
+            get_unassigned_appointments(location),
+            get_all_assigned_appointments(location),
+            get_resource_index(),
+            get_resources_by_location(location, employment_type),
+        )
+    if active_tab != 'calendar':
+        jobs[('calendar', location, employment_type)] = lambda: [
+            get_appointments_by_resource_and_location(resource, location)
+            for resource in get_resources_by_location(location, employment_type)
+        ]
+
+    prefetcher = get_prefetcher()
+    for job, fetch in jobs.items():
+        with prefetcher['lock']:
+            if job in prefetcher['pending']:
+                continue
+            prefetcher['pending'].add(job)
+        prefetcher['pool'].submit(_prefetch, prefetcher, job, fetch)
+
+COMPARE_WORKERS = int(os.getenv("ROSTER_COMPARE_WORKERS", "8"))  # rosters loaded at once by the comparison view
+
+@st.cache_resource
+def get_snapshot_pool():
+    """Worker pool that loads roster snapshots for the comparison view, shared by every session"""
+    return ThreadPoolExecutor(max_workers=COMPARE_WORKERS)
+
+def load_roster_snapshot(location):
+    """One roster's unassigned and assigned appointments, with queued writes applied"""
+    unassigned, assigned = apply_pending(
+        get_unassigned_appointments(location), get_all_assigned_appointments(location), location
+    )
+    return {'location': location, 'unassigned': unassigned, 'assigned': assigned}
+
+def load_roster_snapshots(locations):
+    """Snapshots of several rosters loaded concurrently; returns (snapshots, {location: error})"""
+    pool = get_snapshot_pool()
+    futures = {location: pool.submit(load_roster_snapshot, location) for location in locations}
+    snapshots, failures = [], {}
+    for location, future in futures.items():
+        try:
+            snapshots.append(future.result())
+        except Exception as e:
+            failures[location] = str(e)
+    return snapshots, failures
+
+def roster_comparison_summary(snapshots):
+    """Open and filled shifts and hours per roster"""
+    names = get_location_participant_mapping()
+    rows = []
+    for snapshot in snapshots:
+        unassigned, assigned = snapshot['unassigned'], snapshot['assigned']
+        shifts = len(unassigned) + len(assigned)
+        rows.append({
+            'Roster': names.get(snapshot['location'], snapshot['location']),
+            'Unassigned': len(unassigned),
+            'Unassigned hours': unassigned['DurationHours'].sum() if not unassigned.empty else 0.0,
+            'Assigned': len(assigned),
+            'Assigned hours': assigned['DurationHours'].sum() if not assigned.empty else 0.0,
+            'Filled': len(assigned) / shifts if shifts else 1.0,
+        })
+    return pd.DataFrame(rows)
+
+def roster_swimlanes(snapshots, week_num):
+    """Every shift of one roster week across the snapshots, one row per shift with its roster and status"""
+    names = get_location_participant_mapping()
+    frames = []
+    for snapshot in snapshots:
+        for status, frame in (('Unassigned', snapshot['unassigned']), ('Assigned', snapshot['assigned'])):
+            if frame.empty:
+                continue
+            frames.append(frame[frame['Week'] == week_num].assign(
+                Roster=names.get(snapshot['location'], snapshot['location']),
+                Status=status,
+                Resource=frame['Resource'] if 'Resource' in frame else '',
+            ))
+    if not frames:
+        return pd.DataFrame()
+    shifts = pd.concat(frames, ignore_index=True)
+    shifts['StartDateTime'] = pd.to_datetime(shifts['StartDateTime'])
+    shifts['EndDateTime'] = pd.to_datetime(shifts['EndDateTime'])
+    return shifts[['Roster', 'Status', 'Name', 'Participant', 'Resource', 'StartDateTime', 'EndDateTime', 'DurationHours']]
+
+def display_roster_comparison(locations):
+    """Several rosters at once: combined counts and hours, then a calendar with one swimlane per roster"""
+    if not locations:
+        st.markdown(
+            empty_state("🗂️", "Choose rosters to compare", detail="Pick them in the sidebar."),
+            unsafe_allow_html=True
+        )
+        return
+
+    snapshots, failures = load_roster_snapshots(locations)
+    for location, error in failures.items():
+        st.error(f"❌ Could not load {location}: {error}")
+    if not snapshots:
+        return
+
+    summary = roster_comparison_summary(snapshots)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Rosters", len(summary))
+    col2.metric("Unassigned shifts", int(summary['Unassigned'].sum()))
+    col3.metric("Unassigned hours", f"{summary['Unassigned hours'].sum():.1f}h")
+    st.dataframe(
+        summary.sort_values('Unassigned hours', ascending=False),
+        hide_index=True,
+        column_config={
+            'Unassigned hours': st.column_config.NumberColumn(format='%.1f'),
+            'Assigned hours': st.column_config.NumberColumn(format='%.1f'),
+            'Filled': st.column_config.ProgressColumn(min_value=0, max_value=1, format='percent'),
+        }
+    )
+
+    weeks = {1: "Week 1", 2: "Week 2"}
+    week_num = lazy_tabs(weeks, "compare_week", format_func=weeks.get)
+    shifts = roster_swimlanes(snapshots, week_num)
+    if shifts.empty:
+        st.markdown(empty_state("📅", f"No shifts in Week {week_num}"), unsafe_allow_html=True)
+        return
+
+    # One chart for every roster keeps the page light however many are selected
+    chart = alt.Chart(shifts).mark_bar(cornerRadius=2).encode(
+        x=alt.X('StartDateTime:T', title=None, axis=alt.Axis(format='%a %d %b')),
+        x2='EndDateTime:T',
+        y=alt.Y('Roster:N', title=None),
+        color=alt.Color(
+            'Status:N',
+            scale=alt.Scale(domain=['Unassigned', 'Assigned'], range=['#e53935', '#43a047']),
+            legend=alt.Legend(orient='top', title=None)
+        ),
+        tooltip=[
+            'Roster', 'Name', 'Participant', 'Resource',
+            alt.Tooltip('StartDateTime:T', format='%a %d %b %H:%M'),
+            alt.Tooltip('EndDateTime:T', format='%H:%M'),
+            alt.Tooltip('DurationHours:Q', format='.1f'),
+        ]
+    ).properties(height=max(120, 40 * shifts['Roster'].nunique()))
+    st.altair_chart(chart, width="stretch")
+
 def main():
+    sync_replica_state()
+    apply_flushed()
+    if READ_REPLICA:
+        get_replica()  # starts the sync worker; reads use the primary until its first pull
+
     # Initialize session state
     if 'selected_location' not in st.session_state:
         st.session_state.selected_location = None
@@ -2073,6 +2491,18 @@ def main():
                     </div>
                     """, unsafe_allow_html=True)
 
+        # Regional view: several rosters side by side instead of one
+        compare_mode = st.toggle("Compare rosters", key="compare_mode", help="Show several rosters side by side")
+        if compare_mode:
+            display_names = {loc['location']: loc['display_name'] for loc in location_options}
+            compare_locations = st.multiselect(
+                "Rosters to compare:",
+                list(display_names),
+                default=[selected_location] if selected_location in display_names else [],
+                format_func=display_names.get,
+                key="compare_rosters"
+            )
+
     # Main content
     st.markdown("""
     <div class="card">
@@ -2082,6 +2512,10 @@ def main():
     </div>
     """, unsafe_allow_html=True)
 
+    if compare_mode:
+        display_roster_comparison(compare_locations)
+        return
+
     if st.session_state.selected_location:
         # Get resource counts by type
         resource_counts = get_resource_counts_by_location(st.session_state.selected_location)
@@ -2119,23 +2553,53 @@ def main():
                 st.session_state.selected_resource = None
                 st.rerun()
 
-        # Main tabs
-        tab_assigned, tab_unassigned = st.tabs(
-            ["View Shifts Calender", "Assign and Unassigned Shifts"]
+            display_sandbox_controls()
+            if WRITE_BEHIND:
+                display_write_queue()
+            display_cache_metrics()
+
+        # Card keys are namespaced per roster and swept once every card has rendered
+        enter_scope(
+            st.session_state.selected_location,
+            get_week_ranges(st.session_state.selected_location)['week1_start']
         )
         
-        with tab_assigned:
+        # Main tabs; only the open one is rendered, the others are warmed in the background
+        active_tab = lazy_tabs(MAIN_TABS, "main_tab", format_func=MAIN_TABS.get)
+        if PREFETCH_TABS:
+            prefetch_tabs(
+                active_tab,
+                st.session_state.selected_location,
+                st.session_state.selected_employment_type
+            )
+        
+        if active_tab == 'calendar':
             display_assigned_tab(
                 st.session_state.selected_location,
                 st.session_state.selected_employment_type,
                 st.session_state.selected_resource
             )
-        
-        with tab_unassigned:
+        elif active_tab == 'assign':
             display_unassigned_tab(
                 st.session_state.selected_location,
                 st.session_state.selected_employment_type
             )
+        elif active_tab == 'team':
+            display_team_constraints_tab(
+                st.session_state.selected_location,
+                st.session_state.selected_employment_type
+            )
+        elif active_tab == 'violations':
+            display_violations_tab(
+                st.session_state.selected_location,
+                st.session_state.selected_employment_type
+            )
+        elif active_tab == 'templates':
+            display_roster_templates_tab(st.session_state.selected_location)
+        elif active_tab == 'history':
+            display_history_tab(st.session_state.selected_location)
+        
+        sweep_scope()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,48 @@
+"""Stylesheet pipeline: minify and fingerprint styles.css once per process.
+
+The minified sheet is written to static/ under a content-hashed name so it
+can be served by Streamlit's static file serving (server.enableStaticServing)
+and cached by the browser indefinitely; each rerun then only sends a short
+<link> tag. Without static serving the minified text is kept in memory and
+inlined instead, so reruns still skip the file read.
+"""
+import hashlib
+import os
+import re
+
+STATIC_DIR = "static"
+STATIC_URL = "app/static"
+
+
+def minify_css(css):
+    """Drop comments and redundant whitespace (no renaming or rule merging)"""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+def build_stylesheet(source="styles.css", static_dir=STATIC_DIR):
+    """Minified stylesheet plus its fingerprinted static file name and URL"""
+    with open(source, "r", encoding="utf-8", errors="ignore") as f:
+        css = minify_css(f.read())
+    fingerprint = hashlib.sha256(css.encode()).hexdigest()[:12]
+    stem, ext = os.path.splitext(os.path.basename(source))
+    filename = f"{stem}.{fingerprint}{ext}"
+
+    os.makedirs(static_dir, exist_ok=True)
+    path = os.path.join(static_dir, filename)
+    if not os.path.exists(path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(css)
+        # Older fingerprints of this sheet are never referenced again
+        for name in os.listdir(static_dir):
+            if name != filename and name.startswith(f"{stem}.") and name.endswith(ext):
+                os.remove(os.path.join(static_dir, name))
+
+    return {
+        'css': css,
+        'filename': filename,
+        'href': f"{STATIC_URL}/{filename}",
+    }
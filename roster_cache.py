@@ -0,0 +1,430 @@
+"""Bounded, observable result caches for the roster fetchers.
+
+Drop-in replacement for ``st.cache_data`` on the database fetchers: every
+cached function gets a TTL, a maximum entry count and a byte budget, evicts
+least-recently-used entries when either limit is exceeded and keeps hit,
+miss and eviction counters for the metrics panel.
+
+Caches live in this module's registry, keyed by the function's qualified
+name, so they survive Streamlit re-running the app script just like
+``st.cache_data`` does.
+
+When ROSTER_SHARED_CACHE points at a shared backend ("file:///shared/dir"
+or "redis://host:6379/0") the in-process caches become a first tier in
+front of it: replicas read each other's results instead of each querying
+SQL Server, and every key embeds generation counters that ``clear()`` bumps
+in the backend, so an invalidation on one replica is seen by all of them.
+Generations are read through a short local cache (GENERATION_TTL), so a
+lookup that hits the first tier costs no backend round trip and another
+replica's invalidation is seen within that many seconds.
+"""
+import copy
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+from collections import OrderedDict
+from functools import wraps
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Defaults for caches that don't set their own limits
+CACHE_MAX_ENTRIES = int(os.getenv("ROSTER_CACHE_MAX_ENTRIES", "128"))
+CACHE_MAX_BYTES = int(os.getenv("ROSTER_CACHE_MAX_MB", "64")) * 1024 * 1024
+
+# Shared tier: unset keeps every cache process-local
+SHARED_CACHE_URL = os.getenv("ROSTER_SHARED_CACHE", "")
+CACHE_KEY_VERSION = "1"  # bump when the shape of cached values changes
+FILL_WAIT_SECONDS = 5    # how long a replica waits for another one to fill a key
+GENERATION_TTL = float(os.getenv("ROSTER_GENERATION_TTL", "1"))  # seconds a read generation is trusted
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def entry_size(value):
+    """Approximate resident bytes of a cached value"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+class BoundedCache:
+    """LRU cache for one function with a TTL, an entry limit and a byte budget"""
+
+    def __init__(self, name, ttl, max_entries, max_bytes):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.shared_hits = 0
+        self.shared_misses = 0
+
+    def get(self, key):
+        """(True, value) for a live entry, (False, None) otherwise"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] < time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, key, value):
+        size = entry_size(value)
+        expires_at = time.monotonic() + self.ttl if self.ttl else float("inf")
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                # Larger than the whole budget: serve it once, never keep it
+                self.evictions += 1
+                return
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+            elif key in self._entries:
+                self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            sizes = [size for _, size, _ in self._entries.values()]
+            lookups = self.hits + self.misses
+            return {
+                'function': self.name,
+                'entries': len(sizes),
+                'max_entries': self.max_entries,
+                'resident_bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'largest_entry_bytes': max(sizes, default=0),
+                'mean_entry_bytes': int(sum(sizes) / len(sizes)) if sizes else 0,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'shared_hits': self.shared_hits,
+                'shared_misses': self.shared_misses,
+            }
+
+
+class FileBackend:
+    """Shared cache in a directory every replica can reach (local disk or a network share)"""
+
+    MAX_AGE = 2 * 3600  # entries older than this are pruned regardless of TTL
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._writes = 0
+
+    def _path(self, kind, key):
+        return os.path.join(self.directory, f"{kind}-{_digest(key)}")
+
+    def _write(self, path, data):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def get(self, key):
+        try:
+            with open(self._path("entry", key), "rb") as f:
+                expires_at, data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return data if expires_at > time.time() else None
+
+    def set(self, key, data, ttl):
+        expires_at = time.time() + ttl if ttl else float("inf")
+        self._write(self._path("entry", key), pickle.dumps((expires_at, data)))
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune()
+
+    def generations(self, names):
+        tokens = []
+        for name in names:
+            try:
+                with open(self._path("gen", name), "rb") as f:
+                    tokens.append(f.read().decode() or "0")
+            except OSError:
+                tokens.append("0")
+        return tokens
+
+    def bump(self, name):
+        # A fresh unique token is enough: readers only compare for equality
+        token = f"{time.time_ns()}-{os.getpid()}"
+        self._write(self._path("gen", name), token.encode())
+        return token
+
+    def acquire(self, key, seconds):
+        """Token for a new fill lock on key, or None while another replica holds it"""
+        path = self._path("lock", key)
+        try:
+            if time.time() - os.path.getmtime(path) > seconds:
+                os.remove(path)  # stale lock from a replica that died mid-fill
+        except OSError:
+            pass
+        token = uuid.uuid4().hex
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        with os.fdopen(fd, "w") as f:
+            f.write(token)
+        return token
+
+    def release(self, key, token):
+        """Drop the fill lock only if it is still the one token acquired"""
+        path = self._path("lock", key)
+        try:
+            with open(path) as f:
+                if f.read() != token:
+                    return  # expired and taken over by another replica
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _prune(self):
+        cutoff = time.time() - self.MAX_AGE
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.startswith("entry-") and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
+class RedisBackend:
+    """Shared cache in Redis (or anything speaking its protocol)"""
+
+    def __init__(self, url):
+        import redis  # optional dependency, only needed for redis:// URLs
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.client.get(f"roster:entry:{key}")
+
+    def set(self, key, data, ttl):
+        self.client.set(f"roster:entry:{key}", data, ex=ttl or None)
+
+    def generations(self, names):
+        values = self.client.mget([f"roster:gen:{name}" for name in names])
+        return [value.decode() if value else "0" for value in values]
+
+    def bump(self, name):
+        return str(self.client.incr(f"roster:gen:{name}"))
+
+    # Compare-and-delete, so a replica never drops a lock that expired and was taken over
+    RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def acquire(self, key, seconds):
+        token = uuid.uuid4().hex
+        return token if self.client.set(f"roster:lock:{key}", token, nx=True, ex=seconds) else None
+
+    def release(self, key, token):
+        self.client.eval(self.RELEASE, 1, f"roster:lock:{key}", token)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_seen_generations = {}
+_generation_cache = {}  # name -> (token, expires_at)
+MAX_CACHED_GENERATIONS = 10000
+
+
+def shared_backend():
+    """The configured shared backend, or None when caches are process-local"""
+    global _backend
+    if not SHARED_CACHE_URL:
+        return None
+    with _backend_lock:
+        if _backend is None:
+            url = urlparse(SHARED_CACHE_URL)
+            if url.scheme == "file":
+                _backend = FileBackend(url.path)
+            elif url.scheme in ("redis", "rediss"):
+                _backend = RedisBackend(SHARED_CACHE_URL)
+            else:
+                raise ValueError(f"Unsupported ROSTER_SHARED_CACHE: {SHARED_CACHE_URL}")
+            logger.info("Shared roster cache: %s backend at %s", url.scheme, url.hostname or url.path)
+        return _backend
+
+
+def generations(backend, names):
+    """Current generation tokens for names, read from the backend at most once per GENERATION_TTL"""
+    now = time.monotonic()
+    stale = [name for name in names if _generation_cache.get(name, (None, 0))[1] <= now]
+    if stale:
+        if len(_generation_cache) > MAX_CACHED_GENERATIONS:
+            for name in [name for name, (_, expires_at) in list(_generation_cache.items()) if expires_at <= now]:
+                _generation_cache.pop(name, None)
+        for name, token in zip(stale, backend.generations(stale)):
+            _generation_cache[name] = (token, now + GENERATION_TTL)
+    return [_generation_cache[name][0] for name in names]
+
+
+def bump_generation(name):
+    """Broadcast a write: every replica sees a new generation for name"""
+    backend = shared_backend()
+    if backend is not None:
+        token = backend.bump(name)
+        _seen_generations[name] = token
+        _generation_cache[name] = (token, time.monotonic() + GENERATION_TTL)  # this replica sees it at once
+
+
+def changed_elsewhere(name):
+    """True (once) when another replica bumped generation name since this process last looked"""
+    backend = shared_backend()
+    if backend is None:
+        return False
+    generation = generations(backend, [name])[0]
+    seen = _seen_generations.setdefault(name, generation)
+    _seen_generations[name] = generation
+    return seen != generation
+
+
+def _key(args, kwargs):
+    return args + tuple(sorted(kwargs.items()))
+
+
+def _digest(key):
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+def _shared_call(cache, backend, func, args, kwargs):
+    """Look up the local tier, then the shared tier, then fill both (one replica at a time)"""
+    key = _key(args, kwargs)
+    key_digest = _digest(key)
+    function_gen, key_gen = generations(backend, [cache.name, f"{cache.name}:{key_digest}"])
+    local_key = (key, function_gen, key_gen)
+    found, value = cache.get(local_key)
+    if found:
+        return value
+
+    shared_key = f"v{CACHE_KEY_VERSION}:{cache.name}:{function_gen}.{key_gen}:{key_digest}"
+    deadline = time.monotonic() + FILL_WAIT_SECONDS
+    token = None
+    while True:
+        data = backend.get(shared_key)
+        if data is not None:
+            cache.shared_hits += 1
+            value = pickle.loads(data)
+            cache.put(local_key, value)
+            return value
+        token = backend.acquire(shared_key, FILL_WAIT_SECONDS)
+        if token or time.monotonic() > deadline:
+            break  # past the deadline the query runs anyway, without taking the other replica's lock
+        time.sleep(0.1)  # another replica is running the query; wait for its result
+
+    cache.shared_misses += 1
+    try:
+        value = func(*args, **kwargs)
+        backend.set(shared_key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), cache.ttl)
+    finally:
+        if token:
+            backend.release(shared_key, token)
+    cache.put(local_key, value)
+    return value
+
+
+def bounded_cache(ttl=None, max_entries=None, max_bytes=None):
+    """Cache a function's results like st.cache_data, within entry and byte limits.
+
+    Callers get a copy of the cached value so mutating it never corrupts the
+    cache. The wrapper exposes ``clear(*args, **kwargs)`` (one entry, or all
+    entries without arguments) and ``stats()``.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+        with _registry_lock:
+            cache = _registry.get(name)
+            if cache is None:
+                cache = _registry[name] = BoundedCache(
+                    name, ttl,
+                    max_entries or CACHE_MAX_ENTRIES,
+                    max_bytes or CACHE_MAX_BYTES
+                )
+            else:
+                # Script rerun: keep the entries, pick up edited limits
+                cache.ttl = ttl
+                cache.max_entries = max_entries or CACHE_MAX_ENTRIES
+                cache.max_bytes = max_bytes or CACHE_MAX_BYTES
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            backend = shared_backend()
+            if backend is not None:
+                return copy.deepcopy(_shared_call(cache, backend, func, args, kwargs))
+            key = _key(args, kwargs)
+            found, value = cache.get(key)
+            if not found:
+                value = func(*args, **kwargs)
+                cache.put(key, value)
+            return copy.deepcopy(value)
+
+        def clear(*args, **kwargs):
+            if args or kwargs:
+                key = _key(args, kwargs)
+                cache.clear(key)
+                bump_generation(f"{name}:{_digest(key)}")
+            else:
+                cache.clear()
+                bump_generation(name)
+
+        wrapper.clear = clear
+        wrapper.stats = cache.stats
+        return wrapper
+    return decorator
+
+
+def clear_all():
+    """Drop every entry of every bounded cache"""
+    with _registry_lock:
+        caches = list(_registry.values())
+    for cache in caches:
+        cache.clear()
+        bump_generation(cache.name)
+
+
+def cache_metrics():
+    """One row of stats per cached function"""
+    with _registry_lock:
+        caches = list(_registry.values())
+    return pd.DataFrame([cache.stats() for cache in caches])
@@ -0,0 +1,337 @@
+"""Database connection and location matching shared by the app and batch jobs."""
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+
+from roster_trace import TracingConnection
+
+# Database configuration
+DB_SERVER = "0.tcp.ap.ngrok.io"
+DB_PORT = "19125"  # Updated to match current ngrok forwarding port
+
+
+DB_NAME = "RosterManagement"
+DB_USERNAME = "my_user"
+DB_PASSWORD = "!Mynameisapp"
+
+CONNECTION_STRING = (
+    f"DRIVER={{ODBC Driver 17 for SQL Server}};"
+    f"SERVER={DB_SERVER},{DB_PORT};"
+    f"DATABASE={DB_NAME};"
+    f"UID={DB_USERNAME};"
+    f"PWD={DB_PASSWORD};"
+    "Encrypt=no;"
+    "TrustServerCertificate=yes;"
+)
+
+# Appointments starting earlier than this many days ago belong to the archive;
+# live queries never read them
+ACTIVE_WINDOW_DAYS = int(os.getenv("ROSTER_ACTIVE_WINDOW_DAYS", "28"))
+
+# Rosters repeat every fortnight (week 1 and week 2)
+CYCLE_DAYS = 14
+
+# JSONL file that records every statement for trace_replay.py (off when unset)
+TRACE_PATH = os.getenv("ROSTER_TRACE")
+
+# SQLite copy of the roster tables used instead of SQL Server when set
+# (load tests, trace replay, offline development)
+LOCAL_DB = os.getenv("ROSTER_LOCAL_DB")
+
+# T-SQL constructs the app uses that SQLite spells differently
+SQLITE_REWRITES = [
+    (re.compile(r"'%'\s*\+\s*\?\s*\+\s*'%'"), "'%' || ? || '%'"),
+    (re.compile(r"CONVERT\(VARCHAR,\s*([^,]+),\s*120\)", re.I), r"\1"),
+    (re.compile(r"CAST\(([^()]+?) AS DATE\)", re.I), r"DATE(\1)"),
+    (re.compile(r"SYSUTCDATETIME\(\)", re.I), "CURRENT_TIMESTAMP"),
+    (re.compile(r"WITH \((?:UPDLOCK|HOLDLOCK|ROWLOCK|NOLOCK)(?:,\s*\w+)*\)", re.I), ""),  # SQLite locks the whole file
+]
+
+
+def sqlite_sql(sql):
+    """Rewrite an app statement for the SQLite stand-in"""
+    for pattern, replacement in SQLITE_REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+class _LocalCursor(sqlite3.Cursor):
+    def execute(self, sql, *params):
+        # pyodbc style: execute(sql, a, b) as well as execute(sql, (a, b))
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = params[0]
+        return super().execute(sqlite_sql(sql), params)
+
+    def executemany(self, sql, seq_of_params):
+        return super().executemany(sqlite_sql(sql), seq_of_params)
+
+
+class _LocalConnection(sqlite3.Connection):
+    def cursor(self, factory=_LocalCursor):
+        return super().cursor(factory)
+
+
+def local_connection(path):
+    """SQLite stand-in with the pyodbc calling conventions the app relies on"""
+    return sqlite3.connect(path, factory=_LocalConnection, timeout=30, check_same_thread=False)
+
+# Database connection manager
+@contextmanager
+def db_connection():
+    if LOCAL_DB:
+        conn = local_connection(LOCAL_DB)
+    else:
+        import pyodbc  # only needed for SQL Server; the SQLite stand-in runs without ODBC drivers
+        conn = pyodbc.connect(CONNECTION_STRING)
+    if TRACE_PATH:
+        conn = TracingConnection(conn, TRACE_PATH)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+DATETIME = 'datetime64[ns]'
+
+# Rows per batch for bulk extracts; bounds peak memory on organisation-wide reads
+FETCH_BATCH_ROWS = int(os.getenv("ROSTER_FETCH_BATCH_ROWS", "50000"))
+
+
+def _odbc_parameter(value):
+    """arrow-odbc binds parameters as text"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return str(value)
+
+
+def _arrow_batches(query, params, batch_rows):
+    """Record batches from the columnar arrow-odbc driver, or None when it isn't installed"""
+    try:
+        from arrow_odbc import read_arrow_batches_from_odbc  # optional columnar fetch path
+    except ImportError:
+        return None
+    reader = read_arrow_batches_from_odbc(
+        query=query,
+        connection_string=CONNECTION_STRING,
+        batch_size=batch_rows,
+        parameters=[_odbc_parameter(value) for value in params],
+    )
+    empty = reader.schema.empty_table().to_pandas()
+
+    def frames():
+        fetched = False
+        for batch in reader:
+            fetched = True
+            yield batch.to_pandas()
+        if not fetched:
+            yield empty
+    return frames()
+
+
+def _cursor_batches(query, params, batch_rows, dtypes):
+    """fetchmany batches transposed straight into one NumPy array per column"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, list(params))
+        names = [column[0] for column in cursor.description]
+        fetched = False
+        while True:
+            rows = cursor.fetchmany(batch_rows)
+            if not rows and fetched:
+                break
+            fetched = True
+            columns = zip(*rows) if rows else [()] * len(names)
+            yield pd.DataFrame({
+                name: np.array(values, dtype=float if dtypes.get(name) == 'float64' else object)
+                for name, values in zip(names, columns)
+            })
+            if len(rows) < batch_rows:
+                break
+
+
+def read_batches(query, params=(), dtypes=None, batch_rows=FETCH_BATCH_ROWS):
+    """Stream a bulk extract as DataFrames of at most batch_rows rows.
+
+    Uses arrow-odbc when it is installed (and not on the SQLite stand-in),
+    otherwise chunked fetchmany. dtypes maps columns to 'float64' or
+    DATETIME so each batch is compact before the next one is read. Select
+    only the columns you need: every one is materialized.
+    """
+    dtypes = dtypes or {}
+    frames = None if LOCAL_DB else _arrow_batches(query, params, batch_rows)
+    if frames is None:
+        frames = _cursor_batches(query, params, batch_rows, dtypes)
+    for frame in frames:
+        for column, dtype in dtypes.items():
+            if dtype == DATETIME:
+                frame[column] = pd.to_datetime(frame[column])
+            else:
+                frame[column] = frame[column].astype(dtype)
+        yield frame
+
+
+def read_frame(query, params=(), dtypes=None, batch_rows=FETCH_BATCH_ROWS):
+    """Whole bulk extract from read_batches in one DataFrame"""
+    frames = list(read_batches(query, params, dtypes, batch_rows))
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+def read_result_sets(conn, statements):
+    """One DataFrame per (sql, params) statement, fetched in a single round trip.
+
+    On pyodbc the statements go to the server as one batch and each result
+    set is read with nextset(); SQLite connections (the stand-in and the
+    read replica) have no batches, so there they run one after another.
+    """
+    cursor = conn.cursor()
+    if hasattr(cursor, 'nextset'):
+        cursor.execute(
+            ";\n".join(sql.strip().rstrip(';') for sql, _ in statements),
+            [value for _, params in statements for value in params]
+        )
+        results = [cursor] * len(statements)
+    else:
+        results = [conn.cursor().execute(sql, list(params)) for sql, params in statements]
+
+    frames = []
+    for index, result in enumerate(results):
+        if index and result is cursor and not cursor.nextset():
+            raise RuntimeError(f"Expected {len(statements)} result sets, got {index}")
+        names = [column[0] for column in result.description]
+        frames.append(pd.DataFrame.from_records([tuple(row) for row in result.fetchall()], columns=names))
+    return frames
+
+# Special locations mapping
+SPECIAL_LOCATIONS = {
+    "thomas street": "Thomas Street, Wollongong",
+    "albert street": "Albert Street, Erskinville",
+    "cecil street": "Cecil Street, Guildford",
+    "charles street": "Charles Street, Liverpool",
+    "cope street": "Cope Street, Redfern",
+    "copeland street": "Copeland Street, Liverpool",
+    "fisher street": "Fisher Street, Petersham",
+    "goulburn street": "Goulburn Street, Liverpool",
+    "todd street": "Todd Street, Merrylands",
+    "vine street": "Vine Street, Darlington",
+    "89 old south head road": "89 Old South Head Road, Bondi Junction",
+    "united for care": "United For Care",
+    "bell lane": "Bell Lane, Randwick",
+    "bexley": "Bexley",
+    "blacktown": "Blacktown",
+    "cared global pty ltd": "Cared Global Pty Ltd",
+    "castlereagh st": "Castlereagh St"
+}
+
+# Helper function to normalize location names
+def normalize_location(location):
+    if not location:
+        return None
+    loc_lower = location.lower()
+    for key, value in SPECIAL_LOCATIONS.items():
+        if key in loc_lower:
+            return value
+    return location
+
+
+FIRST_ROSTER_START = """
+SELECT MIN(first_start) FROM (
+    SELECT MIN(maica__Scheduled_Start__c) AS first_start
+    FROM NewAppointments
+    WHERE maica__Participant_Location__c LIKE '%' + ? + '%'
+    AND maica__Participants__c LIKE '%Roster%'
+    UNION ALL
+    SELECT MIN(maica__Scheduled_Start__c)
+    FROM NewAppointmentsArchive
+    WHERE maica__Participant_Location__c LIKE '%' + ? + '%'
+    AND maica__Participants__c LIKE '%Roster%'
+) starts
+"""
+
+
+def cycle_anchor(conn, location):
+    """Start of the first cycle of a roster, persisted in RosterCycles (migrations/005).
+
+    A roster read for the first time is anchored on its earliest Roster
+    appointment, live or archived; later calls return the stored date, so
+    archiving old appointments never moves where its weeks begin. None when
+    the roster has no appointments.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT CycleStart FROM RosterCycles WHERE Location = ?", location)
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute(FIRST_ROSTER_START, location, location)
+        first_start = cursor.fetchone()[0]
+        if first_start is None:
+            return None
+        # Sessions anchoring the same roster at once keep whichever date lands first
+        cursor.execute(
+            "INSERT INTO RosterCycles (Location, CycleStart) SELECT ?, ? "
+            "WHERE NOT EXISTS (SELECT 1 FROM RosterCycles WITH (UPDLOCK, HOLDLOCK) WHERE Location = ?)",
+            location, pd.to_datetime(first_start).date().isoformat(), location
+        )
+        conn.commit()
+        cursor.execute("SELECT CycleStart FROM RosterCycles WHERE Location = ?", location)
+        row = cursor.fetchone()
+    return pd.to_datetime(row[0]).date()
+
+
+def cycle_start(anchor, day=None):
+    """Start of the cycle holding day (today by default) when cycles repeat every CYCLE_DAYS from anchor"""
+    day = day or datetime.now().date()
+    if day <= anchor:
+        return anchor
+    return anchor + timedelta(days=CYCLE_DAYS * ((day - anchor).days // CYCLE_DAYS))
+
+
+def current_period(anchor, first_upcoming, last_start):
+    """Week 1/2 date ranges of the live cycle of a roster.
+
+    anchor is the roster's persisted cycle start (cycle_anchor),
+    first_upcoming and last_start the first and last starts from the
+    beginning of the cycle holding today. The live cycle is the one holding today, or the next one
+    with appointments when today's has none, so current shifts stay in range
+    and cycles created ahead of time open once they begin.
+    """
+    if anchor is None:
+        return roster_period(None, None)
+    if first_upcoming is None:
+        week1_start = cycle_start(anchor)
+        return roster_period(week1_start, week1_start + timedelta(days=CYCLE_DAYS - 1))
+    return roster_period(cycle_start(anchor, first_upcoming), last_start)
+
+
+def roster_period(first_start, last_start):
+    """Week 1/2 date ranges of a roster from its cycle start and last appointment start"""
+    if first_start is None:
+        # Default to current week if no appointments found
+        today = datetime.now().date()
+        week1_start = today - timedelta(days=today.weekday())
+        week1_end = week1_start + timedelta(days=6)
+        week2_start = week1_end + timedelta(days=1)
+        week2_end = week2_start + timedelta(days=6)
+    else:
+        # Calculate week ranges based on actual appointment dates
+        week1_start = first_start
+        week1_end = week1_start + timedelta(days=6)
+        week2_start = week1_end + timedelta(days=1)
+        # Use last appointment date as end of week 2, within one fortnight so
+        # cycles created ahead of time don't stretch the current roster
+        week2_end = min(last_start, week1_start + timedelta(days=13))
+    
+    return {
+        'week1_start': week1_start,
+        'week1_end': week1_end,
+        'week2_start': week2_start,
+        'week2_end': week2_end
+    }
+
+
+def active_window_start():
+    """Earliest scheduled start read by live queries (start of the archive cutoff day)"""
+    return datetime.combine(datetime.now().date() - timedelta(days=ACTIVE_WINDOW_DAYS), time.min)
@@ -0,0 +1,188 @@
+"""Roster templates: repeat a location's current cycle for the next cycles.
+
+A template is the current cycle's appointments expressed as offsets from the
+cycle start, together with their assignments. Projecting it forward gives
+the next N cycles; every projected assignment is re-checked with the rule
+engine in one vectorized pass before the rows are bulk inserted in a single
+transaction.
+"""
+import uuid
+
+import pandas as pd
+
+from constraint_rules import evaluate_many
+from hours_counters import adjust as adjust_hours
+from roster_db import CYCLE_DAYS
+
+TEMPLATE_COLUMNS = ['Name', 'Participant', 'Location', 'Resource', 'Offset', 'Length', 'DurationMinutes']
+
+
+def capture_cycle(conn, location, period):
+    """Appointment pattern plus assignments of one roster cycle at a location"""
+    query = """
+    SELECT
+        Name,
+        maica__Participants__c AS Participant,
+        maica__Participant_Location__c AS Location,
+        maica__Resources__c AS Resource,
+        maica__Scheduled_Start__c AS StartDateTime,
+        maica__Scheduled_End__c AS EndDateTime,
+        maica__Scheduled_Duration_Minutes__c AS DurationMinutes
+    FROM NewAppointments
+    WHERE maica__Participant_Location__c LIKE '%' + ? + '%'
+    AND maica__Participants__c LIKE '%Roster%'
+    AND maica__Scheduled_Start__c >= ?
+    AND maica__Scheduled_Start__c < ?
+    """
+    cycle_start = pd.Timestamp(period['week1_start'])
+    df = pd.read_sql(query, conn, params=[
+        location, cycle_start.to_pydatetime(), (cycle_start + pd.Timedelta(days=CYCLE_DAYS)).to_pydatetime()
+    ])
+    if df.empty:
+        return pd.DataFrame(columns=TEMPLATE_COLUMNS)
+
+    starts = pd.to_datetime(df['StartDateTime'])
+    resource = df['Resource'].fillna('').str.split().str.join(' ')
+    df['Resource'] = resource.where((resource != '') & (resource.str.upper() != 'NULL'))
+    df['Offset'] = starts - cycle_start
+    df['Length'] = pd.to_datetime(df['EndDateTime']) - starts
+    return df[TEMPLATE_COLUMNS].sort_values('Offset').reset_index(drop=True)
+
+
+def project(template, cycle_start, cycles):
+    """Template rows placed into each of the next `cycles` cycles after cycle_start"""
+    cycle_start = pd.Timestamp(cycle_start)
+    frames = []
+    for cycle in range(1, cycles + 1):
+        frame = template.copy()
+        frame['Cycle'] = cycle
+        frame['CycleStart'] = cycle_start + pd.Timedelta(days=CYCLE_DAYS * cycle)
+        frame['StartDateTime'] = frame['CycleStart'] + frame['Offset']
+        frame['EndDateTime'] = frame['StartDateTime'] + frame['Length']
+        frame['Week'] = (frame['Offset'] >= pd.Timedelta(days=7)).astype(int) + 1
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def drop_existing(conn, projected, location):
+    """Projected rows minus any appointment already scheduled for the same participant and start"""
+    if projected.empty:
+        return projected
+    query = """
+    SELECT
+        maica__Participants__c AS Participant,
+        maica__Scheduled_Start__c AS StartDateTime
+    FROM NewAppointments
+    WHERE maica__Participant_Location__c LIKE '%' + ? + '%'
+    AND maica__Scheduled_Start__c >= ?
+    AND maica__Scheduled_Start__c <= ?
+    """
+    existing = pd.read_sql(query, conn, params=[
+        location,
+        projected['StartDateTime'].min().to_pydatetime(),
+        projected['StartDateTime'].max().to_pydatetime()
+    ])
+    keys = set(zip(existing['Participant'], pd.to_datetime(existing['StartDateTime'])))
+    duplicate = [key in keys for key in zip(projected['Participant'], projected['StartDateTime'])]
+    return projected[~pd.Series(duplicate, index=projected.index, dtype=bool)]
+
+
+def validate(rules, projected, directory, booked):
+    """Check every projected assignment in one pass, one group per (cycle, worker).
+
+    directory has Resource, employmentType and hoursPerWeek; booked has
+    Resource, WorkDate and Minutes already scheduled anywhere in the projected
+    cycles. Workers with a hard violation in a cycle keep their shifts in that
+    cycle unassigned. Returns (projected rows with Assign/Blocked, findings per
+    (cycle, worker)).
+    """
+    assigned = projected[projected['Resource'].notna()]
+    keys = assigned['Cycle'].astype(str) + '|' + assigned['Resource'].astype(str)
+    shifts = pd.DataFrame({
+        'Resource': keys,
+        'StartDateTime': assigned['StartDateTime'],
+        'EndDateTime': assigned['EndDateTime'],
+        'DurationMinutes': assigned['DurationMinutes'],
+        'Week': assigned['Week'],
+    })
+
+    groups = assigned[['Cycle', 'Resource']].drop_duplicates().reset_index(drop=True)
+    groups = groups.merge(directory, on='Resource', how='left')
+    groups['employmentType'] = groups['employmentType'].fillna('Unknown')
+    groups['hoursPerWeek'] = groups['hoursPerWeek'].fillna(0)
+    groups['Worker'] = groups['Resource']
+    groups['Resource'] = groups['Cycle'].astype(str) + '|' + groups['Worker'].astype(str)
+
+    # Hours the workers already have in the target cycles count as offsite days
+    cycle_starts = projected[['Cycle', 'CycleStart']].drop_duplicates()
+    offsite = booked[booked['Resource'].isin(groups['Worker'])].assign(
+        WorkDate=lambda frame: pd.to_datetime(frame['WorkDate'])
+    )
+    offsite = offsite.merge(cycle_starts, how='cross')
+    days = (offsite['WorkDate'] - offsite['CycleStart']).dt.days
+    offsite = offsite[(days >= 0) & (days < CYCLE_DAYS)].assign(
+        Resource=lambda frame: frame['Cycle'].astype(str) + '|' + frame['Resource'].astype(str),
+        Week=lambda frame: ((frame['WorkDate'] - frame['CycleStart']).dt.days >= 7).astype(int) + 1
+    )
+
+    result = evaluate_many(rules, shifts, groups[['Resource', 'employmentType', 'hoursPerWeek']], offsite)
+    result['Cycle'] = groups['Cycle']
+    result['Worker'] = groups['Worker']
+    blocked = set(zip(
+        result.loc[result['hard_violations'] > 0, 'Cycle'],
+        result.loc[result['hard_violations'] > 0, 'Worker']
+    ))
+
+    projected = projected.copy()
+    projected['Blocked'] = [
+        (cycle, resource) in blocked for cycle, resource in zip(projected['Cycle'], projected['Resource'])
+    ]
+    projected['Assign'] = projected['Resource'].where(~projected['Blocked'])
+    findings = result[result['violations'].str.len() > 0][
+        ['Cycle', 'Worker', 'employmentType', 'total_hours', 'hard_violations', 'violations']
+    ]
+    return projected, findings
+
+
+def insert_projected(conn, projected):
+    """Bulk insert projected appointments (and their hours counters) in one transaction; returns the number of rows"""
+    if projected.empty:
+        return 0
+    rows = [
+        (
+            f"tpl{uuid.uuid4().hex[:15]}",
+            row.Name,
+            row.StartDateTime.to_pydatetime(),
+            row.EndDateTime.to_pydatetime(),
+            row.DurationMinutes,
+            row.Participant,
+            row.Location,
+            row.Assign if isinstance(row.Assign, str) else None,
+        )
+        for row in projected.itertuples(index=False)
+    ]
+    cursor = conn.cursor()
+    cursor.fast_executemany = True
+    try:
+        cursor.executemany(
+            """
+            INSERT INTO NewAppointments (
+                Id, Name, maica__Scheduled_Start__c, maica__Scheduled_End__c,
+                maica__Scheduled_Duration_Minutes__c, maica__Participants__c,
+                maica__Participant_Location__c, maica__Resources__c
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows
+        )
+        # Keep the hours counters in step with the inserted assignments
+        assigned = projected[projected['Assign'].apply(lambda value: isinstance(value, str))]
+        daily = assigned.groupby(
+            [assigned['Assign'], assigned['StartDateTime'].dt.date]
+        )['DurationMinutes'].sum()
+        for (resource, day), minutes in daily.items():
+            adjust_hours(cursor, resource, day, minutes)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(rows)
@@ -0,0 +1,243 @@
+"""Workload trace: record every query issued through db_connection() as JSONL.
+
+Set ROSTER_TRACE to a file path and each connection opened by db_connection()
+is wrapped so that every statement appends one line with its text,
+parameters, timing and result size. Statements keep the connection they ran
+on (session) and their offset from the first traced statement, so
+trace_replay.py can re-issue the same workload with the same shape.
+
+    {"session": "...", "seq": 3, "at": 12.53, "caller": "get_unassigned_appointments",
+     "fingerprint": "3f9c2a1b", "op": "execute", "sql": "...", "params": [...],
+     "ms": 41.2, "rows": 118}
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import date, datetime, time as dtime
+from decimal import Decimal
+
+_write_lock = threading.Lock()
+_epoch = time.time()
+_here = os.path.dirname(os.path.abspath(__file__))
+_skip = {os.path.abspath(__file__), os.path.join(_here, "roster_db.py")}
+
+
+def fingerprint(sql):
+    """Short hash of a statement with whitespace collapsed; one per query type"""
+    return hashlib.sha1(" ".join(sql.split()).encode()).hexdigest()[:8]
+
+
+def encode_param(value):
+    """JSON form of a query parameter that decode_param turns back into the same type"""
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, dtime):
+        return {"$time": value.isoformat()}
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return {"$bytes": value.hex()}
+    if hasattr(value, "item"):  # numpy scalars
+        return value.item()
+    return value
+
+
+def decode_param(value):
+    if isinstance(value, dict):
+        if "$datetime" in value:
+            return datetime.fromisoformat(value["$datetime"])
+        if "$date" in value:
+            return date.fromisoformat(value["$date"])
+        if "$time" in value:
+            return dtime.fromisoformat(value["$time"])
+        if "$bytes" in value:
+            return bytes.fromhex(value["$bytes"])
+    return value
+
+
+def _params(args):
+    """pyodbc accepts execute(sql, a, b) as well as execute(sql, (a, b))"""
+    if len(args) == 1 and isinstance(args[0], (list, tuple)):
+        args = args[0]
+    return [encode_param(value) for value in args]
+
+
+def _caller():
+    """Name of the app function that issued the statement"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        path = os.path.abspath(frame.f_code.co_filename)
+        if path.startswith(_here) and path not in _skip:
+            return frame.f_code.co_name
+        frame = frame.f_back
+    return None
+
+
+class TracingCursor:
+    """pyodbc cursor proxy that times statements and counts fetched rows"""
+
+    def __init__(self, cursor, connection):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_connection", connection)
+        object.__setattr__(self, "_event", None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)  # e.g. fast_executemany
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._count(1)
+            yield row
+
+    def _start(self, op, sql, params):
+        self._flush()
+        object.__setattr__(self, "_event", self._connection.event(op, sql, params))
+        return time.perf_counter()
+
+    def _finish(self, started):
+        event = self._event
+        event["ms"] = round((time.perf_counter() - started) * 1000, 3)
+        event["rows"] = self._cursor.rowcount if self._cursor.rowcount is not None and self._cursor.rowcount >= 0 else 0
+
+    def _count(self, rows):
+        if self._event is not None:
+            self._event["rows"] = (self._event["rows"] if self._event.get("fetched") else 0) + rows
+            self._event["fetched"] = True
+
+    def _flush(self):
+        if self._event is not None:
+            self._event.pop("fetched", None)
+            self._connection.write(self._event)
+            object.__setattr__(self, "_event", None)
+
+    def execute(self, sql, *args):
+        started = self._start("execute", sql, _params(args))
+        try:
+            self._cursor.execute(sql, *args)
+        except Exception as e:
+            self._event["error"] = str(e)
+            raise
+        finally:
+            self._finish(started)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        started = self._start("executemany", sql, [_params((row,)) for row in seq_of_params])
+        try:
+            self._cursor.executemany(sql, seq_of_params)
+        except Exception as e:
+            self._event["error"] = str(e)
+            raise
+        finally:
+            self._finish(started)
+            self._event["rows"] = len(seq_of_params)
+
+    def _timed_fetch(self, fetch, *args):
+        started = time.perf_counter()
+        result = fetch(*args)
+        if self._event is not None:
+            self._event["ms"] += round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+    def fetchone(self):
+        row = self._timed_fetch(self._cursor.fetchone)
+        self._count(0 if row is None else 1)
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._timed_fetch(self._cursor.fetchmany, *args)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._timed_fetch(self._cursor.fetchall)
+        self._count(len(rows))
+        return rows
+
+    def close(self):
+        self._flush()
+        self._cursor.close()
+
+
+class TracingConnection:
+    """pyodbc connection proxy; every cursor it hands out is traced to one JSONL file"""
+
+    def __init__(self, conn, path):
+        self._conn = conn
+        self._path = path
+        self._session = uuid.uuid4().hex[:12]
+        self._seq = 0
+        self._cursors = []
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    @property
+    def autocommit(self):
+        return self._conn.autocommit
+
+    @autocommit.setter
+    def autocommit(self, value):
+        self._conn.autocommit = value
+
+    def event(self, op, sql, params):
+        self._seq += 1
+        return {
+            "session": self._session,
+            "seq": self._seq,
+            "at": round(time.time() - _epoch, 3),
+            "caller": _caller(),
+            "fingerprint": fingerprint(sql),
+            "op": op,
+            "sql": sql,
+            "params": params,
+            "ms": 0.0,
+            "rows": 0,
+        }
+
+    def write(self, event):
+        line = json.dumps(event, default=str)
+        with _write_lock:
+            with open(self._path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def cursor(self):
+        cursor = TracingCursor(self._conn.cursor(), self)
+        self._cursors.append(cursor)
+        return cursor
+
+    def _mark(self, op):
+        for cursor in self._cursors:
+            cursor._flush()
+        self._seq += 1
+        self.write({"session": self._session, "seq": self._seq, "at": round(time.time() - _epoch, 3), "op": op})
+
+    def commit(self):
+        self._conn.commit()
+        self._mark("commit")
+
+    def rollback(self):
+        self._conn.rollback()
+        self._mark("rollback")
+
+    def close(self):
+        for cursor in self._cursors:
+            cursor._flush()
+        self._conn.close()
+
+
+def load_trace(path):
+    """Trace events in file order"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
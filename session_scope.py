@@ -0,0 +1,72 @@
+"""Scoped session state for per-appointment card keys.
+
+Card expansion flags and resource pickers are namespaced by the roster on
+screen (location and period start). Switching roster drops the previous
+roster's keys, and at the end of each full run keys belonging to
+appointments that were not rendered are evicted, so long sessions don't
+accumulate thousands of keys that Streamlit serializes on every rerun.
+"""
+import pickle
+from collections import Counter
+
+import streamlit as st
+
+_SCOPE = "_scope"          # (location, period start) currently on screen
+_SCOPED_KEYS = "_scope_keys"  # scoped key -> appointment id (None for roster-wide keys)
+_RENDERED = "_scope_rendered"  # appointment ids rendered in this run
+
+
+def enter_scope(location, period_start):
+    """Start a run for one roster; drops every key of the previous roster"""
+    state = st.session_state
+    scope = f"{location}|{period_start:%Y-%m-%d}"
+    if state.get(_SCOPE) != scope:
+        for key in state.get(_SCOPED_KEYS, {}):
+            state.pop(key, None)
+        state[_SCOPE] = scope
+        state[_SCOPED_KEYS] = {}
+    state[_RENDERED] = set()
+
+
+def scoped_key(kind, appointment_id=None, week_num=None):
+    """Session key for one card (or roster-wide when appointment_id is None) in the current scope"""
+    state = st.session_state
+    key = kind
+    if appointment_id is not None:
+        key += f"_{appointment_id}"
+        state.setdefault(_RENDERED, set()).add(appointment_id)
+    if week_num is not None:
+        key += f"_w{week_num}"
+    key += f"@{state.get(_SCOPE, '')}"
+    state.setdefault(_SCOPED_KEYS, {})[key] = appointment_id
+    return key
+
+
+def sweep_scope():
+    """Evict keys of appointments that were not rendered in this run"""
+    state = st.session_state
+    rendered = state.get(_RENDERED, set())
+    scoped = state.get(_SCOPED_KEYS, {})
+    for key in [key for key, appointment_id in scoped.items()
+                if appointment_id is not None and appointment_id not in rendered]:
+        state.pop(key, None)
+        del scoped[key]
+
+
+def session_state_report():
+    """Key counts and approximate pickled bytes of the session state"""
+    sizes = {}
+    for key in list(st.session_state.keys()):
+        try:
+            sizes[key] = len(pickle.dumps(st.session_state[key]))
+        except Exception:
+            sizes[key] = 0
+    scoped = st.session_state.get(_SCOPED_KEYS, {})
+    kinds = Counter(key.split("_")[0] if key in scoped else "other" for key in sizes)
+    return {
+        'keys': len(sizes),
+        'scoped_keys': sum(1 for key in sizes if key in scoped),
+        'bytes': sum(sizes.values()),
+        'largest': sorted(sizes.items(), key=lambda item: item[1], reverse=True)[:5],
+        'by_kind': dict(kinds),
+    }
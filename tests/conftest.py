@@ -0,0 +1,58 @@
+"""Shared fixtures: the app's modules live at the repository root."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from constraint_rules import compile_rules  # noqa: E402
+
+# Same shape as roster_rules.toml, pinned here so the tests do not follow config edits
+RULES = {
+    "rules": [
+        {"id": "min_gap", "metric": "min_gap_hours", "limit": 10, "severity": "hard",
+         "message": "Minimum {limit:g}h required between shifts ({value:.1f}h)"},
+        {"id": "consecutive_days", "metric": "consecutive_days", "limit": 5, "severity": "hard",
+         "message": "{value:.0f} consecutive days (max {limit:g} allowed)"},
+        {"id": "week_cap", "metric": "week_hours", "limit": 38, "severity": "hard",
+         "employment_types": ["Full Time", "Part Time", "Casual"],
+         "message": "Week {week} hours exceed maximum {limit:g}h ({value:.1f}h)"},
+        {"id": "fortnight_cap", "metric": "total_hours", "limit": 76, "severity": "hard",
+         "employment_types": ["Full Time", "Casual"],
+         "message": "Total hours exceed {limit:g}h ({value:.1f}h)"},
+        {"id": "contracted_fortnight", "metric": "total_hours", "limit": "contracted", "factor": 2,
+         "severity": "hard", "employment_types": ["Part Time"],
+         "message": "Total hours exceed contracted {limit:g}h ({value:.1f}h)"},
+        {"id": "contracted_week", "metric": "week_hours", "limit": "contracted", "severity": "soft",
+         "employment_types": ["Part Time"],
+         "message": "Week {week} hours exceed contracted {limit:g}h ({value:.1f}h)"},
+    ]
+}
+
+
+@pytest.fixture(scope="session")
+def rules():
+    return compile_rules(RULES)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """roster_app on an empty SQLite stand-in (load_test.FIXTURE_SCHEMA) with fresh caches and session state"""
+    import streamlit as st
+
+    import roster_db
+    from load_test import FIXTURE_SCHEMA
+    from roster_cache import clear_all
+
+    path = str(tmp_path / "roster.db")
+    conn = roster_db.local_connection(path)
+    conn.executescript(FIXTURE_SCHEMA)
+    conn.close()
+    monkeypatch.setattr(roster_db, "LOCAL_DB", path)
+
+    import roster_app
+    clear_all()
+    st.cache_resource.clear()
+    st.session_state.clear()
+    return roster_app
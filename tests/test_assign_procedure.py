@@ -0,0 +1,115 @@
+"""Assigning through usp_AssignResource: the in-memory rules run before the procedure writes."""
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from roster_db import local_connection
+
+# The fortnight starting Monday last week, so it is the live cycle
+CYCLE_START = date.today() - timedelta(days=date.today().weekday() + 7)
+LOCATION = "House"
+
+
+def start_of(day, hour):
+    return datetime.combine(CYCLE_START + timedelta(days=day), time(hour))
+
+
+def appointment(appointment_id, day, location, participant, resource=None):
+    return (
+        appointment_id, appointment_id, str(start_of(day, 7)), str(start_of(day, 13)), 360.0,
+        participant, location, resource,
+    )
+
+
+@pytest.fixture
+def roster(app):
+    """Six hour shifts at 07:00 on every day of the cycle; Ann already works days 0-4"""
+    from roster_db import LOCAL_DB
+
+    conn = local_connection(LOCAL_DB)
+    conn.executemany("INSERT INTO Resources VALUES (?, ?, ?, ?, ?, ?, ?)", [
+        ("R1", "Ann Lee", "Full Time", 38.0, LOCATION, "Active", "Support Worker"),
+        ("R2", "Bo Chen", "Full Time", 38.0, LOCATION, "Active", "Support Worker"),
+    ])
+    conn.executemany("INSERT INTO NewAppointments VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+        appointment(f"D{day}", day, LOCATION, f"Roster {LOCATION}", "Ann Lee" if day < 5 else None)
+        for day in range(14)
+    ] + [appointment("V8", 8, "Outreach Centre", "Client visit")])
+    conn.executemany(
+        "INSERT INTO ResourceDailyHours VALUES (?, ?, ?)",
+        [("Ann Lee", str(CYCLE_START + timedelta(days=day)), 360.0) for day in range(5)]
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def procedure(app, roster, monkeypatch):
+    """Stands in for usp_AssignResource: records each call and assigns unless told to reject"""
+    calls = []
+    rejections = []
+
+    def assign_with_procedure(appointment_id, resource_name, location):
+        calls.append((appointment_id, resource_name, location))
+        if rejections:
+            return False, rejections, None
+        roster.execute(
+            "UPDATE NewAppointments SET maica__Resources__c = ? WHERE Id = ?", (resource_name, appointment_id)
+        )
+        roster.commit()
+        return True, [], None
+
+    monkeypatch.setattr(app, "ASSIGN_PROCEDURE", True)
+    monkeypatch.setattr(app, "assign_with_procedure", assign_with_procedure)
+    return calls, rejections
+
+
+@pytest.fixture
+def errors(app, monkeypatch):
+    shown = []
+    monkeypatch.setattr(app.st, "error", shown.append)
+    return shown
+
+
+def assigned(conn, appointment_id):
+    return conn.execute("SELECT maica__Resources__c FROM NewAppointments WHERE Id = ?", (appointment_id,)).fetchone()[0]
+
+
+def test_a_hard_violation_never_reaches_the_procedure(app, roster, procedure, errors):
+    calls, _ = procedure
+    assert not app.assign_resource_to_appointment("D5", "Ann Lee")
+    assert calls == []
+    assert len(errors) == 1 and errors[0].startswith("❌ Cannot assign - Full Time")
+    assert assigned(roster, "D5") is None
+
+
+def test_valid_assignments_are_written_by_the_procedure(app, roster, procedure, errors):
+    calls, _ = procedure
+    assert app.assign_resource_to_appointment("D8", "Bo  Chen")
+    assert calls == [("D8", "Bo Chen", LOCATION)]
+    assert errors == []
+    assert assigned(roster, "D8") == "Bo Chen"
+    cycle = (CYCLE_START, CYCLE_START + timedelta(days=13))
+    assert app.get_hours_ledger().day_minutes("Bo Chen", *cycle) == {CYCLE_START + timedelta(days=8): 360.0}
+
+
+def test_the_procedure_runs_at_the_appointments_own_location(app, roster, procedure, errors):
+    calls, _ = procedure
+    assert app.assign_resource_to_appointment("V8", "Bo Chen")
+    assert calls == [("V8", "Bo Chen", "Outreach Centre")]
+    assert errors == []
+
+
+def test_a_procedure_rejection_is_reported_and_not_recorded(app, roster, procedure, errors):
+    calls, rejections = procedure
+    rejections.append({'rule': 'min_gap', 'message': "Minimum 10h required between shifts (2.0h)",
+                       'value': 2.0, 'limit': 10.0})
+    ledger = app.get_hours_ledger()
+    cycle = (CYCLE_START, CYCLE_START + timedelta(days=13))
+    assert not app.assign_resource_to_appointment("D8", "Bo Chen")
+    assert len(calls) == 1
+    assert errors == [
+        "❌ Assignment Failed: Minimum 10h required between shifts (2.0h). The roster changed since it was checked."
+    ]
+    assert ledger.day_minutes("Bo Chen", *cycle) == {}
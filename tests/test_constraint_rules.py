@@ -0,0 +1,106 @@
+"""Rule engine: compiled rules, vectorized metrics and the single-resource evaluate path."""
+import random
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from constraint_rules import HARD, SOFT, compile_rules, compute_metrics, evaluate, evaluate_many
+
+PERIOD_START = date(2026, 10, 12)
+EMPLOYMENT = [("Full Time", 38.0), ("Part Time", 20.0), ("Casual", None)]
+
+
+def shift(day, hour, hours):
+    start = datetime.combine(PERIOD_START + timedelta(days=day), datetime.min.time()) + timedelta(hours=hour)
+    return start, start + timedelta(hours=hours), hours * 60
+
+
+def details(*shifts):
+    return [
+        {'StartDateTime': start, 'EndDateTime': end, 'DurationMinutes': minutes, 'Week': week}
+        for (start, end, minutes), week in shifts
+    ]
+
+
+def test_compile_rules_rejects_bad_definitions():
+    for rule in (
+        {"metric": "weekly_hours", "limit": 1},
+        {"metric": "week_hours", "limit": 1, "op": "=="},
+        {"metric": "week_hours", "limit": 1, "severity": "fatal"},
+        {"metric": "week_hours", "limit": "lots"},
+    ):
+        with pytest.raises(ValueError):
+            compile_rules({"rules": [rule]})
+
+
+def test_compute_metrics_groups_are_independent():
+    starts = [shift(0, 8, 8)[0], shift(0, 20, 8)[0], shift(1, 8, 8)[0]]
+    ends = [shift(0, 8, 8)[1], shift(0, 20, 8)[1], shift(1, 8, 8)[1]]
+    metrics = compute_metrics([0, 0, 1], starts, ends, [480, 480, 480], [1, 1, 1], 3)
+
+    assert list(metrics['week1_hours']) == [16, 8, 0]
+    assert metrics['min_gap_hours'][0] == 4
+    assert list(metrics['max_consecutive_days']) == [1, 1, 0]
+    assert all(value != value for value in metrics['min_gap_hours'][1:])  # NaN: no neighbouring shift
+
+
+def test_candidate_overlapping_a_shift_is_a_negative_gap(rules):
+    start, end, minutes = shift(0, 8, 8)
+    details = [{'StartDateTime': start, 'EndDateTime': end, 'DurationMinutes': minutes, 'Week': 1}]
+    candidate = shift(0, 12, 8) + (1,)
+
+    result = evaluate(rules, details, "Full Time", 38.0, candidate)
+    assert result['min_hours_between_shifts'] == "-4.0"
+    assert result['hard_violation']
+
+
+def test_candidate_run_stays_in_its_week(rules):
+    roster = details(*[(shift(day, 8, 4), 1) for day in range(2, 7)])
+
+    # Week 2 starts a new run even though week 1 ends with five worked days
+    assert evaluate(rules, roster, "Full Time", 38.0, shift(7, 8, 4) + (2,))['max_consecutive_days'] == 1
+    result = evaluate(rules, roster, "Full Time", 38.0, shift(1, 8, 4) + (1,))
+    assert result['max_consecutive_days'] == 6
+    assert [v['rule'] for v in result['violations']] == ['consecutive_days']
+
+
+def test_candidate_only_reports_its_own_week(rules):
+    roster = details(*[(shift(day, 8, 10), 1) for day in range(0, 8, 2)])  # 40h in week 1
+
+    result = evaluate(rules, roster, "Full Time", 38.0, shift(9, 8, 8) + (2,))
+    assert result['violations'] == []
+    assert evaluate(rules, roster, "Full Time", 38.0)['hard_violation']
+
+
+def test_soft_finding_is_dropped_when_the_field_breaks_a_hard_rule(rules):
+    roster = details(*[(shift(day, 8, 10), 1) for day in range(0, 8, 2)])  # 40h in week 1
+
+    fields = [(v['rule'], v['severity']) for v in evaluate(rules, roster, "Part Time", 20.0)['violations']]
+    assert ('week_cap', HARD) in fields
+    assert ('contracted_week', SOFT) not in fields
+
+
+def test_evaluate_many_matches_evaluate_per_resource(rules):
+    rng = random.Random(3)
+    rows, directory, details = [], [], {}
+    for worker in range(20):
+        name = f"Worker {worker}"
+        employment_type, contracted = EMPLOYMENT[worker % len(EMPLOYMENT)]
+        directory.append({'Resource': name, 'employmentType': employment_type, 'hoursPerWeek': contracted})
+        details[name] = []
+        for _ in range(rng.randint(0, 10)):
+            day = rng.randrange(14)
+            start, end, minutes = shift(day, rng.randrange(24), rng.randint(4, 10))
+            record = {
+                'StartDateTime': start, 'EndDateTime': end, 'DurationMinutes': minutes, 'Week': 1 if day < 7 else 2
+            }
+            details[name].append(record)
+            rows.append(dict(record, Resource=name))
+
+    result = evaluate_many(rules, pd.DataFrame(rows), pd.DataFrame(directory))
+    for row in result.itertuples():
+        single = evaluate(rules, details[row.Resource], row.employmentType, row.hoursPerWeek)
+        assert row.findings == single['violations']
+        assert row.total_hours == pytest.approx(single['total_hours'])
+        assert row.max_consecutive_days == single['max_consecutive_days']
@@ -0,0 +1,216 @@
+"""The incremental ConstraintState must agree with the vectorized rule engine."""
+import random
+import threading
+from datetime import date, datetime, timedelta
+
+from constraint_rules import HARD, SOFT, evaluate
+from constraint_state import ConstraintState, MinMultiset, longest_run
+
+PERIOD_START = date(2026, 10, 12)
+PERIOD_END = PERIOD_START + timedelta(days=13)
+EMPLOYMENT = [("Full Time", 38.0), ("Part Time", 20.0), ("Casual", None)]
+
+
+def shift(day, hour, hours, minute=0):
+    start = datetime.combine(PERIOD_START + timedelta(days=day), datetime.min.time())
+    start += timedelta(hours=hour, minutes=minute)
+    return start, start + timedelta(hours=hours), hours * 60
+
+
+def new_state(employment_type="Full Time", contracted=38.0):
+    return ConstraintState("House", PERIOD_START, PERIOD_END, employment_type, contracted)
+
+
+def comparable(summary):
+    return {key: value for key, value in summary.items() if key != 'shift_details'}
+
+
+def vectorized(state, rules, offsite=()):
+    shift_details = state.summary(rules, offsite)['shift_details']
+    return evaluate(rules, shift_details, state.employment_type, state.contracted_hours, offsite=list(offsite))
+
+
+def test_random_rosters_match_vectorized_path(rules):
+    rng = random.Random(7)
+    for roster in range(300):
+        employment_type, contracted = EMPLOYMENT[roster % len(EMPLOYMENT)]
+        state = new_state(employment_type, contracted)
+        ids = []
+        for n in range(rng.randint(0, 14)):
+            day, hour, minute = rng.randrange(14), rng.randrange(24), rng.choice((0, 30))
+            start, end, minutes = shift(day, hour, rng.randint(2, 12), minute)
+            state.add(f"A{n}", start, end, minutes)
+            ids.append(f"A{n}")
+        for appointment_id in rng.sample(ids, k=len(ids) // 3):
+            state.remove(appointment_id)
+        offsite = tuple(
+            (PERIOD_START + timedelta(days=day), rng.choice((240, 480)), 1 if day < 7 else 2)
+            for day in sorted(rng.sample(range(14), k=rng.randint(0, 4)))
+        )
+
+        assert comparable(state.summary(rules, offsite)) == comparable(vectorized(state, rules, offsite))
+
+
+def test_empty_roster(rules):
+    state = new_state()
+    summary = state.summary(rules)
+
+    assert comparable(summary) == comparable(evaluate(rules, [], "Full Time", 38.0))
+    assert summary['total_hours'] == 0
+    assert summary['max_consecutive_days'] == 0
+    assert summary['min_hours_between_shifts'] == 'N/A'
+    assert summary['violations'] == []
+
+
+def test_overlapping_shifts_give_a_negative_gap(rules):
+    state = new_state()
+    state.add("A1", *shift(0, 8, 8))
+    state.add("A2", *shift(0, 14, 4))
+    summary = state.summary(rules)
+
+    assert comparable(summary) == comparable(vectorized(state, rules))
+    assert summary['min_hours_between_shifts'] == "-2.0"
+    assert summary['gap_violation']
+    assert [v['rule'] for v in summary['violations']] == ['min_gap']
+
+
+def test_part_time_contracted_caps(rules):
+    state = new_state("Part Time", 20.0)
+    for day in range(3):
+        state.add(f"W1-{day}", *shift(day * 2, 8, 8))
+    summary = state.summary(rules)
+
+    # 24h in week 1: over the contracted week (soft) but within the 40h fortnight
+    assert comparable(summary) == comparable(vectorized(state, rules))
+    assert [(v['rule'], v['severity'], v['week']) for v in summary['violations']] == [('contracted_week', SOFT, 1)]
+    assert not summary['hard_violation']
+
+    for day in range(3):
+        state.add(f"W2-{day}", *shift(7 + day * 2, 8, 8))
+    summary = state.summary(rules)
+
+    assert comparable(summary) == comparable(vectorized(state, rules))
+    assert summary['total_hours'] == 48
+    assert summary['limits']['total_hours'] == 40
+    assert ('contracted_fortnight', HARD) in [(v['rule'], v['severity']) for v in summary['violations']]
+    assert summary['hard_violation']
+
+
+def test_part_time_without_contracted_hours_skips_contracted_rules(rules):
+    state = new_state("Part Time", None)
+    for day in range(6):
+        state.add(f"A{day}", *shift(day * 2, 8, 8))
+
+    summary = state.summary(rules)
+    assert comparable(summary) == comparable(vectorized(state, rules))
+    assert not [v for v in summary['violations'] if v['rule'].startswith('contracted')]
+
+
+def test_runs_do_not_cross_the_week_boundary(rules):
+    state = new_state()
+    for day in range(3, 10):  # Thursday of week 1 to Wednesday of week 2
+        state.add(f"A{day}", *shift(day, 8, 4))
+    summary = state.summary(rules)
+
+    assert comparable(summary) == comparable(vectorized(state, rules))
+    assert summary['max_consecutive_days'] == 4
+    assert not any(v['rule'] == 'consecutive_days' for v in summary['violations'])
+
+
+def test_offsite_days_extend_runs_within_a_week(rules):
+    state = new_state()
+    for day in (0, 1, 3, 4):
+        state.add(f"A{day}", *shift(day, 8, 4))
+    offsite = ((PERIOD_START + timedelta(days=2), 240, 1), (PERIOD_START + timedelta(days=5), 240, 1))
+    summary = state.summary(rules, offsite)
+
+    assert comparable(summary) == comparable(vectorized(state, rules, offsite))
+    assert summary['max_consecutive_days'] == 6
+    assert summary['offsite_hours'] == 8
+    assert 'consecutive_days' in [v['rule'] for v in summary['violations']]
+
+
+def test_summary_is_recomputed_after_changes(rules):
+    state = new_state()
+    state.add("A1", *shift(0, 8, 8))
+    first = state.summary(rules)
+    assert state.summary(rules) is first
+
+    state.add("A2", *shift(1, 8, 8))
+    assert state.summary(rules)['total_hours'] == 16
+    state.remove("A2")
+    assert state.summary(rules)['total_hours'] == 8
+    assert state.summary(rules, ((PERIOD_START, 60, 1),))['total_hours'] == 9
+
+
+def test_add_rejects_duplicates_and_shifts_outside_the_period():
+    state = new_state()
+    assert state.add("A1", *shift(0, 8, 8))
+    assert not state.add("A1", *shift(1, 8, 8))
+    assert not state.add("A2", *shift(14, 8, 8))
+    assert not state.remove("A2")
+    assert len(state) == 1
+
+
+def test_copy_is_independent_of_the_shared_state(rules):
+    state = new_state()
+    state.add("A1", *shift(0, 8, 8))
+    copied = state.copy()
+    copied.add("A2", *shift(1, 8, 8))
+
+    assert len(state) == 1
+    assert state.summary(rules)['total_hours'] == 8
+    assert copied.summary(rules)['total_hours'] == 16
+
+
+def test_summaries_read_during_updates_are_never_half_applied(rules):
+    state = new_state()
+    shifts = [shift(day, 8, 4) for day in range(14)]
+    done = threading.Event()
+    seen, errors = [], []
+
+    def reader():
+        try:
+            while not done.is_set():
+                summary = state.summary(rules)
+                seen.append((summary['total_hours'], len(summary['shift_details'])))
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    for _ in range(50):
+        for n, (start, end, minutes) in enumerate(shifts):
+            state.add(f"A{n}", start, end, minutes)
+        for n in range(len(shifts)):
+            state.remove(f"A{n}")
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    # Every summary's hours agree with the shifts it lists (4h each)
+    assert errors == []
+    assert all(hours == count * 4 for hours, count in seen)
+
+
+def test_min_multiset_tracks_the_minimum():
+    rng = random.Random(11)
+    multiset, values = MinMultiset(), []
+    for _ in range(2000):
+        if values and rng.random() < 0.4:
+            value = rng.choice(values)
+            values.remove(value)
+            multiset.remove(value)
+        else:
+            value = rng.randint(-50, 50)
+            values.append(value)
+            multiset.add(value)
+        assert multiset.min() == (min(values) if values else None)
+
+
+def test_longest_run():
+    assert longest_run(0) == 0
+    assert longest_run(0b1) == 1
+    assert longest_run(0b1110111) == 3
+    assert longest_run(0b1111100000011) == 5
@@ -0,0 +1,60 @@
+"""Maintained hours counters on the SQLite stand-in, and the caps checked against them."""
+from datetime import date, timedelta
+
+import pytest
+
+from hours_counters import adjust, cap_breach, hour_caps, period_hours
+from roster_db import local_connection
+
+WEEK1_START = date(2026, 10, 12)
+WEEK_RANGES = {
+    'week1_start': WEEK1_START,
+    'week1_end': WEEK1_START + timedelta(days=6),
+    'week2_start': WEEK1_START + timedelta(days=7),
+    'week2_end': WEEK1_START + timedelta(days=13),
+}
+
+
+@pytest.fixture
+def cursor(tmp_path):
+    conn = local_connection(str(tmp_path / "roster.db"))
+    conn.execute(
+        "CREATE TABLE ResourceDailyHours ("
+        "Resource TEXT NOT NULL, WorkDate TEXT NOT NULL, Minutes REAL NOT NULL, PRIMARY KEY (Resource, WorkDate))"
+    )
+    yield conn.cursor()
+    conn.close()
+
+
+def test_adjust_adds_and_removes_minutes_per_day(cursor):
+    adjust(cursor, "Ann Lee", WEEK1_START, 480)
+    adjust(cursor, "Ann Lee", WEEK1_START, 240)
+    adjust(cursor, "Ann Lee", WEEK1_START + timedelta(days=8), 300)
+    assert period_hours(cursor, "Ann Lee", WEEK_RANGES) == [12.0, 5.0]
+
+    adjust(cursor, "Ann Lee", WEEK1_START, -720)
+    assert period_hours(cursor, "Ann Lee", WEEK_RANGES, lock=True) == [0.0, 5.0]
+
+
+def test_period_hours_only_counts_the_period_and_the_resource(cursor):
+    adjust(cursor, "Ann Lee", WEEK1_START - timedelta(days=1), 480)
+    adjust(cursor, "Ann Lee", WEEK1_START + timedelta(days=14), 480)
+    adjust(cursor, "Bo Chen", WEEK1_START, 480)
+    assert period_hours(cursor, "Ann Lee", WEEK_RANGES) == [0.0, 0.0]
+    assert period_hours(cursor, "Bo Chen", WEEK_RANGES) == [8.0, 0.0]
+
+
+def test_hour_caps_take_the_tightest_hard_limit(rules):
+    assert hour_caps(rules, "Full Time", 38.0) == {'week_hours': 38.0, 'total_hours': 76.0}
+    assert hour_caps(rules, "Part Time", 20.0) == {'week_hours': 38.0, 'total_hours': 40.0}
+    # Without contracted hours only the fixed caps apply
+    assert hour_caps(rules, "Part Time", None) == {'week_hours': 38.0}
+    assert hour_caps(rules, "Unknown", 38.0) == {}
+
+
+def test_cap_breach_reports_the_first_cap_broken():
+    caps = {'week_hours': 38.0, 'total_hours': 40.0}
+    assert cap_breach(caps, [30.0, 0.0], 1, 8.0) is None
+    assert cap_breach(caps, [30.0, 0.0], 1, 8.5) == "Week 1 hours would be 38.5h (max 38h)"
+    assert cap_breach(caps, [30.0, 8.0], 2, 4.0) == "Total hours would be 42.0h (max 40h)"
+    assert cap_breach({}, [100.0, 100.0], 2, 8.0) is None
@@ -0,0 +1,80 @@
+"""HoursLedger: organisation-wide minutes per resource per day."""
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from constraint_state import ConstraintState
+from hours_ledger import HoursLedger
+
+PERIOD_START = date(2026, 10, 12)
+
+
+def day(offset):
+    return PERIOD_START + timedelta(days=offset)
+
+
+def ledger(rows):
+    return HoursLedger(pd.DataFrame(rows, columns=['Resource', 'WorkDate', 'Minutes']))
+
+
+def test_names_differing_by_whitespace_share_one_key():
+    hours = ledger([
+        ("Ann  Lee", "2026-10-12", 240),
+        (" Ann Lee", "2026-10-12", 120),
+        ("Bo Chen", "2026-10-13", None),
+    ])
+
+    assert len(hours) == 2
+    assert hours.day_minutes("Ann Lee", day(0), day(13)) == {day(0): 360}
+    assert hours.day_minutes("Bo Chen", day(0), day(13)) == {day(1): 0}
+
+
+def test_add_and_remove_minutes():
+    hours = ledger([])
+    hours.add("Ann Lee", day(0), 480)
+    hours.add("Ann Lee", day(0), 240)
+    hours.add("Ann Lee", day(1), 480)
+    assert hours.day_minutes("Ann Lee", day(0), day(13)) == {day(0): 720, day(1): 480}
+
+    # A day drops out once an unassign takes it back to zero
+    hours.add("Ann Lee", day(1), -480)
+    assert hours.day_minutes("Ann Lee", day(0), day(13)) == {day(0): 720}
+    assert hours.day_minutes("Ann Lee", day(1), day(13)) == {}
+    assert hours.day_minutes("Nobody", day(0), day(13)) == {}
+
+
+def test_offsite_is_what_the_location_does_not_account_for():
+    hours = ledger([
+        ("Ann Lee", day(0), 480),    # all at this location
+        ("Ann Lee", day(1), 720),    # 8h here, 4h elsewhere
+        ("Ann Lee", day(8), 300),    # elsewhere only, week 2
+        ("Ann Lee", day(14), 480),   # after the period
+        ("Ann Lee", day(-1), 480),   # before the period
+    ])
+    state = ConstraintState("House", day(0), day(13), "Full Time", 38.0)
+    for offset in (0, 1):
+        start = datetime.combine(day(offset), datetime.min.time()) + timedelta(hours=8)
+        state.add(f"A{offset}", start, start + timedelta(hours=8), 480)
+
+    assert hours.offsite("Ann Lee", state) == [(day(1), 240, 1), (day(8), 300, 2)]
+
+
+def test_offsite_applies_staged_adjustments():
+    hours = ledger([("Ann Lee", day(2), 480), ("Ann Lee", day(3), 480)])
+    state = ConstraintState("House", day(0), day(13), "Full Time", 38.0)
+
+    adjustments = {day(2): -480, day(4): 240, day(20): 480}
+    assert hours.offsite("Ann Lee", state, adjustments) == [(day(3), 480, 1), (day(4), 240, 1)]
+
+
+def test_frame_filters_resources_and_dates():
+    hours = ledger([
+        ("Ann Lee", day(0), 480),
+        ("Ann Lee", day(9), 480),
+        ("Bo Chen", day(3), 240),
+        ("Cy Diaz", day(3), 240),
+    ])
+
+    frame = hours.frame(["Ann Lee", "Bo Chen", "Nobody"], day(0), day(6))
+    assert list(frame.columns) == ['Resource', 'WorkDate', 'Minutes']
+    assert sorted(frame.itertuples(index=False, name=None)) == [("Ann Lee", day(0), 480), ("Bo Chen", day(3), 240)]
@@ -0,0 +1,67 @@
+"""ResourceIndex: trigram and prefix ranking with location and employment type facets."""
+import pandas as pd
+import pytest
+
+from resource_search import ResourceIndex, normalize, trigrams
+
+
+@pytest.fixture(scope="module")
+def index():
+    return ResourceIndex(pd.DataFrame([
+        ("Ann Lee", "Bexley", "Full Time"),
+        ("Annabel Moss", "Bexley", "Casual"),
+        ("Joanne Smith", "Blacktown", "Part Time"),
+        ("Bo Chen", "Blacktown", "Casual"),
+        ("Leeanne O'Brien", None, None),
+        ("Ann Lee", "Bexley", "Full Time"),  # duplicate row
+    ], columns=['resource_name', 'primaryLocation', 'employmentType']))
+
+
+def test_normalize_and_trigrams():
+    assert normalize("  O'Brien,  Leeanne ") == "o brien leeanne"
+    assert trigrams("bo") == {"  b", " bo", "bo "}
+    assert trigrams("") == set()
+
+
+def test_empty_query_lists_names_alphabetically(index):
+    assert index.search("") == ["Ann Lee", "Annabel Moss", "Bo Chen", "Joanne Smith", "Leeanne O'Brien"]
+    assert index.search("  ", limit=2) == ["Ann Lee", "Annabel Moss"]
+
+
+def test_word_prefixes_rank_before_infix_matches(index):
+    results = index.search("ann")
+    assert results[:2] == ["Ann Lee", "Annabel Moss"]
+    assert set(results[2:]) <= {"Joanne Smith", "Leeanne O'Brien"}
+
+
+def test_full_name_ranks_first(index):
+    assert index.search("ann lee")[0] == "Ann Lee"
+    assert index.search("LEE, Ann")[0] == "Ann Lee"
+
+
+def test_misspellings_still_match(index):
+    assert index.search("joane smith")[0] == "Joanne Smith"
+    assert index.search("annabell")[0] == "Annabel Moss"
+
+
+def test_unrelated_text_matches_nothing(index):
+    assert index.search("xyz") == []
+
+
+def test_facets_filter_results(index):
+    assert index.search("ann", location="Bexley") == ["Ann Lee", "Annabel Moss"]
+    assert index.search("ann", location="Bexley", employment_type="Casual") == ["Annabel Moss"]
+    assert index.search("", employment_type="Casual") == ["Annabel Moss", "Bo Chen"]
+    assert index.search("ann", location="Nowhere") == []
+
+
+def test_missing_facets_are_unknown(index):
+    assert index.locations == ["Bexley", "Blacktown", "Unknown"]
+    assert index.search("", location="Unknown") == ["Leeanne O'Brien"]
+    assert index.label("Leeanne O'Brien") == "Leeanne O'Brien (Unknown, Unknown)"
+    assert index.label("Ann Lee") == "Ann Lee (Bexley, Full Time)"
+
+
+def test_limit_caps_results(index):
+    assert len(index.search("", limit=3)) == 3
+    assert index.search("a", limit=1) == ["Ann Lee"]
@@ -0,0 +1,226 @@
+"""BoundedCache: LRU eviction by entry count and bytes, TTL expiry and stats; the shared tier's locks."""
+import os
+
+import pytest
+
+import roster_cache
+from roster_cache import BoundedCache, FileBackend, bounded_cache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(roster_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_evicts_least_recently_used_beyond_max_entries():
+    cache = BoundedCache("test", ttl=None, max_entries=2, max_bytes=10 ** 6)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == (True, 1)  # "b" is now the least recently used
+    cache.put("c", 3)
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_evicts_until_within_the_byte_budget(monkeypatch):
+    monkeypatch.setattr(roster_cache, "entry_size", lambda value: len(value))
+    cache = BoundedCache("test", ttl=None, max_entries=100, max_bytes=10)
+    cache.put("a", "xxxx")
+    cache.put("b", "xxxx")
+    cache.put("c", "xxxxxxx")  # 15 bytes: both older entries have to go
+
+    stats = cache.stats()
+    assert cache.get("a") == (False, None)
+    assert cache.get("b") == (False, None)
+    assert stats['entries'] == 1
+    assert stats['resident_bytes'] == 7
+    assert stats['evictions'] == 2
+
+
+def test_entry_larger_than_the_budget_is_never_kept(monkeypatch):
+    monkeypatch.setattr(roster_cache, "entry_size", lambda value: len(value))
+    cache = BoundedCache("test", ttl=None, max_entries=100, max_bytes=10)
+    cache.put("small", "xx")
+    cache.put("huge", "x" * 11)
+
+    assert cache.get("huge") == (False, None)
+    assert cache.get("small") == (True, "xx")
+    assert cache.stats()['resident_bytes'] == 2
+
+
+def test_replacing_an_entry_updates_its_size(monkeypatch):
+    monkeypatch.setattr(roster_cache, "entry_size", lambda value: len(value))
+    cache = BoundedCache("test", ttl=None, max_entries=100, max_bytes=10)
+    cache.put("a", "xxxxxx")
+    cache.put("a", "xx")
+
+    assert cache.stats()['resident_bytes'] == 2
+    assert cache.stats()['evictions'] == 0
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = BoundedCache("test", ttl=60, max_entries=10, max_bytes=10 ** 6)
+    cache.put("a", 1)
+    clock.now += 59
+    assert cache.get("a") == (True, 1)
+    clock.now += 2
+    assert cache.get("a") == (False, None)
+
+    stats = cache.stats()
+    assert stats['expirations'] == 1
+    assert stats['entries'] == 0
+    assert stats['resident_bytes'] == 0
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+
+def test_clear_one_key_or_everything():
+    cache = BoundedCache("test", ttl=None, max_entries=10, max_bytes=10 ** 6)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.clear("a")
+    assert cache.get("a") == (False, None)
+    assert cache.get("b") == (True, 2)
+    cache.clear()
+    assert cache.stats()['entries'] == 0
+    assert cache.stats()['resident_bytes'] == 0
+
+
+def test_entry_size_of_frames_and_objects():
+    pd = pytest.importorskip("pandas")
+    frame = pd.DataFrame({'name': ["a" * 100] * 10})
+    assert roster_cache.entry_size(frame) > 1000
+    assert roster_cache.entry_size({'a': 1}) > 0
+    assert roster_cache.entry_size(lambda: None) == 0  # not picklable
+
+
+def test_bounded_cache_returns_copies_and_clears_by_arguments():
+    calls = []
+
+    @bounded_cache(ttl=None, max_entries=4)
+    def lookup(name, scale=1):
+        calls.append((name, scale))
+        return {'name': name, 'items': [scale]}
+
+    first = lookup("a")
+    first['items'].append(99)  # mutating a result must not reach the cache
+    assert lookup("a") == {'name': "a", 'items': [1]}
+    assert lookup("a", scale=2) == {'name': "a", 'items': [2]}
+    assert calls == [("a", 1), ("a", 2)]
+
+    lookup.clear("a")
+    lookup("a")
+    lookup("a", scale=2)
+    assert calls == [("a", 1), ("a", 2), ("a", 1)]
+
+    lookup.clear()
+    lookup("a", scale=2)
+    assert calls[-1] == ("a", 2)
+    assert lookup.stats()['entries'] == 1
+
+
+class CountingBackend(FileBackend):
+    """File backend that counts generation reads"""
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.generation_reads = 0
+
+    def generations(self, names):
+        self.generation_reads += 1
+        return super().generations(names)
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    backend = CountingBackend(str(tmp_path / "shared"))
+    monkeypatch.setattr(roster_cache, "shared_backend", lambda: backend)
+    monkeypatch.setattr(roster_cache, "_generation_cache", {})
+    monkeypatch.setattr(roster_cache, "_seen_generations", {})
+    return backend
+
+
+def test_fill_lock_is_only_released_by_its_owner(backend):
+    token = backend.acquire("key", 30)
+    assert token
+    assert backend.acquire("key", 30) is None
+
+    backend.release("key", "someone-else")
+    assert backend.acquire("key", 30) is None
+    backend.release("key", token)
+    assert backend.acquire("key", 30)
+
+
+def test_a_taken_over_lock_survives_the_late_owners_release(backend):
+    token = backend.acquire("key", 30)
+    os.utime(backend._path("lock", "key"), (0, 0))  # the owner stalled past the lock's lifetime
+    successor = backend.acquire("key", 30)
+    assert successor and successor != token
+
+    backend.release("key", token)
+    assert backend.acquire("key", 30) is None
+    backend.release("key", successor)
+
+
+def test_waiting_past_the_deadline_does_not_release_a_lock_it_never_took(backend, monkeypatch):
+    monkeypatch.setattr(roster_cache, "FILL_WAIT_SECONDS", 0.2)
+    monkeypatch.setattr(backend, "acquire", lambda key, seconds: None)  # another replica keeps filling
+    released = []
+    monkeypatch.setattr(backend, "release", lambda key, token: released.append(key))
+
+    @bounded_cache(ttl=60)
+    def slow_fill(name):
+        return name.upper()
+
+    assert slow_fill("a") == "A"
+    assert released == []
+
+
+def test_local_hits_do_not_read_generations_within_the_ttl(backend, clock):
+    @bounded_cache(ttl=600)
+    def lookup(name):
+        return name
+
+    lookup("a")
+    reads = backend.generation_reads
+    for _ in range(10):
+        lookup("a")
+    assert backend.generation_reads == reads
+
+    clock.now += roster_cache.GENERATION_TTL + 1
+    lookup("a")
+    assert backend.generation_reads == reads + 1
+
+
+def test_clear_is_seen_at_once_here_and_after_the_ttl_elsewhere(backend, clock):
+    calls = []
+
+    @bounded_cache(ttl=600)
+    def lookup(name):
+        calls.append(name)
+        return name
+
+    lookup("a")
+    lookup.clear("a")
+    lookup("a")
+    assert calls == ["a", "a"]
+
+    # Another replica bumps the generation; this one notices once the TTL passes
+    backend.bump(lookup.stats()['function'])
+    lookup("a")
+    assert calls == ["a", "a"]
+    clock.now += roster_cache.GENERATION_TTL + 1
+    lookup("a")
+    assert calls == ["a", "a", "a"]
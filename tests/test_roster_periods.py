@@ -0,0 +1,116 @@
+"""Roster cycles start on a persisted date per location, not on the earliest live row."""
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from load_test import FIXTURE_SCHEMA
+from roster_db import CYCLE_DAYS, current_period, cycle_anchor, cycle_start, local_connection
+
+# The fortnight starting Monday last week, so it is the cycle holding today
+CYCLE_START = date.today() - timedelta(days=date.today().weekday() + 7)
+LOCATION = "House"
+
+
+def appointment(day, location=LOCATION, participant=f"Roster {LOCATION}"):
+    start = datetime.combine(CYCLE_START + timedelta(days=day), time(7))
+    return (
+        f"{location}-{day}", f"Day {day}", str(start), str(start + timedelta(hours=8)), 480.0,
+        participant, location, None,
+    )
+
+
+def archive_before(conn, day):
+    """What archive_job does, at an arbitrary cutoff"""
+    cutoff = str(datetime.combine(CYCLE_START + timedelta(days=day), time()))
+    conn.execute(
+        "INSERT INTO NewAppointmentsArchive SELECT *, CURRENT_TIMESTAMP FROM NewAppointments "
+        "WHERE maica__Scheduled_Start__c < ?", (cutoff,)
+    )
+    conn.execute("DELETE FROM NewAppointments WHERE maica__Scheduled_Start__c < ?", (cutoff,))
+    conn.commit()
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = local_connection(str(tmp_path / "roster.db"))
+    conn.executescript(FIXTURE_SCHEMA)
+    yield conn
+    conn.close()
+
+
+def test_cycle_start_steps_whole_cycles_from_the_anchor():
+    anchor = date(2026, 1, 5)
+    assert cycle_start(anchor, date(2026, 1, 1)) == anchor
+    assert cycle_start(anchor, date(2026, 1, 18)) == anchor
+    assert cycle_start(anchor, date(2026, 1, 19)) == anchor + timedelta(days=CYCLE_DAYS)
+    assert cycle_start(anchor, date(2026, 3, 1)) == date(2026, 2, 16)
+
+
+def test_current_period_opens_the_next_cycle_with_appointments():
+    anchor = CYCLE_START - timedelta(days=CYCLE_DAYS)
+    period = current_period(anchor, None, None)
+    assert (period['week1_start'], period['week2_end']) == (CYCLE_START, CYCLE_START + timedelta(days=13))
+    later = CYCLE_START + timedelta(days=CYCLE_DAYS)
+    period = current_period(anchor, later + timedelta(days=2), later + timedelta(days=20))
+    assert period['week1_start'] == later
+    assert period['week2_start'] == later + timedelta(days=7)
+    assert period['week2_end'] == later + timedelta(days=13)
+
+
+def test_anchor_is_persisted_and_survives_archiving(conn):
+    conn.executemany(
+        "INSERT INTO NewAppointments VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [appointment(day) for day in range(-CYCLE_DAYS, CYCLE_DAYS)]
+    )
+    conn.commit()
+    first = CYCLE_START - timedelta(days=CYCLE_DAYS)
+    assert cycle_anchor(conn, LOCATION) == first
+    assert conn.execute("SELECT CycleStart FROM RosterCycles").fetchall() == [(first.isoformat(),)]
+
+    archive_before(conn, 3)
+    assert cycle_anchor(conn, LOCATION) == first
+    conn.execute("DELETE FROM NewAppointmentsArchive")
+    conn.commit()
+    assert cycle_anchor(conn, LOCATION) == first
+
+
+def test_a_new_anchor_counts_archived_appointments(conn):
+    conn.executemany(
+        "INSERT INTO NewAppointments VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [appointment(day) for day in range(-5, CYCLE_DAYS)]
+    )
+    conn.commit()
+    archive_before(conn, 2)
+    assert cycle_anchor(conn, LOCATION) == CYCLE_START - timedelta(days=5)
+
+
+def test_rosters_without_appointments_are_not_anchored(conn):
+    conn.executemany("INSERT INTO NewAppointments VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+        appointment(0, location="Elsewhere", participant="Roster Elsewhere"),
+        appointment(1, participant="Client visit"),
+    ])
+    conn.commit()
+    assert cycle_anchor(conn, LOCATION) is None
+    assert conn.execute("SELECT COUNT(*) FROM RosterCycles").fetchone()[0] == 0
+
+
+def test_week_ranges_do_not_drift_when_old_rows_are_archived(app):
+    from roster_cache import clear_all
+    from roster_db import LOCAL_DB
+
+    conn = local_connection(LOCAL_DB)
+    conn.executemany(
+        "INSERT INTO NewAppointments VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [appointment(day) for day in range(-CYCLE_DAYS, CYCLE_DAYS)]
+    )
+    conn.commit()
+    before = app.get_week_ranges(LOCATION)
+    assert before['week1_start'] == CYCLE_START
+    assert before['week2_end'] == CYCLE_START + timedelta(days=13)
+
+    # A cutoff in the middle of a cycle used to make that day week 1
+    for day in (-11, 3):
+        archive_before(conn, day)
+        clear_all()
+        assert app.get_week_ranges(LOCATION) == before
+    conn.close()
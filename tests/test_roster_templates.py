@@ -0,0 +1,144 @@
+"""Roster templates: projecting the current cycle forward and re-checking it."""
+import pandas as pd
+import pytest
+
+from roster_db import local_connection
+from roster_templates import (
+    CYCLE_DAYS, TEMPLATE_COLUMNS, capture_cycle, drop_existing, insert_projected, project, validate
+)
+
+CYCLE_START = pd.Timestamp(2026, 10, 12)
+DIRECTORY = pd.DataFrame({
+    'Resource': ["Ann Lee", "Bo Chen"],
+    'employmentType': ["Full Time", "Full Time"],
+    'hoursPerWeek': [38.0, 38.0],
+})
+NO_BOOKINGS = pd.DataFrame(columns=['Resource', 'WorkDate', 'Minutes'])
+
+
+SCHEMA = """
+CREATE TABLE NewAppointments (
+    Id TEXT PRIMARY KEY,
+    Name TEXT,
+    maica__Scheduled_Start__c TEXT,
+    maica__Scheduled_End__c TEXT,
+    maica__Scheduled_Duration_Minutes__c REAL,
+    maica__Participants__c TEXT,
+    maica__Participant_Location__c TEXT,
+    maica__Resources__c TEXT
+);
+CREATE TABLE ResourceDailyHours (
+    Resource TEXT NOT NULL,
+    WorkDate TEXT NOT NULL,
+    Minutes REAL NOT NULL,
+    PRIMARY KEY (Resource, WorkDate)
+);
+"""
+
+
+def template():
+    """Ann works three days in week 1, Bo two days in week 2, one shift is open"""
+    rows = [
+        ("Morning", "Ann Lee", 0), ("Morning", "Ann Lee", 2), ("Morning", "Ann Lee", 4),
+        ("Morning", "Bo Chen", 8), ("Morning", "Bo Chen", 10), ("Night", None, 5),
+    ]
+    return pd.DataFrame([
+        (name, "Roster House", "House", resource, pd.Timedelta(days=day, hours=7), pd.Timedelta(hours=8), 480.0)
+        for name, resource, day in rows
+    ], columns=TEMPLATE_COLUMNS)
+
+
+def test_project_places_the_template_in_each_following_cycle():
+    projected = project(template(), CYCLE_START.date(), 2)
+
+    assert len(projected) == 12
+    assert projected['Cycle'].tolist() == [1] * 6 + [2] * 6
+    first = projected.iloc[0]
+    assert first['StartDateTime'] == CYCLE_START + pd.Timedelta(days=CYCLE_DAYS, hours=7)
+    assert first['EndDateTime'] - first['StartDateTime'] == pd.Timedelta(hours=8)
+    assert projected.iloc[6]['StartDateTime'] == CYCLE_START + pd.Timedelta(days=2 * CYCLE_DAYS, hours=7)
+    assert projected.groupby('Resource')['Week'].unique().map(list).to_dict() == {"Ann Lee": [1], "Bo Chen": [2]}
+
+
+def test_valid_assignments_are_kept(rules):
+    projected, findings = validate(rules, project(template(), CYCLE_START, 2), DIRECTORY, NO_BOOKINGS)
+
+    assert not projected['Blocked'].any()
+    assert projected['Assign'].equals(projected['Resource'])
+    assert projected['Assign'].isna().sum() == 2
+    assert findings.empty
+
+
+def test_existing_bookings_block_a_worker_in_that_cycle_only(rules):
+    # 32h Ann already has elsewhere in the first projected week 1: 24h more breaks the 38h cap
+    first_week = CYCLE_START + pd.Timedelta(days=CYCLE_DAYS)
+    booked = pd.DataFrame({
+        'Resource': ["Ann Lee"] * 4,
+        'WorkDate': [(first_week + pd.Timedelta(days=day)).date() for day in (1, 3, 5, 6)],
+        'Minutes': [480.0] * 4,
+    })
+    projected, findings = validate(rules, project(template(), CYCLE_START, 2), DIRECTORY, booked)
+
+    blocked = projected[projected['Blocked']]
+    assert set(zip(blocked['Cycle'], blocked['Resource'])) == {(1, "Ann Lee")}
+    assert blocked['Assign'].isna().all()
+    assert projected.loc[projected['Cycle'] == 2, 'Assign'].notna().sum() == 5
+    assert findings[['Cycle', 'Worker']].values.tolist() == [[1, "Ann Lee"]]
+    assert findings.iloc[0]['hard_violations'] > 0
+
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """The template's cycle stored at CYCLE_START, plus one shift already created in the next cycle"""
+    conn = local_connection(str(tmp_path / "roster.db"))
+    conn.executescript(SCHEMA)
+    rows = template().assign(Resource=lambda frame: frame['Resource'].replace({"Ann Lee": "Ann  Lee", None: "NULL"}))
+    rows = pd.concat([rows, template().iloc[[0]].assign(Offset=pd.Timedelta(days=CYCLE_DAYS, hours=7))])
+    conn.executemany("INSERT INTO NewAppointments VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+        (
+            f"A{n}", row.Name, str(CYCLE_START + row.Offset), str(CYCLE_START + row.Offset + row.Length),
+            row.DurationMinutes, row.Participant, f"{row.Location} (Parramatta)", row.Resource,
+        )
+        for n, row in enumerate(rows.itertuples(index=False))
+    ])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_capture_cycle_reads_offsets_and_normalized_assignments(conn):
+    captured = capture_cycle(conn, "House", {'week1_start': CYCLE_START.date()})
+
+    expected = template().sort_values('Offset').reset_index(drop=True)
+    pd.testing.assert_frame_equal(
+        captured.drop(columns=['Location']), expected.drop(columns=['Location']), check_dtype=False
+    )
+    assert captured['Resource'].isna().sum() == 1
+
+
+def test_projected_cycles_are_created_once_with_their_hours(conn, rules):
+    captured = capture_cycle(conn, "House", {'week1_start': CYCLE_START.date()})
+    projected = drop_existing(conn, project(captured, CYCLE_START, 1), "House")
+    assert len(projected) == 5
+
+    projected, _ = validate(rules, projected, DIRECTORY, NO_BOOKINGS)
+    assert insert_projected(conn, projected) == 5
+
+    next_cycle = (CYCLE_START + pd.Timedelta(days=CYCLE_DAYS)).date()
+    created = pd.read_sql(
+        "SELECT maica__Resources__c AS Resource FROM NewAppointments WHERE maica__Scheduled_Start__c >= ?",
+        conn, params=[str(next_cycle)]
+    )
+    assert len(created) == 6
+    counters = pd.read_sql("SELECT Resource, WorkDate, Minutes FROM ResourceDailyHours ORDER BY WorkDate", conn)
+    assert counters.groupby('Resource')['Minutes'].sum().to_dict() == {"Ann Lee": 960.0, "Bo Chen": 960.0}
+    assert drop_existing(conn, project(captured, CYCLE_START, 1), "House").empty
+
+
+def test_inserting_nothing_is_a_no_op(conn, rules):
+    captured = capture_cycle(conn, "House", {'week1_start': CYCLE_START.date()})
+    projected, _ = validate(rules, project(captured, CYCLE_START, 1), DIRECTORY, NO_BOOKINGS)
+
+    assert insert_projected(conn, projected.iloc[:0]) == 0
+    assert conn.execute("SELECT COUNT(*) FROM NewAppointments").fetchone()[0] == 7
@@ -0,0 +1,109 @@
+"""Committing the what-if sandbox re-checks every hard rule against the database."""
+from datetime import date, datetime, time, timedelta
+
+import pandas as pd
+import pytest
+
+from roster_db import local_connection
+
+# The fortnight starting Monday last week, so it is the live cycle
+CYCLE_START = date.today() - timedelta(days=date.today().weekday() + 7)
+LOCATION = "House"
+
+
+def start_of(day, hour):
+    return datetime.combine(CYCLE_START + timedelta(days=day), time(hour))
+
+
+@pytest.fixture
+def roster(app):
+    """Six hour shifts at 07:00 on every day of the cycle; Ann already works days 0-4"""
+    from roster_db import LOCAL_DB
+
+    conn = local_connection(LOCAL_DB)
+    conn.executemany("INSERT INTO Resources VALUES (?, ?, ?, ?, ?, ?, ?)", [
+        ("R1", "Ann Lee", "Full Time", 38.0, LOCATION, "Active", "Support Worker"),
+        ("R2", "Bo Chen", "Full Time", 38.0, LOCATION, "Active", "Support Worker"),
+    ])
+    conn.executemany("INSERT INTO NewAppointments VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+        (
+            f"D{day}", f"Day {day}", str(start_of(day, 7)), str(start_of(day, 13)), 360.0,
+            f"Roster {LOCATION}", LOCATION, "Ann Lee" if day < 5 else None,
+        )
+        for day in range(14)
+    ])
+    conn.executemany(
+        "INSERT INTO ResourceDailyHours VALUES (?, ?, ?)",
+        [("Ann Lee", str(CYCLE_START + timedelta(days=day)), 360.0) for day in range(5)]
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def stage(app, appointment_id, resource_name, conn):
+    row = pd.read_sql(
+        "SELECT Id AS AppointmentID, Name, maica__Scheduled_Start__c AS StartDateTime, "
+        "maica__Scheduled_End__c AS EndDateTime, maica__Scheduled_Duration_Minutes__c AS DurationMinutes "
+        "FROM NewAppointments WHERE Id = ?", conn, params=[appointment_id]
+    ).iloc[0]
+    week_num = 1 if pd.to_datetime(row['StartDateTime']).date() < CYCLE_START + timedelta(days=7) else 2
+    app.stage_assignment(row, resource_name, LOCATION, week_num)
+
+
+def assigned(conn, appointment_id):
+    return conn.execute("SELECT maica__Resources__c FROM NewAppointments WHERE Id = ?", (appointment_id,)).fetchone()[0]
+
+
+def minutes(conn, resource_name):
+    row = conn.execute("SELECT SUM(Minutes) FROM ResourceDailyHours WHERE Resource = ?", (resource_name,)).fetchone()
+    return row[0] or 0
+
+
+@pytest.fixture
+def errors(app, monkeypatch):
+    shown = []
+    monkeypatch.setattr(app.st, "error", shown.append)
+    return shown
+
+
+def test_valid_staged_assignments_are_written_with_their_hours(app, roster, errors):
+    app.get_sandbox()['enabled'] = True
+    stage(app, "D8", "Bo Chen", roster)
+    stage(app, "D10", "Bo Chen", roster)
+
+    assert app.commit_sandbox()
+    assert errors == []
+    assert assigned(roster, "D8") == assigned(roster, "D10") == "Bo Chen"
+    assert minutes(roster, "Bo Chen") == 720
+    assert app.get_sandbox()['staged'] == {}
+
+
+def test_a_rule_beyond_the_hour_caps_rolls_the_whole_sandbox_back(app, roster, errors):
+    # A sixth day running for Ann: 36h is within her week cap, but over the consecutive day limit
+    app.get_sandbox()['enabled'] = True
+    stage(app, "D8", "Bo Chen", roster)
+    stage(app, "D5", "Ann Lee", roster)
+
+    assert not app.commit_sandbox()
+    assert errors == ["❌ Sandbox not committed - hard rules would be broken:"]
+    assert assigned(roster, "D5") is None
+    assert assigned(roster, "D8") is None
+    assert minutes(roster, "Ann Lee") == 5 * 360
+    assert minutes(roster, "Bo Chen") == 0
+    assert len(app.get_sandbox()['staged']) == 2
+
+
+def test_shifts_committed_after_staging_are_checked(app, roster, errors):
+    # Staged on a roster where Bo is free; someone else gives him an overlapping shift before the commit
+    app.get_sandbox()['enabled'] = True
+    stage(app, "D8", "Bo Chen", roster)
+    roster.execute(
+        "INSERT INTO NewAppointments VALUES ('X1', 'Extra', ?, ?, 240.0, ?, ?, 'Bo Chen')",
+        (str(start_of(8, 12)), str(start_of(8, 16)), f"Roster {LOCATION}", LOCATION)
+    )
+    roster.commit()
+
+    assert not app.commit_sandbox()
+    assert errors == ["❌ Sandbox not committed - hard rules would be broken:"]
+    assert assigned(roster, "D8") is None
@@ -0,0 +1,111 @@
+"""Violation scan: findings must not depend on how the resources are partitioned."""
+from datetime import date, datetime, time, timedelta
+
+import pandas as pd
+import pytest
+
+import violation_scan
+from conftest import RULES
+from violation_scan import latest_scan, partition_of, prepare, run_scan
+
+# The fortnight starting Monday last week, so it is the cycle holding today
+CYCLE_START = date.today() - timedelta(days=date.today().weekday() + 7)
+WORKERS = [f"Worker {n}" for n in range(12)]
+
+
+def shift(location, participant, day, hour, hours, resource):
+    start = datetime.combine(CYCLE_START + timedelta(days=day), time(hour))
+    return {
+        'AppointmentID': f"{location}-{day}-{hour}-{resource}",
+        'Location': location,
+        'Participant': participant,
+        'Resource': resource,
+        'StartDateTime': start,
+        'EndDateTime': start + timedelta(hours=hours),
+        'DurationMinutes': hours * 60.0,
+    }
+
+
+def extract():
+    rows = []
+    for n, worker in enumerate(WORKERS):
+        location = "House A" if n % 2 else "House B"
+        # Alternate days within limits, except every fourth worker who works six days running
+        days = range(6) if n % 4 == 0 else range(0, 14, 2)
+        rows += [shift(location, f"Roster {location}", day, 7, 8, worker) for day in days]
+    # 24h and 16h in week 1: only the two rosters together break the 38h week cap
+    rows += [shift("House A", "Roster House A", day, 15, 8, "Cross Worker") for day in (0, 2, 4)]
+    rows += [shift("House B", "Roster House B", day, 15, 8, "Cross  Worker") for day in (1, 3)]
+    # A client visit is not a roster but its hours still count towards the worker's caps
+    rows += [shift("Outreach", "Client visit", 12, 7, 8, "Worker 1")]
+    rows += [shift("House A", "Roster House A", day, 23, 8, None) for day in range(14)]
+    resources = pd.DataFrame({
+        'fullName': WORKERS + ["Cross Worker"],
+        'employmentType': ["Full Time", "Part Time", "Casual"] * 4 + ["Full Time"],
+        'hoursPerWeek': [38.0, 20.0, None] * 4 + [38.0],
+    })
+    # Both rosters began two cycles before the current one
+    anchors = {"House A": CYCLE_START - timedelta(days=28), "House B": CYCLE_START - timedelta(days=28)}
+    return pd.DataFrame(rows), resources, anchors
+
+
+@pytest.fixture
+def scan(tmp_path, monkeypatch):
+    monkeypatch.setattr(violation_scan, "SCAN_DB", str(tmp_path / "violations.db"))
+    monkeypatch.setattr(violation_scan, "extract", extract)
+    monkeypatch.setattr(violation_scan, "load_rules", lambda: RULES)
+
+    def scan(workers):
+        summary = run_scan(workers)
+        _, findings = latest_scan()
+        findings = findings.drop(columns=['run_id']).astype(object)
+        return summary, sorted(findings.where(findings.notna(), None).itertuples(index=False, name=None), key=repr)
+    return scan
+
+
+def test_findings_do_not_depend_on_the_number_of_workers(scan):
+    summary, single = scan(1)
+    assert summary['rosters'] == 2
+    assert summary['resources'] == len(WORKERS) + 1
+    assert single
+    for workers in (2, 3, 8):
+        summary, partitioned = scan(workers)
+        assert summary['workers'] == workers
+        assert partitioned == single
+
+
+def test_hours_at_other_rosters_count_towards_the_caps(scan):
+    _, findings = scan(4)
+    cross = {(row[0], row[4]) for row in findings if row[2] == "Cross Worker"}
+    assert cross == {("House A", "week_cap"), ("House B", "week_cap")}
+    runs = {row[2] for row in findings if row[4] == "consecutive_days"}
+    assert runs == {"Worker 0", "Worker 4", "Worker 8"}
+
+
+def test_prepare_splits_rosters_and_normalizes_names():
+    rosters, daily, directory = prepare(*extract())
+    assert [location for location, _, _ in rosters] == ["House A", "House B"]
+    assert "Cross Worker" in set(daily['Resource'])
+    assert daily.loc[daily['Resource'] == "Worker 1", 'Minutes'].sum() == 8 * 60 * 8
+    assert directory.loc[directory['Resource'] == "Worker 2", 'hoursPerWeek'].item() == 0
+
+
+def test_prepare_reads_the_cycle_from_the_persisted_anchor():
+    appointments, resources, anchors = extract()
+    # Archiving part of the cycle must not move its weeks
+    archived_before = datetime.combine(CYCLE_START + timedelta(days=3), time())
+    appointments = appointments[appointments['StartDateTime'] >= archived_before]
+    rosters, _, _ = prepare(appointments, resources, anchors)
+    for _, period, shifts in rosters:
+        assert period['week1_start'] == CYCLE_START
+        assert period['week2_start'] == CYCLE_START + timedelta(days=7)
+        assert set(shifts['Week']) == {1, 2}
+
+
+def test_partition_of_is_stable_and_in_range():
+    names = WORKERS + ["Cross Worker"]
+    for partitions in (1, 3, 8):
+        parts = [partition_of(name, partitions) for name in names]
+        assert parts == [partition_of(name, partitions) for name in names]
+        assert all(0 <= part < partitions for part in parts)
+    assert len({partition_of(name, 8) for name in names}) > 1
@@ -0,0 +1,225 @@
+"""Write-behind queue: journal bookkeeping, guarded writes and flush retries."""
+from contextlib import contextmanager
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import write_queue
+from roster_db import local_connection
+from write_queue import MAX_ATTEMPTS, WriteBehind, WriteJournal, apply_change
+
+SCHEMA = """
+CREATE TABLE NewAppointments (
+    Id TEXT PRIMARY KEY,
+    maica__Scheduled_Start__c TEXT,
+    maica__Resources__c TEXT
+);
+CREATE TABLE ResourceDailyHours (
+    Resource TEXT NOT NULL,
+    WorkDate TEXT NOT NULL,
+    Minutes REAL NOT NULL,
+    PRIMARY KEY (Resource, WorkDate)
+);
+"""
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / "roster.db")
+    conn = local_connection(path)
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO NewAppointments VALUES (?, ?, ?)", [
+        ("A1", "2026-10-12 08:00:00", None),
+        ("A2", "2026-10-13 08:00:00", "Bo  Chen"),
+        ("A3", "2026-10-14 08:00:00", None),
+    ])
+    conn.execute("INSERT INTO ResourceDailyHours VALUES ('Bo Chen', '2026-10-13', 480)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def connect(database):
+    @contextmanager
+    def connect():
+        conn = local_connection(database)
+        try:
+            yield conn
+        finally:
+            conn.close()
+    return connect
+
+
+def change(appointment_id, resource=None, previous=None, day=12, minutes=480, week_cap=None, total_cap=None):
+    start = pd.Timestamp(2026, 10, day, 8)
+    return {
+        'appointment_id': appointment_id,
+        'name': f"Shift {appointment_id}",
+        'resource': resource,
+        'previous': previous,
+        'location': "House",
+        'start': start,
+        'end': start + pd.Timedelta(minutes=minutes),
+        'minutes': minutes,
+        'week': 1 if day < 19 else 2,
+        'week1_start': date(2026, 10, 12),
+        'week1_end': date(2026, 10, 18),
+        'week2_end': date(2026, 10, 25),
+        'week_cap': week_cap,
+        'total_cap': total_cap,
+    }
+
+
+def assigned(connect, appointment_id):
+    with connect() as conn:
+        row = conn.execute("SELECT maica__Resources__c FROM NewAppointments WHERE Id = ?", (appointment_id,)).fetchone()
+    return row[0]
+
+
+def counters(connect):
+    with connect() as conn:
+        return dict(((resource, day), minutes) for resource, day, minutes in conn.execute(
+            "SELECT Resource, WorkDate, Minutes FROM ResourceDailyHours WHERE Minutes <> 0"
+        ))
+
+
+def applied(connect, queued):
+    with connect() as conn:
+        result = apply_change(conn.cursor(), queued)
+        conn.commit()
+    return result
+
+
+def test_assign_writes_the_shift_and_its_hours(connect):
+    assert applied(connect, change("A1", "Ann Lee")) == ('done', None)
+    assert assigned(connect, "A1") == "Ann Lee"
+    assert counters(connect)[("Ann Lee", "2026-10-12")] == 480
+
+
+def test_replaying_a_written_change_is_a_no_op(connect):
+    applied(connect, change("A1", "Ann Lee"))
+    assert applied(connect, change("A1", "Ann Lee")) == ('done', None)
+    assert counters(connect)[("Ann Lee", "2026-10-12")] == 480
+
+
+def test_assigning_a_taken_shift_is_a_conflict(connect):
+    status, error = applied(connect, change("A2", "Ann Lee", day=13))
+    assert status == 'conflict'
+    assert "Bo Chen" in error
+    assert assigned(connect, "A2") == "Bo  Chen"
+
+
+def test_missing_appointment_is_a_conflict(connect):
+    assert applied(connect, change("A9", "Ann Lee")) == ('conflict', "Appointment no longer exists")
+
+
+def test_unassign_matches_the_previous_resource_ignoring_spacing(connect):
+    assert applied(connect, change("A2", None, previous="Bo Chen", day=13)) == ('done', None)
+    assert assigned(connect, "A2") is None
+    assert ("Bo Chen", "2026-10-13") not in counters(connect)
+
+
+def test_unassign_after_someone_else_took_over_is_a_conflict(connect):
+    status, error = applied(connect, change("A2", None, previous="Ann Lee", day=13))
+    assert status == 'conflict'
+    assert assigned(connect, "A2") == "Bo  Chen"
+
+
+def test_cap_breach_reverts_the_write_and_the_counters(connect):
+    applied(connect, change("A1", "Bo Chen"))  # 16h in week 1
+    status, error = applied(connect, change("A3", "Bo Chen", day=14, week_cap=20))
+
+    assert status == 'conflict'
+    assert error == "Week 1 hours would be 24.0h (max 20h)"
+    assert assigned(connect, "A3") is None
+    assert counters(connect) == {("Bo Chen", "2026-10-12"): 480, ("Bo Chen", "2026-10-13"): 480}
+
+
+def test_journal_round_trips_changes_in_order(tmp_path):
+    journal = WriteJournal(str(tmp_path / "journal.db"))
+    first = journal.append(change("A1", "Ann Lee"))
+    second = journal.append(change("A3", "Ann Lee", day=14))
+
+    pending = journal.pending()
+    assert [queued['seq'] for queued in pending] == [first, second]
+    assert pending[0]['start'] == pd.Timestamp(2026, 10, 12, 8)
+    assert pending[0]['week1_end'] == date(2026, 10, 18)
+
+    journal.record({first: ('done', None), second: ('conflict', "taken")})
+    assert journal.pending() == []
+    assert [queued['seq'] for queued in journal.problems()] == [second]
+    journal.dismiss(second)
+    assert journal.problems() == []
+    assert journal.counts() == {'done': 1, 'dismissed': 1}
+
+
+def idle_writer(journal, connect, **kwargs):
+    """A worker whose thread never wakes on its own; the tests flush by hand"""
+    return WriteBehind(journal, connect, interval=3600, **kwargs)
+
+
+def test_flush_writes_a_batch_and_reports_it(tmp_path, connect):
+    journal = WriteJournal(str(tmp_path / "journal.db"))
+    flushed = []
+    writer = idle_writer(journal, connect, on_flushed=lambda changes, results: flushed.append(results))
+    journal.append(change("A1", "Ann Lee"))
+    journal.append(change("A2", "Ann Lee", day=13))
+
+    assert writer.flush() == 2
+    assert list(flushed[0].values()) == [('done', None), ('conflict', "Appointment is assigned to Bo Chen")]
+    assert journal.counts() == {'done': 1, 'conflict': 1}
+    assert assigned(connect, "A1") == "Ann Lee"
+    assert writer.flush() == 0
+
+
+def test_flush_journals_the_batch_before_reporting_it(tmp_path, connect):
+    journal = WriteJournal(str(tmp_path / "journal.db"))
+    seen = []
+    writer = idle_writer(journal, connect, on_flushed=lambda changes, results: seen.append(journal.counts()))
+    journal.append(change("A1", "Ann Lee"))
+
+    writer.flush()
+    assert seen == [{'done': 1}]
+
+
+def test_failed_flush_keeps_the_batch_and_gives_up_on_the_head(tmp_path):
+    @contextmanager
+    def unreachable():
+        raise ConnectionError("link down")
+        yield
+
+    journal = WriteJournal(str(tmp_path / "journal.db"))
+    flushed = []
+    writer = idle_writer(journal, unreachable, on_flushed=lambda changes, results: flushed.append(results))
+    head = journal.append(change("A1", "Ann Lee"))
+    journal.append(change("A3", "Ann Lee", day=14))
+
+    for attempt in range(1, MAX_ATTEMPTS):
+        assert writer.flush() == 0
+        assert len(journal.pending()) == 2
+        assert writer.failures == attempt
+    assert writer._delay() == write_queue.MAX_BACKOFF
+
+    writer.flush()
+    assert flushed == [{head: ('failed', "link down")}]
+    assert [queued['seq'] for queued in journal.problems()] == [head]
+    assert len(journal.pending()) == 1
+
+
+def test_failed_flushes_are_logged(tmp_path, caplog):
+    @contextmanager
+    def unreachable():
+        raise ConnectionError("link down")
+        yield
+
+    journal = WriteJournal(str(tmp_path / "journal.db"))
+    writer = idle_writer(journal, unreachable)
+    journal.append(change("A1", "Ann Lee"))
+
+    with caplog.at_level("WARNING", logger="write_queue"):
+        writer.flush()
+    assert [record.getMessage() for record in caplog.records] == [
+        "Write-behind flush of 1 change(s) failed (attempt 1): link down"
+    ]
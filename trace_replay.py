@@ -0,0 +1,134 @@
+"""Replay a workload trace recorded with ROSTER_TRACE and report latency per query type.
+
+Each recorded connection is replayed on its own connection, in order, on a
+pool of `--concurrency` workers. `--speed` scales the recorded timing
+(2 = twice as fast, 0 = no waiting at all). Only reads are replayed unless
+`--writes` is given. The target is the roster database (ROSTER_LOCAL_DB
+applies), or a SQLite copy with `--target sqlite:///path/to/copy.db`.
+
+    python trace_replay.py trace.jsonl [--speed 1] [--concurrency 4] [--target URL] [--writes]
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import groupby
+
+import numpy as np
+import pandas as pd
+
+from roster_db import db_connection, local_connection
+from roster_trace import decode_param, load_trace
+
+READS = ("SELECT", "WITH")
+
+
+@contextmanager
+def target_connection(target):
+    """Connection to the replay target: a SQLite stand-in or the roster database"""
+    if target and target.startswith("sqlite:///"):
+        conn = local_connection(target[len("sqlite:///"):])
+        try:
+            yield conn
+        finally:
+            conn.close()
+    else:
+        with db_connection() as conn:
+            yield conn
+
+
+def replay_session(events, target, started, speed, writes, results, lock):
+    """Issue one recorded connection's statements; appends (fingerprint, caller, recorded, replayed, error)"""
+    with target_connection(target) as conn:
+        cursor = conn.cursor()
+        for event in events:
+            if speed:
+                delay = started + event["at"] / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            op = event["op"]
+            if op in ("commit", "rollback"):
+                if writes:
+                    getattr(conn, op)()
+                continue
+            if not writes and not event["sql"].lstrip().upper().startswith(READS):
+                continue
+
+            sql = event["sql"]
+            error = None
+            begin = time.perf_counter()
+            try:
+                if op == "executemany":
+                    cursor.executemany(sql, [[decode_param(value) for value in row] for row in event["params"]])
+                else:
+                    cursor.execute(sql, [decode_param(value) for value in event["params"]])
+                    if cursor.description is not None:
+                        cursor.fetchall()
+            except Exception as e:
+                error = str(e)
+            elapsed = (time.perf_counter() - begin) * 1000
+            with lock:
+                results.append((event["fingerprint"], event.get("caller"), event["ms"], elapsed, error))
+        if not writes:
+            conn.rollback()
+
+
+def replay(events, target=None, speed=1.0, concurrency=4, writes=False):
+    """Replay every session of a trace; one row per replayed statement"""
+    events = sorted(events, key=lambda event: (event["session"], event["seq"]))
+    sessions = [list(group) for _, group in groupby(events, key=lambda event: event["session"])]
+    first = min((event["at"] for event in events), default=0)
+    for session in sessions:
+        for event in session:
+            event["at"] -= first
+    sessions.sort(key=lambda session: session[0]["at"])
+
+    results = []
+    lock = threading.Lock()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            pool.submit(replay_session, session, target, started, speed, writes, results, lock)
+            for session in sessions
+        ]
+        for future in futures:
+            future.result()
+    return pd.DataFrame(results, columns=['fingerprint', 'caller', 'recorded_ms', 'replay_ms', 'error'])
+
+
+def latency_report(results):
+    """Count, errors and latency percentiles per query type, slowest p95 first"""
+    def summarize(group):
+        ok = group.loc[group['error'].isna(), 'replay_ms'].to_numpy()
+        p50, p95, p99 = np.percentile(ok, [50, 95, 99]) if len(ok) else (np.nan, np.nan, np.nan)
+        return pd.Series({
+            'caller': group['caller'].dropna().iloc[0] if group['caller'].notna().any() else '',
+            'count': len(group),
+            'errors': int(group['error'].notna().sum()),
+            'recorded_p50': group['recorded_ms'].median(),
+            'p50': p50,
+            'p95': p95,
+            'p99': p99,
+            'max': ok.max() if len(ok) else np.nan,
+        })
+
+    if results.empty:
+        return pd.DataFrame()
+    report = results.groupby('fingerprint').apply(summarize, include_groups=False)
+    return report.sort_values('p95', ascending=False).round(2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("trace")
+    parser.add_argument("--target", help="sqlite:///path for the local stand-in (default: roster database)")
+    parser.add_argument("--speed", type=float, default=1.0, help="timing multiplier; 0 replays without waiting")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--writes", action="store_true", help="also replay INSERT/UPDATE/DELETE and commits")
+    args = parser.parse_args()
+
+    results = replay(load_trace(args.trace), args.target, args.speed, args.concurrency, args.writes)
+    print(f"{len(results)} statements replayed, {results['error'].notna().sum()} errors")
+    print(latency_report(results).to_string())
@@ -0,0 +1,263 @@
+"""Organisation-wide roster violation scan.
+
+Reads every appointment and resource in one bulk extract, partitions the
+resources across a process pool, evaluates every rule for every roster with
+the vectorized engine and stores the findings in a local SQLite results
+table that the app's Violations tab reads.
+
+    python violation_scan.py [--workers N]
+"""
+import argparse
+import os
+import sqlite3
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from constraint_rules import compile_rules, evaluate_many, load_rules
+from roster_db import (
+    DATETIME, active_window_start, current_period, cycle_anchor, cycle_start, db_connection, normalize_location,
+    read_frame
+)
+
+SCAN_DB = os.getenv("ROSTER_SCAN_DB", "violations.db")
+SCAN_WORKERS = int(os.getenv("ROSTER_SCAN_WORKERS", str(os.cpu_count() or 2)))
+KEEP_RUNS = 5  # older runs are deleted after each scan
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scan_runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    finished_at TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    rosters INTEGER NOT NULL,
+    resources INTEGER NOT NULL,
+    findings INTEGER NOT NULL,
+    workers INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS violations (
+    run_id INTEGER NOT NULL REFERENCES scan_runs(run_id),
+    location TEXT NOT NULL,
+    period_start TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    employment_type TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    field TEXT NOT NULL,
+    week INTEGER,
+    value REAL,
+    limit_value REAL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_violations_run_location ON violations (run_id, location);
+"""
+
+
+def roster_locations(appointments):
+    """Normalized locations of "Roster" participants, the same roster list as the app's"""
+    participant = appointments['Participant'].fillna('')
+    locations = appointments['Location'][participant.str.contains('Roster', case=False, regex=False)]
+    return sorted({normalize_location(loc) for loc in locations if loc})
+
+
+def extract():
+    """Every live appointment, every resource and each roster's cycle start; appointments are streamed in batches"""
+    query = """
+    SELECT
+        Id AS AppointmentID,
+        maica__Participant_Location__c AS Location,
+        maica__Participants__c AS Participant,
+        maica__Resources__c AS Resource,
+        maica__Scheduled_Start__c AS StartDateTime,
+        maica__Scheduled_End__c AS EndDateTime,
+        maica__Scheduled_Duration_Minutes__c AS DurationMinutes
+    FROM NewAppointments
+    WHERE maica__Scheduled_Start__c >= ?
+    """
+    appointments = read_frame(query, [active_window_start()], dtypes={
+        'StartDateTime': DATETIME, 'EndDateTime': DATETIME, 'DurationMinutes': 'float64'
+    })
+    with db_connection() as conn:
+        resources = pd.read_sql("SELECT fullName, employmentType, hoursPerWeek FROM Resources", conn)
+        anchors = {location: cycle_anchor(conn, location) for location in roster_locations(appointments)}
+    return appointments, resources, anchors
+
+
+def prepare(appointments, resources, anchors):
+    """Split the extract into rosters, org-wide daily minutes and the resource directory.
+
+    anchors maps each roster location to its persisted cycle start, so the
+    scan reads the same live cycle as the app.
+    """
+    appointments = appointments.assign(
+        StartDateTime=pd.to_datetime(appointments['StartDateTime']),
+        EndDateTime=pd.to_datetime(appointments['EndDateTime']),
+        DurationMinutes=appointments['DurationMinutes'].astype(float).fillna(0),
+        Location=appointments['Location'].fillna(''),
+        Participant=appointments['Participant'].fillna(''),
+    )
+    appointments['WorkDate'] = appointments['StartDateTime'].dt.date
+
+    resource = appointments['Resource'].fillna('').str.split().str.join(' ')
+    assigned = appointments[(resource != '') & (resource.str.upper() != 'NULL')].assign(Resource=resource)
+    daily = assigned.groupby(['Resource', 'WorkDate'], as_index=False)['DurationMinutes'].sum()
+    daily = daily.rename(columns={'DurationMinutes': 'Minutes'})
+
+    # Same roster list and period rules as the app
+    roster_rows = appointments[appointments['Participant'].str.contains('Roster', case=False, regex=False)]
+    rosters = []
+    for location in roster_locations(appointments):
+        at_location = roster_rows[roster_rows['Location'].str.contains(location, case=False, regex=False)]
+        anchor = anchors[location]
+        upcoming = at_location['WorkDate'][at_location['WorkDate'] >= cycle_start(anchor)]
+        if upcoming.empty:
+            period = current_period(anchor, None, None)
+        else:
+            period = current_period(anchor, upcoming.min(), upcoming.max())
+        shifts = assigned[
+            assigned['Location'].str.contains(location, case=False, regex=False)
+            & (assigned['WorkDate'] >= period['week1_start'])
+            & (assigned['WorkDate'] <= period['week2_end'])
+        ]
+        shifts = shifts.assign(Week=(shifts['WorkDate'] > period['week1_end']).astype(int) + 1)
+        rosters.append((location, period, shifts[
+            ['Resource', 'StartDateTime', 'EndDateTime', 'DurationMinutes', 'Week', 'WorkDate']
+        ]))
+
+    directory = pd.DataFrame({
+        'Resource': resources['fullName'].fillna('').str.split().str.join(' '),
+        'employmentType': resources['employmentType'].fillna('Unknown'),
+        'hoursPerWeek': resources['hoursPerWeek'],
+    }).drop_duplicates('Resource')
+    directory['hoursPerWeek'] = directory['hoursPerWeek'].where(directory['employmentType'] != 'Casual', 0)
+    return rosters, daily, directory
+
+
+def partition_of(resource_name, partitions):
+    """Stable partition for a resource so its shifts at every roster land in one worker"""
+    return zlib.crc32(resource_name.encode()) % partitions
+
+
+def scan_partition(rules, rosters, daily, directory):
+    """Findings for one partition's resources across every roster (runs in a worker process)"""
+    rows = []
+    for location, period, shifts in rosters:
+        if shifts.empty:
+            continue
+        resources = pd.DataFrame({'Resource': shifts['Resource'].unique()}).merge(
+            directory, on='Resource', how='left'
+        )
+        resources['employmentType'] = resources['employmentType'].fillna('Unknown')
+        resources['hoursPerWeek'] = resources['hoursPerWeek'].fillna(0)
+
+        # Hours at other rosters: org-wide daily minutes minus this roster's
+        local = shifts.groupby(['Resource', 'WorkDate'])['DurationMinutes'].sum().rename('LocalMinutes')
+        offsite = daily[
+            daily['Resource'].isin(resources['Resource'])
+            & (daily['WorkDate'] >= period['week1_start'])
+            & (daily['WorkDate'] <= period['week2_end'])
+        ].merge(local, left_on=['Resource', 'WorkDate'], right_index=True, how='left')
+        offsite['Minutes'] = offsite['Minutes'] - offsite['LocalMinutes'].fillna(0)
+        offsite = offsite[offsite['Minutes'] > 0]
+        offsite = offsite.assign(Week=[1 if day <= period['week1_end'] else 2 for day in offsite['WorkDate']])
+
+        result = evaluate_many(rules, shifts, resources, offsite)
+        for row in result.itertuples(index=False):
+            for finding in row.findings:
+                rows.append((
+                    location,
+                    period['week1_start'].isoformat(),
+                    row.Resource,
+                    row.employmentType,
+                    finding['rule'],
+                    finding['severity'],
+                    finding['field'],
+                    None if finding['week'] is None else int(finding['week']),
+                    float(finding['value']),
+                    float(finding['limit']),
+                    finding['message'],
+                ))
+    return rows
+
+
+def run_scan(workers=SCAN_WORKERS):
+    """Extract, evaluate in a process pool and persist one scan run; returns its summary"""
+    started = time.perf_counter()
+    started_at = datetime.now().isoformat(timespec='seconds')
+    rules = compile_rules(load_rules())
+    rosters, daily, directory = prepare(*extract())
+
+    resource_names = set(daily['Resource'])
+    partitions = max(1, min(workers, len(resource_names)))
+    assignment = {name: partition_of(name, partitions) for name in resource_names}
+    tasks = []
+    for part in range(partitions):
+        members = {name for name, p in assignment.items() if p == part}
+        tasks.append((
+            rules,
+            [(location, period, shifts[shifts['Resource'].isin(members)]) for location, period, shifts in rosters],
+            daily[daily['Resource'].isin(members)],
+            directory[directory['Resource'].isin(members)],
+        ))
+
+    with ProcessPoolExecutor(max_workers=partitions) as pool:
+        results = list(pool.map(scan_partition, *zip(*tasks)))
+    findings = [row for rows in results for row in rows]
+
+    summary = {
+        'started_at': started_at,
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'seconds': round(time.perf_counter() - started, 2),
+        'rosters': len(rosters),
+        'resources': len(resource_names),
+        'findings': len(findings),
+        'workers': partitions,
+    }
+    summary['run_id'] = save_run(summary, findings)
+    return summary
+
+
+def save_run(summary, findings):
+    """Write one run and its findings, dropping runs older than KEEP_RUNS"""
+    with sqlite3.connect(SCAN_DB) as conn:
+        conn.executescript(SCHEMA)
+        run_id = conn.execute(
+            "INSERT INTO scan_runs (started_at, finished_at, seconds, rosters, resources, findings, workers) "
+            "VALUES (:started_at, :finished_at, :seconds, :rosters, :resources, :findings, :workers)",
+            summary
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO violations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(run_id, *row) for row in findings]
+        )
+        conn.execute("DELETE FROM violations WHERE run_id <= ?", (run_id - KEEP_RUNS,))
+        conn.execute("DELETE FROM scan_runs WHERE run_id <= ?", (run_id - KEEP_RUNS,))
+    return run_id
+
+
+def latest_scan():
+    """(run summary, findings DataFrame) of the newest scan, or (None, empty frame)"""
+    if not os.path.exists(SCAN_DB):
+        return None, pd.DataFrame()
+    with sqlite3.connect(SCAN_DB) as conn:
+        conn.executescript(SCHEMA)
+        runs = pd.read_sql("SELECT * FROM scan_runs ORDER BY run_id DESC LIMIT 1", conn)
+        if runs.empty:
+            return None, pd.DataFrame()
+        run = runs.iloc[0].to_dict()
+        findings = pd.read_sql("SELECT * FROM violations WHERE run_id = ?", conn, params=[int(run['run_id'])])
+    return run, findings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=SCAN_WORKERS, help="worker processes")
+    args = parser.parse_args()
+    summary = run_scan(args.workers)
+    print(
+        f"Scan {summary['run_id']}: {summary['findings']} findings for {summary['resources']} resources "
+        f"across {summary['rosters']} rosters in {summary['seconds']}s ({summary['workers']} workers)"
+    )
@@ -0,0 +1,296 @@
+"""Write-behind queue for assignments over a slow or flaky database link.
+
+Validated assignments and unassignments are appended to a local SQLite
+journal and acknowledged immediately; a background worker flushes them to
+the roster database in journal order, a batch per transaction. A batch that
+fails to reach the database stays pending and is retried with backoff. A
+change the database no longer allows (the appointment changed underneath,
+or a hard hour cap would now be exceeded) is marked as a conflict for the
+app to report; the rest of the batch is still written.
+"""
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from hours_counters import adjust as adjust_hours, cap_breach, period_hours
+
+logger = logging.getLogger(__name__)
+
+WRITE_JOURNAL = os.getenv("ROSTER_WRITE_JOURNAL", "write_journal.db")
+FLUSH_INTERVAL = float(os.getenv("ROSTER_FLUSH_INTERVAL", "2"))  # seconds between flushes when idle
+FLUSH_BATCH = int(os.getenv("ROSTER_FLUSH_BATCH", "50"))
+MAX_BACKOFF = 60  # seconds; retry delay doubles per failed flush up to this
+MAX_ATTEMPTS = 10  # a change still failing after this many flushes is marked failed
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_writes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    appointment_id TEXT NOT NULL,
+    name TEXT,
+    resource TEXT,
+    previous TEXT,
+    location TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    minutes REAL NOT NULL,
+    week INTEGER NOT NULL,
+    week1_start TEXT NOT NULL,
+    week1_end TEXT NOT NULL,
+    week2_end TEXT NOT NULL,
+    week_cap REAL,
+    total_cap REAL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    queued_at TEXT NOT NULL,
+    flushed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_pending_writes_status ON pending_writes (status, seq);
+"""
+
+COLUMNS = [
+    'appointment_id', 'name', 'resource', 'previous', 'location', 'start', 'end', 'minutes', 'week',
+    'week1_start', 'week1_end', 'week2_end', 'week_cap', 'total_cap'
+]
+DATETIMES = ('start', 'end')
+DATES = ('week1_start', 'week1_end', 'week2_end')
+
+
+class WriteJournal:
+    """Durable, ordered log of queued changes; safe to share between threads"""
+
+    def __init__(self, path=WRITE_JOURNAL):
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def append(self, change):
+        """Journal a change; returns its sequence number"""
+        values = [change.get(column) for column in COLUMNS]
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"INSERT INTO pending_writes ({', '.join(COLUMNS)}, queued_at) "
+                f"VALUES ({', '.join('?' * len(COLUMNS))}, ?)",
+                values + [datetime.now().isoformat()]
+            )
+            return cursor.lastrowid
+
+    def _select(self, where, params=(), limit=None):
+        sql = f"SELECT * FROM pending_writes WHERE {where} ORDER BY seq"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        changes = []
+        for row in rows:
+            change = dict(row)
+            for column in DATETIMES:
+                change[column] = pd.Timestamp(change[column])
+            for column in DATES:
+                change[column] = pd.Timestamp(change[column]).date()
+            changes.append(change)
+        return changes
+
+    def pending(self, limit=None):
+        """Changes not yet written, oldest first"""
+        return self._select("status = 'pending'", limit=limit)
+
+    def problems(self):
+        """Conflicts and failures nobody has dismissed yet"""
+        return self._select("status IN ('conflict', 'failed')")
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM pending_writes GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def record(self, results):
+        """Store the outcome of a flushed batch: {seq: (status, error)}"""
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE pending_writes SET status = ?, error = ?, attempts = attempts + 1, flushed_at = ? WHERE seq = ?",
+                [(status, error, now, seq) for seq, (status, error) in results.items()]
+            )
+
+    def retry_later(self, seqs, error):
+        """Count a failed flush against each change; True when the oldest gave up after MAX_ATTEMPTS"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE pending_writes SET attempts = attempts + 1, error = ? WHERE seq = ?",
+                [(error, seq) for seq in seqs]
+            )
+            # Only the head can be failed: later changes may depend on it being ordered first
+            cursor = self._conn.execute(
+                "UPDATE pending_writes SET status = 'failed' WHERE seq = ? AND attempts >= ?",
+                (seqs[0], MAX_ATTEMPTS)
+            )
+            return cursor.rowcount > 0
+
+    def dismiss(self, seq):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE pending_writes SET status = 'dismissed' WHERE seq = ?", (seq,))
+
+    def prune(self, keep_days=7):
+        """Forget written and dismissed changes older than keep_days"""
+        cutoff = (datetime.now() - pd.Timedelta(days=keep_days)).isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM pending_writes WHERE status IN ('done', 'dismissed') AND queued_at < ?", (cutoff,)
+            )
+
+
+def current_resource(cursor, appointment_id):
+    cursor.execute("SELECT maica__Resources__c FROM NewAppointments WHERE Id = ?", (appointment_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None, False
+    value = row[0]
+    if value is None or str(value).strip().upper() in ('', 'NULL'):
+        return None, True
+    return ' '.join(str(value).split()), True
+
+
+def apply_change(cursor, change):
+    """Write one queued change with the same guards as an immediate write.
+
+    Returns (status, error): 'done', or 'conflict' with the reason.
+    """
+    if change['resource']:
+        cursor.execute("""
+        UPDATE NewAppointments
+        SET maica__Resources__c = ?
+        WHERE Id = ? AND (maica__Resources__c IS NULL OR maica__Resources__c = '' OR maica__Resources__c = 'NULL')
+        """, (change['resource'], change['appointment_id']))
+    else:
+        cursor.execute("""
+        UPDATE NewAppointments
+        SET maica__Resources__c = NULL
+        WHERE Id = ? AND REPLACE(REPLACE(maica__Resources__c, '  ', ' '), '  ', ' ') = ?
+        """, (change['appointment_id'], change['previous']))
+
+    if cursor.rowcount == 0:
+        current, found = current_resource(cursor, change['appointment_id'])
+        if not found:
+            return 'conflict', "Appointment no longer exists"
+        if current == change['resource']:
+            return 'done', None  # already written by an earlier flush that was not recorded
+        if current:
+            return 'conflict', f"Appointment is assigned to {current}"
+        return 'conflict', f"Appointment is no longer assigned to {change['previous']}"
+
+    day = change['start'].date()
+    if change['previous']:
+        adjust_hours(cursor, change['previous'], day, -change['minutes'])
+    if not change['resource']:
+        return 'done', None
+
+    # Hard hour caps against the counters, which now include this shift, under update locks
+    adjust_hours(cursor, change['resource'], day, change['minutes'])
+    week_ranges = {
+        'week1_start': change['week1_start'],
+        'week1_end': change['week1_end'],
+        'week2_end': change['week2_end'],
+    }
+    caps = {'week_hours': change['week_cap'], 'total_hours': change['total_cap']}
+    caps = {name: cap for name, cap in caps.items() if cap is not None}
+    breach = cap_breach(caps, period_hours(cursor, change['resource'], week_ranges, lock=True), change['week'])
+    if breach:
+        cursor.execute("UPDATE NewAppointments SET maica__Resources__c = NULL WHERE Id = ?", (change['appointment_id'],))
+        adjust_hours(cursor, change['resource'], day, -change['minutes'])
+        return 'conflict', breach
+    return 'done', None
+
+
+class WriteBehind:
+    """Background worker that drains a WriteJournal into the roster database.
+
+    connect is a context manager factory like roster_db.db_connection;
+    on_flushed(changes, results) runs on the worker thread after each
+    committed batch is journaled, and for a change given up on after
+    MAX_ATTEMPTS with status 'failed'. It should only hand the results over,
+    not touch the app's caches.
+    """
+
+    def __init__(self, journal, connect, on_flushed=None, interval=FLUSH_INTERVAL, batch=FLUSH_BATCH):
+        self.journal = journal
+        self.connect = connect
+        self.on_flushed = on_flushed
+        self.interval = interval
+        self.batch = batch
+        self.failures = 0
+        self.last_error = None
+        self.last_flush = None
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, change):
+        """Journal a change and nudge the worker; returns its sequence number"""
+        seq = self.journal.append(change)
+        self._wake.set()
+        return seq
+
+    def wake(self):
+        self._wake.set()
+
+    def _delay(self):
+        if not self.failures:
+            return self.interval
+        return min(MAX_BACKOFF, self.interval * 2 ** self.failures)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self._delay())
+            self._wake.clear()
+            try:
+                while self.flush() == self.batch:
+                    pass
+            except Exception:
+                logger.exception("Write-behind flush failed")
+
+    def flush(self):
+        """Write the next batch in one transaction; returns how many changes were recorded"""
+        changes = self.journal.pending(self.batch)
+        if not changes:
+            return 0
+        try:
+            with self.connect() as conn:
+                cursor = conn.cursor()
+                results = {}
+                for change in changes:
+                    results[change['seq']] = apply_change(cursor, change)
+                conn.commit()
+        except Exception as e:
+            # Nothing in the batch was committed; keep it pending, in order
+            self.failures += 1
+            self.last_error = str(e)
+            logger.warning(
+                "Write-behind flush of %d change(s) failed (attempt %d): %s", len(changes), self.failures, e
+            )
+            if self.journal.retry_later([change['seq'] for change in changes], str(e)):
+                self._notify(changes[:1], {changes[0]['seq']: ('failed', str(e))})
+            return 0
+
+        self.failures = 0
+        self.last_error = None
+        self.last_flush = datetime.now()
+        # Journal first: a crash before the callback must not report unrecorded writes
+        self.journal.record(results)
+        self._notify(changes, results)
+        return len(changes)
+
+    def _notify(self, changes, results):
+        if self.on_flushed:
+            try:
+                self.on_flushed(changes, results)
+            except Exception:
+                logger.exception("Write-behind callback failed")